@@ -47,6 +47,8 @@ class BlogEntryPage(XrPage):
 
     parent_page_types = ["BlogListPage"]
 
+    page_cache = True
+
     class Meta:
         verbose_name = _("Blog Entry Page")
         verbose_name_plural = _("Blog Entry Pages")
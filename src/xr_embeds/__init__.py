@@ -0,0 +1 @@
+default_app_config = "xr_embeds.apps.XrEmbedsConfig"
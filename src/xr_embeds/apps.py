@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class XrEmbedsConfig(AppConfig):
     name = "xr_embeds"
+
+    def ready(self):
+        import xr_embeds.signals  # noqa
@@ -1,17 +1,40 @@
 import datetime
+import hashlib
+import json
 import logging
 import urllib
-from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qs, urlencode
 
 from bs4 import BeautifulSoup
+from django.contrib.staticfiles.templatetags.staticfiles import static
+from django.core.cache import cache
 from django.core.files import File
 from django.utils import timezone
+from django.utils.text import compress_string
+from django.utils.translation import ugettext as _
 
 from xr_embeds.models import CachedImage
+from xr_pages.services import get_site
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 
 logger = logging.getLogger(__name__)
 
+# query_slug -> LocalGroupQuerySet method
+LOCAL_GROUP_GEOJSON_QUERIES = {
+    "all": "all",
+    "active": "active",
+    "in_foundation": "in_foundation",
+    "idle": "idle",
+}
+LOCAL_GROUP_GEOJSON_CACHE_KEY = "xr_embeds:local_group_geojson:{}"
+# umap polls the export, but changes are rebuilt right away
+LOCAL_GROUP_GEOJSON_MAX_AGE = 60 * 5
+
 
 def get_or_create_cached_image_for_url(url):
     cached_image_qs = CachedImage.objects.filter(original_url=url)
@@ -70,3 +93,104 @@ def sandbox_embed_html(url, html):
     )
 
     return str(soup)
+
+
+# GeoJSON
+
+
+def get_local_group_geojson(query_slug):
+    """
+    Returns the GeoJSON export of the local groups of the given query as a
+    dict of etag, content (the serialized json), gzip and br (its compressed
+    versions, br is None without the brotli package). It's precomputed, when
+    local groups change, and only built here, if it's not cached yet.
+    """
+    document = cache.get(LOCAL_GROUP_GEOJSON_CACHE_KEY.format(query_slug))
+    if document is None:
+        document = build_local_group_geojson(query_slug)
+    return document
+
+
+def get_local_group_geojson_etag(document, encoding=None):
+    """
+    The ETag of the given GeoJSON document in the given content encoding
+    (gzip or br), or of its uncompressed content, if encoding is None.
+    """
+    if encoding is None:
+        return document["etag"]
+    return '"{}-{}"'.format(document["etag"].strip('"'), encoding)
+
+
+def rebuild_local_group_geojson():
+    for query_slug in LOCAL_GROUP_GEOJSON_QUERIES:
+        build_local_group_geojson(query_slug)
+
+
+def build_local_group_geojson(query_slug):
+    content = json.dumps(get_local_group_feature_collection(query_slug)).encode()
+    document = {
+        "etag": '"{}"'.format(hashlib.md5(content).hexdigest()),
+        "content": content,
+        "gzip": compress_string(content),
+        "br": brotli.compress(content) if brotli else None,
+    }
+    cache.set(LOCAL_GROUP_GEOJSON_CACHE_KEY.format(query_slug), document, None)
+    return document
+
+
+def get_local_group_feature_collection(query_slug):
+    """GeoJson FeatureCollection of the local groups for umap"""
+    from xr_pages.models import LocalGroup
+
+    local_groups = getattr(
+        LocalGroup.objects.exclude(is_regional_group=True),
+        LOCAL_GROUP_GEOJSON_QUERIES[query_slug],
+    )()
+    # full_url needs the local group page
+    local_groups = local_groups.has_coordinates().select_related("localgrouppage")
+
+    features = []
+
+    for obj in local_groups:
+        name = obj.name
+
+        if obj.area_description:
+            name = "{} {}".format(obj.name, obj.area_description)
+
+        description = ""
+
+        for attr_name in ["facebook", "twitter", "youtube", "instagram", "mastodon"]:
+            if hasattr(obj, attr_name) and getattr(obj, attr_name):
+                description = "[[{}|{}]]".format(
+                    getattr(obj, attr_name), attr_name.capitalize()
+                )
+                break
+
+        if obj.full_url:
+            description = "[[{}|{}]]".format(obj.full_url, _("Homepage"))
+
+        if obj.email:
+            description += "\n[[mailto:{}|{}]]".format(obj.email, obj.email)
+
+        features.append(
+            {
+                "type": "Feature",
+                "properties": {
+                    "name": name,
+                    "description": description,
+                    "_umap_options": {},
+                },
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [obj.longitude, obj.latitude],
+                },
+            }
+        )
+
+    icon_url = urljoin(get_site().root_url, static("img/extinctionsymbol_48.png"))
+
+    return {
+        "type": "FeatureCollection",
+        "features": features,
+        "_umap_options": {"iconURL": icon_url},
+    }
@@ -0,0 +1,33 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from xr_pages.models import LocalGroup, LocalGroupPage
+from xr_pages.signals import local_groups_geocoded
+
+from .services import rebuild_local_group_geojson
+
+
+# GeoJSON
+
+
+@receiver(post_save, sender=LocalGroup, dispatch_uid="local_group_geojson_save_once")
+@receiver(
+    post_delete, sender=LocalGroup, dispatch_uid="local_group_geojson_delete_once"
+)
+@receiver(
+    post_save, sender=LocalGroupPage, dispatch_uid="local_group_page_geojson_save_once"
+)
+@receiver(
+    post_delete,
+    sender=LocalGroupPage,
+    dispatch_uid="local_group_page_geojson_delete_once",
+)
+@receiver(
+    local_groups_geocoded,
+    sender=LocalGroup,
+    dispatch_uid="local_group_geojson_geocoded_once",
+)
+def rebuild_local_group_geojson_on_change(sender, **kwargs):
+    # the full url of a group depends on its (live) local group page
+    transaction.on_commit(rebuild_local_group_geojson)
@@ -1,10 +1,24 @@
-from django.contrib.staticfiles.templatetags.staticfiles import static
-from django.http import JsonResponse, Http404
+import re
+
+from django.http import HttpResponse, JsonResponse, Http404
 from django.shortcuts import get_object_or_404
-from django.utils.translation import ugettext as _
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
 from wagtail.embeds.models import Embed
 
-from xr_pages.models import LocalGroup
+from xr_embeds.services import (
+    LOCAL_GROUP_GEOJSON_MAX_AGE,
+    LOCAL_GROUP_GEOJSON_QUERIES,
+    get_local_group_geojson,
+    get_local_group_geojson_etag,
+)
+
+# see django.middleware.gzip
+re_accepts_gzip = re.compile(r"\bgzip\b")
+re_accepts_br = re.compile(r"\bbr\b")
 
 
 def embed_html_view(request, embed_id):
@@ -16,71 +30,35 @@ def embed_html_view(request, embed_id):
 
 
 def geojson_view(request, model_slug, query_slug):
-    """GeoJson export for umap"""
-
-    if model_slug == "local_group":
-        model_queryset = LocalGroup.objects.exclude(is_regional_group=True)
-
-        if query_slug == "all":
-            model_queryset = model_queryset
-        elif query_slug == "active":
-            model_queryset = model_queryset.active()
-        elif query_slug == "in_foundation":
-            model_queryset = model_queryset.in_foundation()
-        elif query_slug == "idle":
-            model_queryset = model_queryset.idle()
-        else:
-            raise Http404()
-    else:
+    """
+    GeoJson export for umap, served from the precomputed documents.
+    A hit doesn't need any query.
+    """
+    if model_slug != "local_group" or query_slug not in LOCAL_GROUP_GEOJSON_QUERIES:
         raise Http404()
 
-    features = []
-
-    for obj in model_queryset:
-        if not (hasattr(obj, "lnglat") and obj.lnglat and "," in obj.lnglat):
-            continue
-
-        name = obj.name
-
-        if obj.area_description:
-            name = "{} {}".format(obj.name, obj.area_description)
+    document = get_local_group_geojson(query_slug)
 
-        description = ""
-
-        for attr_name in ["facebook", "twitter", "youtube", "instagram", "mastodon"]:
-            if hasattr(obj, attr_name) and getattr(obj, attr_name):
-                description = "[[{}|{}]]".format(
-                    getattr(obj, attr_name), attr_name.capitalize()
-                )
-                break
-
-        if obj.full_url:
-            description = "[[{}|{}]]".format(obj.full_url, _("Homepage"))
-
-        if obj.email:
-            description += "\n[[mailto:{}|{}]]".format(obj.email, obj.email)
-
-        features.append(
-            {
-                "type": "Feature",
-                "properties": {
-                    "name": name,
-                    "description": description,
-                    "_umap_options": {},
-                },
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [obj.lnglat.split(",")[0], obj.lnglat.split(",")[1]],
-                },
-            }
+    accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+    if document["br"] and re_accepts_br.search(accept_encoding):
+        encoding = "br"
+    elif re_accepts_gzip.search(accept_encoding):
+        encoding = "gzip"
+    else:
+        encoding = None
+    # the encodings differ byte for byte, so each has its own strong ETag
+    etag = get_local_group_geojson_etag(document, encoding)
+
+    # umap polls a lot, most of the time it already knows the current document
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(
+            document[encoding or "content"], content_type="application/json"
         )
+        if encoding:
+            response["Content-Encoding"] = encoding
 
-    icon_url = request.build_absolute_uri(static("img/extinctionsymbol_48.png"))
-
-    data = {
-        "type": "FeatureCollection",
-        "features": features,
-        "_umap_options": {"iconURL": icon_url},
-    }
-
-    return JsonResponse(data)
+    response["ETag"] = etag
+    patch_vary_headers(response, ["Accept-Encoding"])
+    patch_cache_control(response, public=True, max_age=LOCAL_GROUP_GEOJSON_MAX_AGE)
+    return response
@@ -0,0 +1,26 @@
+import os
+
+from django import forms
+from django.utils.translation import ugettext as _
+
+
+class EventImportForm(forms.Form):
+    file = forms.FileField(
+        label=_("File"),
+        help_text=_(
+            "A csv file with the columns uid, title, start, end, location and "
+            "description, or an ical (.ics) file."
+        ),
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data["file"]
+        file_format = os.path.splitext(file.name)[1].lstrip(".").lower()
+        if file_format not in ["csv", "ics"]:
+            raise forms.ValidationError(_("Please upload a .csv or .ics file."))
+        try:
+            file.data = file.read().decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise forms.ValidationError(_("The file must be UTF-8 encoded."))
+        file.format = file_format
+        return file
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from xr_events.services import archive_event_occurrences
+
+
+class Command(BaseCommand):
+    help = (
+        "Archives the indexed event dates, that ended before today. "
+        "Should be run daily."
+    )
+
+    def handle(self, *args, **options):
+        count = archive_event_occurrences()
+        self.stdout.write("Archived {} event dates.".format(count))
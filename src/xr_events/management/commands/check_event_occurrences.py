@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from xr_events.services import check_event_occurrences
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks the event occurrence index against the EventDate querysets. "
+        "Run rebuild_event_occurrences to fix any reported problems."
+    )
+
+    def handle(self, *args, **options):
+        problems = check_event_occurrences()
+
+        for problem in problems:
+            self.stderr.write(problem)
+
+        if problems:
+            raise CommandError(
+                "The event occurrence index has {} problems.".format(len(problems))
+            )
+
+        self.stdout.write("The event occurrence index is consistent.")
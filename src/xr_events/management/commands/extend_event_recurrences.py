@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from xr_events.services import extend_event_recurrences
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the window of indexed recurring event dates on to the current day. "
+        "Should be run daily."
+    )
+
+    def handle(self, *args, **options):
+        count = extend_event_recurrences()
+        self.stdout.write("Extended the recurring dates of {} events.".format(count))
@@ -0,0 +1,57 @@
+import os
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from xr_events.models import EventGroupPage
+from xr_events.services import import_events, parse_event_import
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports events from a csv or ical file into an EventGroupPage. "
+        "Events are identified by their uid, re-imports only update changed events."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("file")
+        parser.add_argument(
+            "--page", type=int, required=True, help="The id of the EventGroupPage."
+        )
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ics"],
+            help="The file format, defaults to the file extension.",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only validate the file."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            event_group_page = EventGroupPage.objects.get(pk=options["page"])
+        except EventGroupPage.DoesNotExist:
+            raise CommandError("There is no EventGroupPage {}.".format(options["page"]))
+
+        file_format = options["format"]
+        if not file_format:
+            file_format = os.path.splitext(options["file"])[1].lstrip(".").lower()
+
+        with open(options["file"], encoding="utf-8-sig") as f:
+            data = f.read()
+
+        try:
+            events = parse_event_import(data, file_format)
+        except ValidationError as e:
+            raise CommandError("\n".join(e.messages))
+
+        if options["dry_run"]:
+            self.stdout.write("{} events are valid.".format(len(events)))
+            return
+
+        created, updated, unchanged = import_events(event_group_page, events)
+        self.stdout.write(
+            "Created {} and updated {} events, {} events are unchanged.".format(
+                created, updated, unchanged
+            )
+        )
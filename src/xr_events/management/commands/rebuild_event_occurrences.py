@@ -0,0 +1,18 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from xr_events.services import rebuild_event_occurrences
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the event occurrence index used by the event listings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        logging.info("Starting the rebuild of the event occurrence index.")
+        count = rebuild_event_occurrences(chunk_size=options["chunk_size"])
+        logging.info("The event occurrence index has been rebuilt.")
+        self.stdout.write("Rebuilt {} event occurrences.".format(count))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from xr_events.services import recompute_event_bounds
+
+
+class Command(BaseCommand):
+    help = "Recomputes the start and end dates of all events in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = recompute_event_bounds(chunk_size=options["chunk_size"])
+        self.stdout.write("Updated the start and end dates of {} events.".format(count))
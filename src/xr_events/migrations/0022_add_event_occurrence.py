@@ -0,0 +1,83 @@
+# Generated by Django 2.2.2 on 2026-10-18 16:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("xr_pages", "0051_data_add_lnglat_for_existing_ogs"),
+        ("xr_events", "0021_auto_20191110_0144"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventOccurrence",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("start", models.DateTimeField()),
+                ("end", models.DateTimeField()),
+                ("live", models.BooleanField(default=False)),
+                (
+                    "event_date",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occurrences",
+                        to="xr_events.EventDate",
+                    ),
+                ),
+                (
+                    "event_page",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occurrences",
+                        to="xr_events.EventPage",
+                    ),
+                ),
+                (
+                    "group",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="event_occurrences",
+                        to="xr_pages.LocalGroup",
+                    ),
+                ),
+                (
+                    "shadow_event",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occurrences",
+                        to="xr_events.ShadowEventPage",
+                    ),
+                ),
+            ],
+            options={"ordering": ["start", "event_date_id"]},
+        ),
+        migrations.AddIndex(
+            model_name="eventoccurrence",
+            index=models.Index(
+                fields=["group", "live", "start", "end"], name="xr_events_occ_group_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="eventoccurrence",
+            index=models.Index(
+                fields=["live", "shadow_event", "start", "end"],
+                name="xr_events_occ_owned_idx",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="eventoccurrence", unique_together={("event_date", "group")}
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.2 on 2026-10-18 16:42
+
+from django.db import migrations
+
+
+def populate_event_occurrences(apps, schema_editor):
+    EventPage = apps.get_model("xr_events", "EventPage")
+    ShadowEventPage = apps.get_model("xr_events", "ShadowEventPage")
+    EventOccurrence = apps.get_model("xr_events", "EventOccurrence")
+
+    occurrences = []
+
+    for event in EventPage.objects.all():
+        shadows = ShadowEventPage.objects.filter(original_event=event).order_by("pk")
+
+        for date in event.dates.all():
+            end = max(date.start, date.end) if date.end else date.start
+            occurrences.append(
+                EventOccurrence(
+                    event_date=date,
+                    event_page=event,
+                    group_id=event.group_id,
+                    start=date.start,
+                    end=end,
+                    live=event.live,
+                )
+            )
+
+            group_ids = {event.group_id}
+            for shadow in shadows:
+                if shadow.group_id in group_ids:
+                    continue
+                group_ids.add(shadow.group_id)
+                occurrences.append(
+                    EventOccurrence(
+                        event_date=date,
+                        event_page=event,
+                        shadow_event=shadow,
+                        group_id=shadow.group_id,
+                        start=date.start,
+                        end=end,
+                        live=event.live and shadow.live,
+                    )
+                )
+
+    EventOccurrence.objects.bulk_create(occurrences, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("xr_events", "0022_add_event_occurrence")]
+
+    operations = [
+        migrations.RunPython(populate_event_occurrences, migrations.RunPython.noop)
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.2 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("xr_events", "0023_data_populate_event_occurrences")]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="eventoccurrence", options={"ordering": ["start", "id"]}
+        ),
+        migrations.RemoveIndex(
+            model_name="eventoccurrence", name="xr_events_occ_group_idx"
+        ),
+        migrations.RemoveIndex(
+            model_name="eventoccurrence", name="xr_events_occ_owned_idx"
+        ),
+        migrations.AddField(
+            model_name="eventoccurrence",
+            name="first_of_day",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name="eventoccurrence",
+            index=models.Index(
+                fields=["group", "live", "first_of_day", "start", "end"],
+                name="xr_events_occ_group_day_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="eventoccurrence",
+            index=models.Index(
+                fields=["live", "shadow_event", "first_of_day", "start", "end"],
+                name="xr_events_occ_owned_day_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 2.2.2 on 2026-10-18 18:07
+
+import datetime
+
+from django.db import migrations
+from django.utils.timezone import localtime
+
+
+def set_first_of_day(apps, schema_editor):
+    EventOccurrence = apps.get_model("xr_events", "EventOccurrence")
+
+    event_days = set()
+    first_event_date_ids = []
+
+    for event_date_id, event_page_id, start, end in (
+        EventOccurrence.objects.order_by("start", "event_date_id")
+        .values_list("event_date_id", "event_page_id", "start", "end")
+        .distinct()
+    ):
+        # see xr_events.services.build_event_occurrences
+        days = set()
+        day, last_day = localtime(start).date(), localtime(end).date()
+        while day <= last_day:
+            days.add((event_page_id, day))
+            day += datetime.timedelta(1)
+        if not days <= event_days:
+            event_days |= days
+            first_event_date_ids.append(event_date_id)
+
+    for offset in range(0, len(first_event_date_ids), 500):
+        EventOccurrence.objects.filter(
+            event_date_id__in=first_event_date_ids[offset:][:500]
+        ).update(first_of_day=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("xr_events", "0024_eventoccurrence_first_of_day")]
+
+    operations = [migrations.RunPython(set_first_of_day, migrations.RunPython.noop)]
@@ -0,0 +1,16 @@
+# Generated by Django 2.2.2 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("xr_events", "0025_data_set_eventoccurrence_first_of_day")]
+
+    operations = [
+        migrations.AddField(
+            model_name="eventoccurrence",
+            name="location",
+            field=models.CharField(blank=True, max_length=255),
+        )
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.2 on 2026-10-18 19:14
+
+from django.db import migrations
+
+
+def set_location(apps, schema_editor):
+    EventOccurrence = apps.get_model("xr_events", "EventOccurrence")
+
+    occurrences = []
+    for occurrence in EventOccurrence.objects.select_related(
+        "event_date", "event_page"
+    ).order_by("pk"):
+        occurrence.location = (
+            occurrence.event_date.location or occurrence.event_page.location
+        )
+        occurrences.append(occurrence)
+
+    EventOccurrence.objects.bulk_update(occurrences, ["location"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("xr_events", "0026_eventoccurrence_location")]
+
+    operations = [migrations.RunPython(set_location, migrations.RunPython.noop)]
@@ -0,0 +1,153 @@
+# Generated by Django 2.2.2 on 2026-10-18 20:31
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import modelcluster.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("xr_events", "0027_data_set_eventoccurrence_location")]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventRecurrence",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "sort_order",
+                    models.IntegerField(blank=True, editable=False, null=True),
+                ),
+                (
+                    "start",
+                    models.DateTimeField(help_text="The start of the first date."),
+                ),
+                (
+                    "end",
+                    models.DateTimeField(
+                        blank=True, help_text="The end of the first date.", null=True
+                    ),
+                ),
+                (
+                    "frequency",
+                    models.CharField(
+                        choices=[
+                            ("daily", "Daily"),
+                            ("weekly", "Weekly"),
+                            ("monthly", "Monthly on the same day"),
+                            (
+                                "monthly_weekday",
+                                "Monthly on the same weekday, e.g. every 2nd Tuesday",
+                            ),
+                        ],
+                        default="weekly",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "interval",
+                    models.PositiveSmallIntegerField(
+                        default=1,
+                        help_text="Repeat every n days, weeks or months.",
+                        validators=[django.core.validators.MinValueValidator(1)],
+                    ),
+                ),
+                (
+                    "until",
+                    models.DateField(
+                        blank=True,
+                        help_text="The day of the last repetition.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "count",
+                    models.PositiveSmallIntegerField(
+                        blank=True,
+                        help_text="The number of repetitions, including exceptions.",
+                        null=True,
+                        validators=[django.core.validators.MinValueValidator(1)],
+                    ),
+                ),
+                (
+                    "exceptions",
+                    models.TextField(
+                        blank=True,
+                        help_text="Days without this date, one per line as YYYY-MM-DD.",
+                    ),
+                ),
+                (
+                    "label",
+                    models.CharField(
+                        blank=True,
+                        help_text='Optional label like "Plenary" or "Meeting point"',
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "location",
+                    models.CharField(
+                        blank=True,
+                        help_text="A more specific location, overwrites the events default location.",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "description",
+                    models.CharField(
+                        blank=True,
+                        help_text="Optional date description. Visible on event detail page only.",
+                        max_length=1000,
+                    ),
+                ),
+                (
+                    "event_page",
+                    modelcluster.fields.ParentalKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recurrences",
+                        to="xr_events.EventPage",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Recurring date",
+                "verbose_name_plural": "Recurring dates",
+                "ordering": ["start", "sort_order"],
+            },
+        ),
+        migrations.AlterField(
+            model_name="eventoccurrence",
+            name="event_date",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="occurrences",
+                to="xr_events.EventDate",
+            ),
+        ),
+        migrations.AddField(
+            model_name="eventoccurrence",
+            name="recurrence",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="occurrences",
+                to="xr_events.EventRecurrence",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="eventoccurrence",
+            unique_together={("event_date", "group"), ("recurrence", "start", "group")},
+        ),
+    ]
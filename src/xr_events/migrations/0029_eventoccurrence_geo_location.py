@@ -0,0 +1,26 @@
+# Generated by Django 2.2.2 on 2026-10-18 21:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("xr_pages", "0052_add_geocodedlocation"),
+        ("xr_events", "0028_add_event_recurrence"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="eventoccurrence",
+            name="geo_location",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="event_occurrences",
+                to="xr_pages.GeocodedLocation",
+            ),
+        )
+    ]
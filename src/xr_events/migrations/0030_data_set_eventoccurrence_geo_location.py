@@ -0,0 +1,39 @@
+# Generated by Django 2.2.2 on 2026-10-18 21:05
+
+from django.db import migrations
+
+
+def set_geo_location(apps, schema_editor):
+    GeocodedLocation = apps.get_model("xr_pages", "GeocodedLocation")
+    EventOccurrence = apps.get_model("xr_events", "EventOccurrence")
+
+    def normalize(location):
+        # see xr_pages.services.normalize_location
+        return " ".join(location.split()).lower()[:255]
+
+    queries = {
+        normalize(location)
+        for location in EventOccurrence.objects.values_list("location", flat=True)
+    }
+    queries.discard("")
+    GeocodedLocation.objects.bulk_create(
+        [GeocodedLocation(query=query) for query in sorted(queries)], batch_size=500
+    )
+    geo_locations = {
+        geo_location.query: geo_location
+        for geo_location in GeocodedLocation.objects.all()
+    }
+
+    occurrences = []
+    for occurrence in EventOccurrence.objects.exclude(location="").order_by("pk"):
+        occurrence.geo_location = geo_locations.get(normalize(occurrence.location))
+        occurrences.append(occurrence)
+
+    EventOccurrence.objects.bulk_update(occurrences, ["geo_location"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("xr_events", "0029_eventoccurrence_geo_location")]
+
+    operations = [migrations.RunPython(set_geo_location, migrations.RunPython.noop)]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.2 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("xr_events", "0030_data_set_eventoccurrence_geo_location")]
+
+    operations = [
+        migrations.AddField(
+            model_name="eventpage",
+            name="import_hash",
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name="eventpage",
+            name="import_uid",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=255
+            ),
+        ),
+    ]
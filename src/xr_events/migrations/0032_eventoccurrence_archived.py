@@ -0,0 +1,43 @@
+# Generated by Django 2.2.2 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("xr_events", "0031_eventpage_import_uid")]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="eventoccurrence", name="xr_events_occ_group_day_idx"
+        ),
+        migrations.RemoveIndex(
+            model_name="eventoccurrence", name="xr_events_occ_owned_day_idx"
+        ),
+        migrations.AddField(
+            model_name="eventoccurrence",
+            name="archived",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name="eventoccurrence",
+            index=models.Index(
+                fields=["archived", "group", "live", "first_of_day", "start", "end"],
+                name="xr_events_occ_group_day_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="eventoccurrence",
+            index=models.Index(
+                fields=[
+                    "archived",
+                    "live",
+                    "shadow_event",
+                    "first_of_day",
+                    "start",
+                    "end",
+                ],
+                name="xr_events_occ_owned_day_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.2 on 2026-10-18 22:12
+
+import datetime
+
+from django.db import migrations
+from django.utils.timezone import localdate, make_aware
+
+
+def archive_past_event_occurrences(apps, schema_editor):
+    EventOccurrence = apps.get_model("xr_events", "EventOccurrence")
+
+    # see xr_events.services.archive_event_occurrences
+    today_start = make_aware(datetime.datetime.combine(localdate(), datetime.time()))
+    EventOccurrence.objects.filter(end__lt=today_start).update(archived=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("xr_events", "0032_eventoccurrence_archived")]
+
+    operations = [
+        migrations.RunPython(archive_past_event_occurrences, migrations.RunPython.noop)
+    ]
@@ -1,9 +1,20 @@
+import calendar
+import datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.db.models import Q, QuerySet
-from django.http import Http404
+from django.db.models.query import ModelIterable
+from django.http import Http404, JsonResponse
 from django.shortcuts import redirect
+from django.template.loader import render_to_string
 from django.utils import formats
-from django.utils.timezone import localdate
+from django.utils.cache import patch_cache_control
+from django.utils.http import urlencode
+from django.utils.timezone import localdate, localtime, make_aware
 from django.utils.translation import ugettext as _
 from modelcluster.fields import ParentalKey
 from wagtail.admin.edit_handlers import (
@@ -21,8 +32,38 @@ from wagtail.images.edit_handlers import ImageChooserPanel
 from wagtail.snippets.edit_handlers import SnippetChooserPanel
 from condensedinlinepanel.edit_handlers import CondensedInlinePanel
 
+from xr_events.services import (
+    EVENT_ARCHIVE_MAX_AGE,
+    EVENT_CALENDAR_MAX_YEAR,
+    EVENT_CALENDAR_MIN_YEAR,
+    EVENT_LIST_PAGE_SIZE,
+    EVENT_RECURRENCE_DETAIL_DAYS,
+    date_range_from_days,
+    decode_event_cursor,
+    get_event_archive_month,
+    get_event_archive_year,
+    get_event_bounds,
+    get_event_calendar_weeks,
+    get_event_date_routes,
+    get_event_occurrence_page,
+    get_shadowed_event,
+    group_event_dates_by_day,
+    load_event_card_data,
+    local_day_start,
+    update_event_occurrences,
+    update_shadow_event_occurrences,
+)
 from xr_pages.blocks import ContentBlock
-from xr_pages.models import LocalGroup, XrPage
+from xr_pages.models import GeocodedLocation, LocalGroup, XrPage
+from xr_pages.services import (
+    add_page_cache_tags,
+    get_grid_cell_ranges,
+    get_page_cache_purge_tags,
+    resolve_page_route,
+    PAGE_CACHE_IMAGE_TAG,
+    PAGE_CACHE_LOCAL_GROUP_TAG,
+    PAGE_CACHE_PAGE_TAG,
+)
 from django.template.response import TemplateResponse
 
 
@@ -36,30 +77,100 @@ and EventGroupPage).
 class EventPageListFilter:
 
     """
-    Creates a queryset with objects of the page given through xrEventPage
-    and parses the given request for a valid range to filter the list.
-    Adds the filtered_events, the timefilter-definition and the selected
-    value to the context for easy access within the template.
+    Parses the filter parameters of an event listing request and applies
+    them to an EventOccurrence queryset:
+
+        d          one of the timefilter presets, defaults to the next month
+        from, to   an explicit date range (YYYY-MM-DD), overrides the preset
+        group      LocalGroup ids, may be given several times
+        state      LocalGroup states, may be given several times
+        location   free text, matched against the date or event location
+
+    The parameters are normalized, so that equal filters share the same key,
+    regardless of parameter order, duplicates or formatting.
     """
 
-    @staticmethod
-    def get_timefilter_and_selected_days(data):
+    DEFAULT_DAYS = 30
+    TIMEFILTER_DAYS = ["30", "182", "365", "0", "-30"]
+
+    def __init__(self, date_range, days=None, group_ids=(), states=(), location=""):
+        self.from_date, self.to_date = sorted(date_range)
+        self.days = days
+        self.group_ids = tuple(sorted(set(group_ids)))
+        self.states = tuple(sorted(set(states)))
+        self.location = " ".join(location.split()).lower()
+
+    @classmethod
+    def from_query_dict(cls, data):
         # data may be request.GET e.g.
-        get_d = data.get("d", 30)
-
-        if get_d == "365":
-            days = 365
-        elif get_d == "182":
-            days = 182
-        elif get_d == "-30":
-            days = -30
-        elif get_d == "0":
-            days = 0
+        days = data.get("d")
+        if days not in cls.TIMEFILTER_DAYS:
+            days = str(cls.DEFAULT_DAYS)
+
+        from_date = cls._parse_date(data.get("from"))
+        to_date = cls._parse_date(data.get("to"))
+
+        if from_date or to_date:
+            # an explicit range doesn't match any of the presets
+            days = None
+            from_date = from_date or localdate()
+            to_date = to_date or from_date + datetime.timedelta(days=cls.DEFAULT_DAYS)
+            date_range = (from_date, to_date)
         else:
-            days = 30
+            date_range = date_range_from_days(days)
+
+        group_ids = []
+        for group_id in data.getlist("group"):
+            try:
+                group_ids.append(int(group_id))
+            except ValueError:
+                pass
+
+        valid_states = dict(settings.LOCAL_GROUP_STATE_CHOICES)
+        states = [state for state in data.getlist("state") if state in valid_states]
+
+        return cls(
+            date_range,
+            days=days,
+            group_ids=group_ids,
+            states=states,
+            location=data.get("location", ""),
+        )
+
+    @staticmethod
+    def _parse_date(value):
+        try:
+            return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            return None
 
+    def for_group(self, group):
+        """Returns a copy of this filter, restricted to the given group."""
+        return EventPageListFilter(
+            (self.from_date, self.to_date),
+            days=self.days,
+            group_ids=[group.pk],
+            states=self.states,
+            location=self.location,
+        )
+
+    @property
+    def key(self):
+        """A canonical representation of this filter, e.g. for cache keys."""
+        return urlencode(
+            [
+                ("from", self.from_date.isoformat()),
+                ("to", self.to_date.isoformat()),
+                ("group", ",".join(str(group_id) for group_id in self.group_ids)),
+                ("state", ",".join(self.states)),
+                ("location", self.location),
+            ]
+        )
+
+    @property
+    def timefilter(self):
         # used to built the list of selectable time filters in the template
-        timefilter = {
+        return {
             "30": _("Next month"),
             "182": _("Next six months"),
             "365": _("Next Year"),
@@ -67,7 +178,26 @@ class EventPageListFilter:
             "-30": _("Last month"),
         }
 
-        return timefilter, days
+    @property
+    def selected(self):
+        return self.days or ""
+
+    def filter(self, queryset):
+        queryset = queryset.date_range((self.from_date, self.to_date))
+
+        if len(self.group_ids) == 1:
+            queryset = queryset.for_group(self.group_ids[0])
+        elif self.group_ids:
+            queryset = queryset.for_groups(self.group_ids)
+        else:
+            queryset = queryset.owned()
+
+        if self.states:
+            queryset = queryset.filter(group__state__in=self.states)
+        if self.location:
+            queryset = queryset.filter(location__icontains=self.location)
+
+        return queryset
 
 
 class EventPageQuerySet(PageQuerySet):
@@ -75,9 +205,11 @@ class EventPageQuerySet(PageQuerySet):
         return self.filter(Q(start_date__isnull=False) & Q(start_date__date__lte=date))
 
     def end_after(self, date):
+        # events without an end_date, but with a start_date recur endlessly
         return self.filter(
             Q(end_date__isnull=False) & Q(end_date__date__gte=date)
             | Q(start_date__isnull=False) & Q(start_date__date__gte=date)
+            | Q(start_date__isnull=False) & Q(end_date__isnull=True)
         )
 
     def upcoming(self):
@@ -117,9 +249,15 @@ class EventPage(XrPage):
     )
     start_date = models.DateTimeField(null=True, blank=True)
     end_date = models.DateTimeField(null=True, blank=True)
+    # set for events created by import_events, see xr_events.services
+    import_uid = models.CharField(
+        max_length=255, blank=True, editable=False, db_index=True
+    )
+    import_hash = models.CharField(max_length=32, blank=True, editable=False)
 
     content_panels = XrPage.content_panels + [
         CondensedInlinePanel("dates", label=_("Dates")),
+        CondensedInlinePanel("recurrences", label=_("Recurring dates")),
         FieldPanel("location"),
         CondensedInlinePanel("further_organisers", label=_("Further organisers")),
         StreamFieldPanel("content"),
@@ -131,6 +269,8 @@ class EventPage(XrPage):
 
     is_event_page = True
 
+    page_cache = True
+
     class Meta:
         verbose_name = _("Event")
         verbose_name_plural = _("Events")
@@ -158,45 +298,95 @@ class EventPage(XrPage):
             return redirect("{}{}/".format(self.url, event_date_id))
 
         request.is_preview = getattr(request, "is_preview", False)
+
+        # the requested date, the next date and the date list
+        # are all resolved from the same dates
+        dates = list(self.dates.all())
+        recurrences = list(self.recurrences.all())
+        display_dates = self.get_display_dates(dates, recurrences)
         event_date = None
 
         if event_date_id:
-            try:
-                event_date = (
+            event_date = next(
+                (date for date in dates if date.pk == event_date_id), None
+            )
+            if not event_date:
+                other_date = (
                     EventDate.objects.filter(id=event_date_id)
+                    .exclude(event_page_id=self.pk)
                     .select_related("event_page")
                     .first()
                 )
-                if event_date and event_date.event_page != self:
+                if other_date:
                     return redirect(
-                        "{}{}/".format(event_date.event_page.url, event_date_id)
+                        "{}{}/".format(other_date.event_page.url, event_date_id)
                     )
-            except EventDate.DoesNotExist:
-                pass
 
         if not event_date:
-            event_date = self.get_next_date()
+            event_date = self.get_next_date(dates, recurrences)
+
+        if not request.is_preview:
+            # previews show the organisers of the unsaved page
+            load_event_card_data([self])
+            add_page_cache_tags(request, *self.get_card_page_cache_tags())
 
         context = self.get_context(request)
-        context.update({"event": self, "event_date": event_date})
+        context.update(
+            {
+                "event": self,
+                "event_date": event_date,
+                "date_groups": group_event_dates_by_day(display_dates),
+                "highlighted_day": localtime(event_date.start).date()
+                if event_date
+                else None,
+            }
+        )
 
         return TemplateResponse(request, self.get_template(request), context)
 
-    def get_next_date(self):
-        next_date = None
-        try:
+    def get_next_date(self, dates=None, recurrences=None):
+        today = localdate()
+        if dates is None:
             next_date = (
-                self.dates.filter(start__date__gte=localdate())
-                .order_by("start")
-                .first()
+                self.dates.filter(start__date__gte=today).order_by("start").first()
+            )
+        else:
+            next_date = min(
+                (date for date in dates if localtime(date.start).date() >= today),
+                key=lambda date: date.start,
+                default=None,
             )
-        except EventDate.DoesNotExist:
-            pass
+
+        if recurrences is None:
+            recurrences = self.recurrences.all()
+        for recurrence in recurrences:
+            recurring_date = next(recurrence.iter_dates(from_date=today), None)
+            if recurring_date and (
+                not next_date or recurring_date.start < next_date.start
+            ):
+                next_date = recurring_date
         return next_date
 
+    def get_display_dates(self, dates=None, recurrences=None):
+        """
+        The dates listed on the detail page: all single dates and the
+        recurring dates of the next EVENT_RECURRENCE_DETAIL_DAYS.
+        """
+        dates = list(self.dates.all() if dates is None else dates)
+        if recurrences is None:
+            recurrences = self.recurrences.all()
+        from_date = localdate()
+        to_date = from_date + datetime.timedelta(days=EVENT_RECURRENCE_DETAIL_DAYS)
+        for recurrence in recurrences:
+            dates += recurrence.iter_dates(from_date=from_date, to_date=to_date)
+        return sorted(dates, key=lambda date: date.start)
+
     def get_image(self):
         if self.image:
             return self.image
+        if hasattr(self, "_card_default_image"):
+            # preloaded by load_event_card_data()
+            return self._card_default_image
         event_group_page = EventGroupPage.objects.ancestor_of(self).last()
         if event_group_page.default_event_image:
             return event_group_page.default_event_image
@@ -210,6 +400,9 @@ class EventPage(XrPage):
         return self.group
 
     def get_all_organisers(self):
+        if hasattr(self, "_card_organisers"):
+            # preloaded by load_event_card_data()
+            return list(self._card_organisers)
         all_organisers = [self.group]
         shadow_qs = self.shadow_events.live().filter(original_event=self)
         if shadow_qs.exists():
@@ -222,22 +415,55 @@ class EventPage(XrPage):
     def all_organiser_names(self):
         return ", ".join([organiser.name for organiser in self.get_all_organisers()])
 
+    def get_card_page_cache_tags(self):
+        """
+        The page cache tags of the image and the organisers, that were
+        loaded by load_event_card_data().
+        """
+        tags = {
+            PAGE_CACHE_LOCAL_GROUP_TAG.format(organiser.pk)
+            for organiser in self.get_all_organisers()
+        }
+        image = self.get_image()
+        if image:
+            tags.add(PAGE_CACHE_IMAGE_TAG.format(image.pk))
+        return tags
+
+    def __getstate__(self):
+        # StreamValues can't be pickled (e.g. for the cache), keep the raw data
+        state = super().__getstate__().copy()
+        for field in self._stream_fields():
+            if field.name in state:
+                state[field.name] = field.get_prep_value(state[field.name])
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        for field in self._stream_fields():
+            if field.name in self.__dict__:
+                setattr(self, field.name, self.__dict__[field.name])
+
+    def _stream_fields(self):
+        return [
+            field
+            for field in self._meta.concrete_fields
+            if isinstance(field, StreamField)
+        ]
+
     def save(self, *args, **kwargs):
         if not hasattr(self, "group"):
             self.group = self.get_parent().specific.group
 
-        if self.dates.exists():
-            all_dates = []
-            for date in self.dates.all():
-                all_dates.append(date.start)
-                if date.end:
-                    all_dates.append(date.end)
-            all_dates = sorted(all_dates)
-            self.start_date = all_dates[0]
-            self.end_date = all_dates[-1]
+        self.start_date, self.end_date = get_event_bounds(self)
 
         super().save(*args, **kwargs)
 
+        # dates are committed by modelcluster at the very end of save(),
+        # so the occurrence index can only be refreshed afterwards
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "live" in update_fields:
+            update_event_occurrences(self)
+
 
 class ShadowEventPageQuerySet(PageQuerySet):
     def start_before(self, date):
@@ -252,6 +478,8 @@ class ShadowEventPageQuerySet(PageQuerySet):
             & Q(original_event__end_date__date__gte=date)
             | Q(original_event__start_date__isnull=False)
             & Q(original_event__start_date__date__gte=date)
+            | Q(original_event__start_date__isnull=False)
+            & Q(original_event__end_date__isnull=True)
         )
 
     def upcoming(self):
@@ -305,34 +533,21 @@ class ShadowEventPage(Page):
         verbose_name_plural = _("Shadow Events")
 
     def get_shadowed_event(self):
-        event = self.original_event.specific
-
-        all_organisers = [self.group, event.group]
-
-        shadow_qs = (
-            self.original_event.shadow_events.live()
-            .filter(original_event=self.original_event)
-            .exclude(pk=self.pk)
-        )
-
-        if shadow_qs.exists():
-            all_organisers += [shadow.specific.group for shadow in shadow_qs]
-
-        if (
-            hasattr(self.original_event, "further_organisers")
-            and self.original_event.further_organisers.exists()
-        ):
-            all_organisers += list(self.original_event.further_organisers.all())
-
-        event.get_all_organisers = lambda: all_organisers
-        event.group = self.group
-        event.get_url = self.get_url
+        return get_shadowed_event(self)
 
-        return event
+    def get_page_cache_purge_tags(self):
+        # the original event lists its shadows as organisers
+        tags = get_page_cache_purge_tags(self)
+        if self.original_event_id:
+            tags.add(PAGE_CACHE_PAGE_TAG.format(self.original_event_id))
+        return tags
 
     def get_context(self, request, *args, **kwargs):
         context = super().get_context(request, *args, **kwargs)
         context["event"] = self.get_shadowed_event()
+        context["date_groups"] = group_event_dates_by_day(
+            context["event"].get_display_dates()
+        )
         return context
 
     def save(self, *args, **kwargs):
@@ -341,8 +556,92 @@ class ShadowEventPage(Page):
 
         super().save(*args, **kwargs)
 
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "live" in update_fields:
+            update_shadow_event_occurrences(self)
+
+
+class ShadowedEvent:
+    """
+    The original EventPage of a ShadowEventPage, as shown on the shadow:
+    hosted by the group of the shadow and with all organisers and dates
+    resolved. Instances are cached, see xr_events.services.get_shadowed_event,
+    and can't be modified. Other attributes are read from the original event.
+    """
+
+    __slots__ = ("event", "shadow_event", "organisers", "image", "display_dates")
+
+    def __init__(self, event, shadow_event, organisers, image, display_dates):
+        for name, value in zip(
+            self.__slots__, (event, shadow_event, organisers, image, display_dates)
+        ):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ShadowedEvent can't be modified.")
+
+    def __reduce__(self):
+        return self.__class__, tuple(getattr(self, name) for name in self.__slots__)
+
+    def __getattr__(self, name):
+        return getattr(self.event, name)
+
+    @property
+    def group(self):
+        return self.shadow_event.group
+
+    @property
+    def organiser(self):
+        return self.shadow_event.group
+
+    def get_url(self, request=None):
+        return self.shadow_event.get_url(request)
+
+    @property
+    def url(self):
+        return self.shadow_event.url
+
+    def get_image(self):
+        return self.image
+
+    def get_display_dates(self):
+        return list(self.display_dates)
+
+    def get_all_organisers(self):
+        return list(self.organisers)
+
+    @property
+    def all_organiser_names(self):
+        return ", ".join([organiser.name for organiser in self.organisers])
+
+
+class EventCardIterable(ModelIterable):
+    """
+    Loads the card data of all related event pages at once,
+    as soon as the queryset gets evaluated.
+    """
+
+    event_page_lookup = "event_page"
+
+    def __iter__(self):
+        objs = list(super().__iter__())
+        load_event_card_data([self.get_event_page(obj) for obj in objs])
+        yield from objs
+
+    def get_event_page(self, obj):
+        for attr_name in self.event_page_lookup.split("__"):
+            obj = getattr(obj, attr_name, None)
+        return obj
+
 
 class EventDateQuerySet(QuerySet):
+    def with_card_data(self):
+        clone = self.select_related(
+            "event_page", "event_page__group", "event_page__image"
+        )
+        clone._iterable_class = EventCardIterable
+        return clone
+
     def live(self):
         return self.filter(event_page__live=True)
 
@@ -367,7 +666,9 @@ class EventDateQuerySet(QuerySet):
 
     def for_group(self, group):
         return self.filter(
-            Q(event_page__group=group) | Q(event_page__shadow_events__group=group)
+            Q(event_page__group=group)
+            | Q(event_page__shadow_events__group=group)
+            & Q(event_page__shadow_events__live=True)
         )
 
 
@@ -416,6 +717,238 @@ class EventDate(Orderable):
         return "{} | {}".format(start, self.label)
 
 
+class EventRecurrence(Orderable):
+    """
+    A date, that repeats like an iCalendar RRULE (RFC 5545), but limited to
+    the rules needed for plenaries and trainings. The single dates are never
+    stored, iter_dates() expands them for a given window on demand.
+
+    The rule is applied in local time, so that a weekly event keeps its
+    time of day across daylight saving time changes.
+    """
+
+    DAILY = "daily"
+    WEEKLY = "weekly"
+    MONTHLY = "monthly"
+    MONTHLY_WEEKDAY = "monthly_weekday"
+    FREQUENCY_CHOICES = [
+        (DAILY, _("Daily")),
+        (WEEKLY, _("Weekly")),
+        (MONTHLY, _("Monthly on the same day")),
+        (MONTHLY_WEEKDAY, _("Monthly on the same weekday, e.g. every 2nd Tuesday")),
+    ]
+
+    event_page = ParentalKey(
+        EventPage, on_delete=models.CASCADE, related_name="recurrences"
+    )
+    start = models.DateTimeField(help_text=_("The start of the first date."))
+    end = models.DateTimeField(
+        null=True, blank=True, help_text=_("The end of the first date.")
+    )
+    frequency = models.CharField(
+        max_length=20, choices=FREQUENCY_CHOICES, default=WEEKLY
+    )
+    interval = models.PositiveSmallIntegerField(
+        default=1,
+        validators=[MinValueValidator(1)],
+        help_text=_("Repeat every n days, weeks or months."),
+    )
+    until = models.DateField(
+        null=True, blank=True, help_text=_("The day of the last repetition.")
+    )
+    count = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(1)],
+        help_text=_("The number of repetitions, including exceptions."),
+    )
+    exceptions = models.TextField(
+        blank=True, help_text=_("Days without this date, one per line as YYYY-MM-DD."),
+    )
+    label = models.CharField(
+        blank=True,
+        max_length=255,
+        help_text=_('Optional label like "Plenary" or "Meeting point"'),
+    )
+    location = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text=_(
+            "A more specific location, overwrites the events default location."
+        ),
+    )
+    description = models.CharField(
+        max_length=1000,
+        blank=True,
+        help_text=_("Optional date description. Visible on event detail page only."),
+    )
+
+    panels = [
+        FieldRowPanel([FieldPanel("start"), FieldPanel("end")]),
+        FieldRowPanel([FieldPanel("frequency"), FieldPanel("interval")]),
+        FieldRowPanel([FieldPanel("until"), FieldPanel("count")]),
+        FieldPanel("exceptions"),
+        FieldRowPanel([FieldPanel("label"), FieldPanel("location")]),
+        FieldPanel("description"),
+    ]
+
+    class Meta:
+        verbose_name = _("Recurring date")
+        verbose_name_plural = _("Recurring dates")
+        ordering = ["start", "sort_order"]
+
+    def __str__(self):
+        start = formats.date_format(self.start, "SHORT_DATETIME_FORMAT")
+        frequency = dict(self.FREQUENCY_CHOICES)[self.frequency]
+        if not self.label:
+            return "{} | {}".format(start, frequency)
+        return "{} | {} | {}".format(start, frequency, self.label)
+
+    def clean(self):
+        super().clean()
+        errors = {}
+        if self.start and self.end and self.end < self.start:
+            errors["end"] = _("The end must not be before the start.")
+        if self.until and self.count:
+            errors["count"] = _("Set either the last day or the number of repetitions.")
+        if self.start and self.until and self.until < localtime(self.start).date():
+            errors["until"] = _("The last day must not be before the start.")
+        try:
+            self.get_exceptions()
+        except ValueError:
+            errors["exceptions"] = _("Enter one date per line, e.g. 2019-12-24.")
+        if errors:
+            raise ValidationError(errors)
+
+    def get_exceptions(self):
+        return {
+            datetime.datetime.strptime(value, "%Y-%m-%d").date()
+            for value in self.exceptions.replace(",", " ").split()
+        }
+
+    def get_duration(self):
+        if self.end and self.end > self.start:
+            return self.end - self.start
+        return datetime.timedelta(0)
+
+    def get_event_date(self, start):
+        """An unsaved EventDate for the repetition starting at start."""
+        return EventDate(
+            event_page_id=self.event_page_id,
+            start=start,
+            end=start + self.get_duration() if self.end else None,
+            label=self.label,
+            location=self.location,
+            description=self.description,
+        )
+
+    def iter_dates(self, from_date=None, to_date=None):
+        """
+        Yields unsaved EventDates for all repetitions, that end on or after
+        from_date and start on or before to_date. Without to_date the
+        generator never ends for rules without until and count.
+        """
+        exceptions = self.get_exceptions()
+        duration = self.get_duration()
+        last_index = self._get_last_index()
+
+        index = 0
+        if from_date:
+            # skip everything, that ended before from_date, without expanding it
+            index = self._get_index_before(from_date - duration - datetime.timedelta(1))
+
+        while last_index is None or index <= last_index:
+            start = self._get_local_start(index)
+            index += 1
+            if start is None or start.date() in exceptions:
+                continue
+            if to_date and start.date() > to_date:
+                break
+
+            event_date = self.get_event_date(make_aware(start, is_dst=False))
+            end = event_date.end or event_date.start
+            if from_date and localtime(end).date() < from_date:
+                continue
+            yield event_date
+
+    def get_first_date(self):
+        return next(self.iter_dates(), None)
+
+    def get_last_date(self):
+        """The last repetition or None, if the rule repeats endlessly."""
+        last_index = self._get_last_index()
+        if last_index is None:
+            return None
+
+        exceptions = self.get_exceptions()
+        for index in range(last_index, -1, -1):
+            start = self._get_local_start(index)
+            if start is not None and start.date() not in exceptions:
+                return self.get_event_date(make_aware(start, is_dst=False))
+        return None
+
+    def _get_first_local_start(self):
+        return localtime(self.start).replace(tzinfo=None)
+
+    def _get_local_start(self, index):
+        """
+        The naive local start of the index-th repetition, or None if it
+        doesn't exist, e.g. the 31st of a month with 30 days.
+        """
+        first_start = self._get_first_local_start()
+        steps = index * self.interval
+
+        if self.frequency == self.DAILY:
+            return first_start + datetime.timedelta(days=steps)
+        if self.frequency == self.WEEKLY:
+            return first_start + datetime.timedelta(weeks=steps)
+
+        year, month = divmod(first_start.month - 1 + steps, 12)
+        year += first_start.year
+        month += 1
+        days_in_month = calendar.monthrange(year, month)[1]
+
+        if self.frequency == self.MONTHLY:
+            if first_start.day > days_in_month:
+                return None
+            return first_start.replace(year=year, month=month)
+
+        # MONTHLY_WEEKDAY, the fifth weekday of a month means the last one
+        week = (first_start.day - 1) // 7
+        first_weekday = calendar.monthrange(year, month)[0]
+        day = 1 + (first_start.weekday() - first_weekday) % 7 + week * 7
+        while day > days_in_month:
+            day -= 7
+        return first_start.replace(year=year, month=month, day=day)
+
+    def _get_index_before(self, date):
+        """The index of a repetition starting before date, but not much before."""
+        first_start = self._get_first_local_start()
+
+        if self.frequency in [self.DAILY, self.WEEKLY]:
+            step_days = self.interval * (7 if self.frequency == self.WEEKLY else 1)
+            index = (date - first_start.date()).days // step_days
+        else:
+            months = (
+                (date.year - first_start.year) * 12 + date.month - first_start.month
+            )
+            index = months // self.interval - 1
+        return max(index, 0)
+
+    def _get_last_index(self):
+        if self.count:
+            return self.count - 1
+        if not self.until:
+            return None
+
+        index = self._get_index_before(self.until)
+        next_start = self._get_local_start(index + 1)
+        while next_start is None or next_start.date() <= self.until:
+            index += 1
+            next_start = self._get_local_start(index + 1)
+        return index
+
+
 class EventOrganiser(Orderable):
     event_page = ParentalKey(
         EventPage, on_delete=models.CASCADE, related_name="further_organisers"
@@ -444,7 +977,197 @@ class EventOrganiser(Orderable):
         return self.name
 
 
+class EventOccurrenceCardIterable(EventCardIterable):
+    event_page_lookup = "event_page"
+
+
+class EventOccurrenceQuerySet(QuerySet):
+    """
+    The date filters of EventDateQuerySet, but translated to plain datetime
+    comparisons, so that the composite indexes of EventOccurrence can be used.
+    """
+
+    def with_card_data(self):
+        clone = self.select_related(
+            "event_date",
+            "recurrence",
+            "event_page",
+            "event_page__group",
+            "event_page__image",
+        )
+        clone._iterable_class = EventOccurrenceCardIterable
+        return clone
+
+    def live(self):
+        return self.filter(live=True)
+
+    def owned(self):
+        return self.filter(shadow_event__isnull=True)
+
+    def first_of_day(self):
+        return self.filter(first_of_day=True)
+
+    def after(self, start, pk):
+        """Keyset pagination, matching the (start, id) ordering."""
+        return self.filter(Q(start__gt=start) | Q(start=start, pk__gt=pk))
+
+    def current(self):
+        return self.filter(archived=False)
+
+    def all_partitions(self):
+        """
+        All occurrences, but with a condition on the leading column of the
+        indexes, so that queries reaching into the past can still use them.
+        """
+        return self.filter(archived__in=[False, True])
+
+    def start_before(self, date):
+        return self.filter(start__lt=local_day_start(date + datetime.timedelta(1)))
+
+    def end_after(self, date):
+        queryset = self.filter(end__gte=local_day_start(date))
+        if date >= localdate():
+            # only occurrences, that ended before today, are archived
+            return queryset.current()
+        return queryset.all_partitions()
+
+    def upcoming(self):
+        return self.end_after(localdate())
+
+    def previous(self):
+        return self.start_before(localdate())
+
+    def date_range(self, date_range):
+        from_date, to_date = date_range
+        return self.end_after(from_date).start_before(to_date)
+
+    def for_group(self, group):
+        return self.filter(group=group)
+
+    def for_groups(self, groups):
+        """
+        Events listed for any of the given groups, but only with the rows of
+        the organising group, so that shared events show up only once.
+        """
+        # all dates of an event are listed for the same groups
+        listed = self.model.objects.live().filter(group__in=groups)
+        return self.owned().filter(event_page__in=listed.values("event_page"))
+
+    def in_bounding_box(self, south, west, north, east):
+        """
+        One indexed range lookup on the grid cells per row of the bounding
+        box, the coordinates only sort out the margins of the border cells.
+        """
+        cells = Q()
+        for first, last in get_grid_cell_ranges(south, west, north, east):
+            cells |= Q(geo_location__grid_cell__range=(first, last))
+        return self.filter(cells).filter(
+            geo_location__latitude__range=(south, north),
+            geo_location__longitude__range=(west, east),
+        )
+
+
+class EventOccurrence(models.Model):
+    """
+    A denormalized index for event listings.
+
+    There is one row per EventDate and LocalGroup, that either organises the
+    event or shadows it through a ShadowEventPage. The rows are maintained by
+    EventPage.save and ShadowEventPage.save, see xr_events.services.
+
+    Repetitions of an EventRecurrence get a row (without an EventDate) only
+    within a window around today, that is moved on by extend_event_recurrences.
+    Past rows are kept, but archived by archive_event_occurrences.
+    """
+
+    event_date = models.ForeignKey(
+        EventDate,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="occurrences",
+    )
+    recurrence = models.ForeignKey(
+        EventRecurrence,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="occurrences",
+    )
+    event_page = models.ForeignKey(
+        EventPage, on_delete=models.CASCADE, related_name="occurrences"
+    )
+    shadow_event = models.ForeignKey(
+        ShadowEventPage,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="occurrences",
+    )
+    group = models.ForeignKey(
+        LocalGroup, on_delete=models.CASCADE, related_name="event_occurrences"
+    )
+    start = models.DateTimeField()
+    # never null and never before start, unlike EventDate.end
+    end = models.DateTimeField()
+    # the location of the date, or the events default location
+    location = models.CharField(max_length=255, blank=True)
+    geo_location = models.ForeignKey(
+        GeocodedLocation,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="event_occurrences",
+    )
+    live = models.BooleanField(default=False)
+    # set for the first date of an event on each (local) day,
+    # listings only show one card per event and day
+    first_of_day = models.BooleanField(default=False)
+    # set for occurrences, that ended before today, see archive_event_occurrences.
+    # It's the leading column of the indexes, so that upcoming events are
+    # looked up in the (small) index partition of the current occurrences.
+    archived = models.BooleanField(default=False)
+
+    objects = EventOccurrenceQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["start", "id"]
+        unique_together = [("event_date", "group"), ("recurrence", "start", "group")]
+        indexes = [
+            models.Index(
+                fields=["archived", "group", "live", "first_of_day", "start", "end"],
+                name="xr_events_occ_group_day_idx",
+            ),
+            models.Index(
+                fields=[
+                    "archived",
+                    "live",
+                    "shadow_event",
+                    "first_of_day",
+                    "start",
+                    "end",
+                ],
+                name="xr_events_occ_owned_day_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return "{} | {}".format(self.get_event_date(), self.group)
+
+    def get_event_date(self):
+        """The EventDate, unsaved for repetitions of an EventRecurrence."""
+        if self.event_date_id:
+            event_date = self.event_date
+        else:
+            event_date = self.recurrence.get_event_date(self.start)
+        # share the event page, it may carry preloaded card data
+        event_date.event_page = self.event_page
+        return event_date
+
+
 class EventListPageBase(XrPage):
+    paginate_by = EVENT_LIST_PAGE_SIZE
+
     default_event_image = models.ForeignKey(
         "wagtailimages.Image",
         null=True,
@@ -458,26 +1181,174 @@ class EventListPageBase(XrPage):
         ImageChooserPanel("default_event_image")
     ]
 
-    def serve(self, request, *args, **kwargs):
-        from xr_events.services import date_range_from_days
+    def get_event_filter(self, request):
+        return EventPageListFilter.from_query_dict(request.GET)
+
+    def get_calendar_group_id(self):
+        return None
 
-        timefilter, selected = EventPageListFilter.get_timefilter_and_selected_days(
-            request.GET
+    def serve(self, request, *args, **kwargs):
+        if "archive" in request.GET:
+            return self.serve_archive(request, *args, **kwargs)
+        if "month" in request.GET or "week" in request.GET:
+            return self.serve_calendar(request, *args, **kwargs)
+
+        event_filter = self.get_event_filter(request)
+
+        event_occurrences, next_cursor = get_event_occurrence_page(
+            event_filter.filter(EventOccurrence.objects.live()).first_of_day(),
+            filter_key=event_filter.key,
+            cursor=decode_event_cursor(request.GET.get("cursor", "")),
+            page_size=self.paginate_by,
         )
 
-        date_range = date_range_from_days(selected)
-        event_dates = self.get_event_dates(date_range)
+        next_page_url = None
+        if next_cursor:
+            params = request.GET.copy()
+            params.pop("format", None)
+            params["cursor"] = next_cursor
+            next_page_url = "?{}".format(params.urlencode())
 
         context = self.get_context(request, *args, **kwargs)
         context.update(
             {
-                "event_dates": event_dates,
-                "timefilter": timefilter,
-                "selected": str(selected),
+                "event_occurrences": event_occurrences,
+                "next_page_url": next_page_url,
+                "event_filter": event_filter,
+                "timefilter": event_filter.timefilter,
+                "selected": event_filter.selected,
             }
         )
+
+        if request.GET.get("format") == "json":
+            # "load more" fragment, rendered without the surrounding page
+            html = render_to_string(
+                "xr_events/partials/event_card_list.html", context, request=request
+            )
+            return JsonResponse({"html": html, "next_page_url": next_page_url})
+
         return TemplateResponse(request, self.template, context)
 
+    def serve_calendar(self, request, *args, **kwargs):
+        """
+        A month (?month=YYYY-MM) or week (?week=YYYY-MM-DD, any day of the
+        week) calendar, rendered from the cached day buckets of its months.
+        """
+        week_day = EventPageListFilter._parse_date(request.GET.get("week"))
+        if week_day:
+            if not EVENT_CALENDAR_MIN_YEAR <= week_day.year <= EVENT_CALENDAR_MAX_YEAR:
+                raise Http404
+            first_day = week_day - datetime.timedelta(week_day.weekday())
+            last_day = first_day + datetime.timedelta(6)
+            previous_url = "?week={}".format(first_day - datetime.timedelta(7))
+            next_url = "?week={}".format(first_day + datetime.timedelta(7))
+        else:
+            try:
+                month = datetime.datetime.strptime(request.GET["month"], "%Y-%m")
+                first_day = month.date()
+            except (KeyError, ValueError):
+                first_day = localdate().replace(day=1)
+            if not EVENT_CALENDAR_MIN_YEAR <= first_day.year <= EVENT_CALENDAR_MAX_YEAR:
+                raise Http404
+            last_day = first_day.replace(
+                day=calendar.monthrange(first_day.year, first_day.month)[1]
+            )
+            previous_month = first_day - datetime.timedelta(1)
+            next_month = last_day + datetime.timedelta(1)
+            previous_url = "?month={:%Y-%m}".format(previous_month)
+            next_url = "?month={:%Y-%m}".format(next_month)
+
+        context = self.get_context(request, *args, **kwargs)
+        context.update(
+            {
+                "base_template": self.template,
+                "calendar_weeks": get_event_calendar_weeks(
+                    self.get_calendar_group_id(), first_day, last_day
+                ),
+                "calendar_first_day": first_day,
+                "calendar_last_day": last_day,
+                "calendar_is_week": bool(week_day),
+                "calendar_previous_url": previous_url,
+                "calendar_next_url": next_url,
+                "calendar_month_url": "?month={:%Y-%m}".format(first_day),
+                "calendar_week_url": "?week={}".format(first_day),
+            }
+        )
+        return TemplateResponse(request, "xr_events/pages/event_calendar.html", context)
+
+    def serve_archive(self, request, *args, **kwargs):
+        """
+        The archive of past events by year (?archive=YYYY) or month
+        (?archive=YYYY-MM). Past months don't change anymore, so they are
+        cached long and may also be cached by proxies for anonymous users.
+        """
+        today = localdate()
+        value = request.GET["archive"]
+        try:
+            first_day = datetime.datetime.strptime(value, "%Y-%m").date()
+            year, month = first_day.year, first_day.month
+        except ValueError:
+            try:
+                year, month = datetime.datetime.strptime(value, "%Y").year, None
+            except ValueError:
+                raise Http404
+        if year < EVENT_CALENDAR_MIN_YEAR:
+            raise Http404
+        if year > today.year or month and (year, month) >= (today.year, today.month):
+            raise Http404
+
+        group_id = self.get_calendar_group_id()
+        context = self.get_context(request, *args, **kwargs)
+        context.update(
+            {
+                "base_template": self.template,
+                "archive_year": year,
+                "archive_year_url": "?archive={}".format(year),
+                "archive_previous_url": "?archive={}".format(year - 1),
+                "archive_next_url": (
+                    "?archive={}".format(year + 1) if year < today.year else None
+                ),
+            }
+        )
+
+        if month:
+            paginator = Paginator(
+                get_event_archive_month(group_id, year, month), self.paginate_by
+            )
+            archive_page = paginator.get_page(request.GET.get("page"))
+            previous_month = first_day - datetime.timedelta(1)
+            next_month = first_day + datetime.timedelta(31)
+            context.update(
+                {
+                    "archive_month": first_day,
+                    "archive_page": archive_page,
+                    "event_occurrences": EventOccurrence.objects.filter(
+                        pk__in=archive_page.object_list
+                    ).with_card_data(),
+                    "archive_previous_url": "?archive={:%Y-%m}".format(previous_month),
+                    "archive_next_url": (
+                        "?archive={:%Y-%m}".format(next_month)
+                        if (next_month.year, next_month.month)
+                        < (today.year, today.month)
+                        else None
+                    ),
+                }
+            )
+        else:
+            context["archive_months"] = [
+                (datetime.date(*month_key, 1), count)
+                for month_key, count in sorted(
+                    get_event_archive_year(group_id, year).items()
+                )
+            ]
+
+        response = TemplateResponse(
+            request, "xr_events/pages/event_archive.html", context
+        )
+        if not request.user.is_authenticated:
+            patch_cache_control(response, public=True, max_age=EVENT_ARCHIVE_MAX_AGE)
+        return response
+
     class Meta:
         abstract = True
 
@@ -492,9 +1363,6 @@ class EventListPage(EventListPageBase):
     parent_page_types = []
     is_creatable = False
 
-    def get_event_dates(self, date_range):
-        return EventDate.objects.live().date_range(date_range)
-
     class Meta:
         verbose_name = _("Event List Page")
         verbose_name_plural = _("Event List Pages")
@@ -512,12 +1380,26 @@ class EventGroupPage(EventListPageBase):
 
     parent_page_types = ["EventListPage"]
 
-    def get_event_dates(self, date_range):
-        return EventDate.objects.live().for_group(self.group).date_range(date_range)
+    def get_event_filter(self, request):
+        return super().get_event_filter(request).for_group(self.group)
+
+    def get_calendar_group_id(self):
+        return self.group_id
+
+    def get_page_cache_purge_tags(self):
+        # the local group menu links to this page
+        tags = super().get_page_cache_purge_tags()
+        tags.add(PAGE_CACHE_LOCAL_GROUP_TAG.format(self.group_id))
+        return tags
 
     def route(self, request, path_components):
         if path_components:
             # request is for a child of this page
+            resolved = resolve_page_route(self, path_components)
+            if resolved:
+                subpage, remaining_components = resolved
+                return subpage.route(request, remaining_components)
+
             child_slug = path_components[0]
             remaining_components = path_components[1:]
 
@@ -528,7 +1410,13 @@ class EventGroupPage(EventListPageBase):
                     # try to find an event_page, by matching the
                     # second path_component with an event_date id
                     event_date_id = int(path_components[1])
-                    event_page = EventPage.objects.get(dates__id=event_date_id)
+                    event_date_routes = get_event_date_routes()
+                    if event_date_routes is None:
+                        event_page = EventPage.objects.get(dates__id=event_date_id)
+                    else:
+                        event_page = EventPage.objects.get(
+                            id=event_date_routes.get(event_date_id)
+                        )
                     return event_page.route(
                         request, remaining_components, redirect_self=True
                     )
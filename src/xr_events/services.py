@@ -1,13 +1,91 @@
+import calendar
+import csv
 import datetime
+import hashlib
+import io
+import json
+import logging
+import re
+import uuid
 
-from django.utils.timezone import localdate
+import pytz
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.html import escape
+from django.utils.text import slugify
+from django.utils.timezone import localdate, localtime, make_aware, utc
 
 from xr_pages.services import (
-    get_home_page,
+    defer_stream_fields,
+    get_bounding_box,
+    get_distance,
+    get_geocoded_locations,
+    get_navigation,
+    invalidate_page_routes,
+    normalize_location,
+    purge_page_cache,
     MODERATORS_PAGE_PERMISSIONS,
     EDITORS_PAGE_PERMISSIONS,
+    PAGE_CACHE_IMAGE_TAG,
+    PAGE_CACHE_PAGE_TAG,
 )
 
+logger = logging.getLogger(__name__)
+
+EVENT_LIST_PAGE_SIZE = 24
+EVENT_CURSOR_FORMAT = "%Y%m%d%H%M%S%f"
+EVENT_LIST_CACHE_TIMEOUT = 60 * 5
+EVENT_LIST_CACHE_VERSION_KEY = "xr_events:event_list_version"
+EVENT_FEED_VALIDATORS_KEY = "xr_events:event_feed_validators:{}"
+EVENT_FEED_PAST_DAYS = 365
+EVENT_DATE_ROUTES_CACHE_KEY = "xr_events:event_date_routes:{}"
+EVENT_DATE_ROUTES_CACHE_TIMEOUT = 60 * 60 * 24
+# the window around today, in which recurring dates are indexed
+EVENT_RECURRENCE_PAST_DAYS = EVENT_FEED_PAST_DAYS
+EVENT_RECURRENCE_FUTURE_DAYS = 400
+EVENT_RECURRENCE_DETAIL_DAYS = 90
+EVENT_CALENDAR_TOP_EVENTS = 3
+EVENT_CALENDAR_CACHE_KEY = "xr_events:event_calendar:{}:{}:{}"
+EVENT_CALENDAR_CACHE_TIMEOUT = 60 * 60 * 24
+EVENT_CALENDAR_VERSION_KEY = "xr_events:event_calendar_version:{}"
+# the years of the calendar and the archive, far from the limits of datetime.date
+EVENT_CALENDAR_MIN_YEAR = 1900
+EVENT_CALENDAR_MAX_YEAR = 2999
+EVENT_ARCHIVE_CACHE_KEY = "xr_events:event_archive:{}:{}:{}"
+EVENT_ARCHIVE_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+# max-age of archive pages for anonymous users and proxies
+EVENT_ARCHIVE_MAX_AGE = 60 * 60 * 24
+EVENT_UPCOMING_COUNT = 3
+EVENT_UPCOMING_CACHE_KEY = "xr_events:upcoming_events:{}:{}:{}"
+EVENT_UPCOMING_CACHE_TIMEOUT = 60 * 60 * 24
+EVENT_UPCOMING_VERSION_KEY = "xr_events:upcoming_events_version:{}"
+EVENT_UPCOMING_PAGE_CACHE_TAG = "upcoming_events:{}"
+EVENT_SHADOW_CACHE_KEY = "xr_events:shadowed_event:{}:{}"
+EVENT_SHADOW_CACHE_TIMEOUT = 60 * 60 * 24
+EVENT_API_PAGE_SIZE = 50
+EVENT_API_MAX_PAGE_SIZE = 200
+EVENT_API_FIELDS = [
+    "date_id",
+    "event_id",
+    "title",
+    "url",
+    "start",
+    "end",
+    "location",
+    "group",
+    "organisers",
+    "description",
+]
+# nominatim allows one request per second
+EVENT_GEOCODE_DELAY = 1.0
+EVENT_GEO_SEARCH_LIMIT = 50
+EVENT_GEO_SEARCH_MAX_RADIUS = 250
+
 EVENT_MODERATORS_SUFFIX = "Event Moderators"
 EVENT_EDITORS_SUFFIX = "Event Editors"
 EVENT_AUTH_GROUP_TYPES = [EVENT_MODERATORS_SUFFIX, EVENT_EDITORS_SUFFIX]
@@ -17,26 +95,37 @@ EDITORS_EVENT_PERMISSIONS = EDITORS_PAGE_PERMISSIONS
 
 
 def get_event_list_page(request=None):
+    return get_navigation(request).get("event_list_page", _load_event_list_page)
+
+
+def _load_event_list_page(navigation):
     from .models import EventListPage
 
-    home_page = get_home_page(request)
+    home_page = navigation.home_page
 
     try:
-        event_list_page = EventListPage.objects.child_of(home_page).live().get()
+        event_list_page = defer_stream_fields(
+            EventListPage.objects.child_of(home_page).live()
+        ).get()
     except (KeyError, AttributeError, EventListPage.DoesNotExist):
         return None
     return event_list_page
 
 
 def get_event_group_pages(request=None):
+    return get_navigation(request).get("event_group_pages", _load_event_group_pages)
+
+
+def _load_event_group_pages(navigation):
     from .models import EventGroupPage
 
-    event_list_page = get_event_list_page(request)
+    event_list_page = navigation.get("event_list_page", _load_event_list_page)
 
     try:
         event_group_pages = (
-            EventGroupPage.objects.child_of(event_list_page)
+            defer_stream_fields(EventGroupPage.objects.child_of(event_list_page))
             .live()
+            .select_related("group")
             .order_by("-group__is_regional_group", "group__name")
         )
     except (KeyError, AttributeError, EventGroupPage.DoesNotExist):
@@ -48,7 +137,7 @@ def get_event_group_pages(request=None):
     #     local_pages = [page for page in event_group_pages if not page.is_regional_group]
     #     event_group_pages = regional_pages + local_pages
 
-    return event_group_pages
+    return list(event_group_pages)
 
 
 def date_range_from_days(days):
@@ -65,3 +154,1682 @@ def date_range_from_days(days):
         to_date = localdate() + datetime.timedelta(days=30)
 
     return from_date, to_date
+
+
+def local_day_start(date):
+    return make_aware(datetime.datetime.combine(date, datetime.time.min))
+
+
+def get_local_days(start, end):
+    """The (local) dates from start to end, including both."""
+    day = localtime(start).date()
+    last_day = localtime(end).date()
+    while day <= last_day:
+        yield day
+        day += datetime.timedelta(1)
+
+
+# Event bounds
+
+
+def get_event_bounds(event_page):
+    """
+    Returns the start_date and end_date of the given EventPage: the first start
+    and the last start or end of all its dates and recurrences. The end_date
+    is None for endless recurrences, both are None for events without dates.
+
+    Dates, that were changed in memory (e.g. by the edit form) and are not
+    saved yet, are used as they are, otherwise a single query aggregates them.
+    """
+    from .models import EventDate
+
+    bounds = []
+
+    dates = getattr(event_page, "_cluster_related_objects", {}).get("dates")
+    if dates is not None:
+        if dates:
+            bounds.append(
+                (
+                    min(date.start for date in dates),
+                    max(max(date.start, date.end or date.start) for date in dates),
+                )
+            )
+    elif event_page.pk:
+        aggregate = EventDate.objects.filter(event_page_id=event_page.pk).aggregate(
+            min_start=Min("start"), max_start=Max("start"), max_end=Max("end")
+        )
+        if aggregate["min_start"]:
+            bounds.append(_get_date_bounds(aggregate))
+
+    # recurrences are never expanded, the first and last date are calculated
+    for recurrence in event_page.recurrences.all():
+        recurrence_bounds = _get_recurrence_bounds(recurrence)
+        if recurrence_bounds:
+            bounds.append(recurrence_bounds)
+
+    return _combine_bounds(bounds)
+
+
+@transaction.atomic
+def recompute_event_bounds(chunk_size=500):
+    """
+    Recomputes start_date and end_date of all EventPages in bulk.
+    Returns the number of updated event pages.
+    """
+    from .models import EventDate, EventPage, EventRecurrence
+
+    bounds_by_event = {}
+    for aggregate in (
+        EventDate.objects.order_by()
+        .values("event_page_id")
+        .annotate(min_start=Min("start"), max_start=Max("start"), max_end=Max("end"))
+    ):
+        bounds_by_event[aggregate["event_page_id"]] = [_get_date_bounds(aggregate)]
+
+    for recurrence in EventRecurrence.objects.iterator():
+        recurrence_bounds = _get_recurrence_bounds(recurrence)
+        if recurrence_bounds:
+            bounds_by_event.setdefault(recurrence.event_page_id, []).append(
+                recurrence_bounds
+            )
+
+    event_pages = EventPage.objects.order_by("pk").only("start_date", "end_date")
+    count = 0
+    for offset in range(0, event_pages.count(), chunk_size):
+        end = offset + chunk_size
+        changed = []
+        for event_page in event_pages[offset:end]:
+            bounds = _combine_bounds(bounds_by_event.get(event_page.pk, []))
+            if (event_page.start_date, event_page.end_date) != bounds:
+                event_page.start_date, event_page.end_date = bounds
+                changed.append(event_page)
+
+        EventPage.objects.bulk_update(changed, ["start_date", "end_date"])
+        count += len(changed)
+
+    logger.info("Recomputed the start and end dates of %d events.", count)
+    return count
+
+
+def _get_date_bounds(aggregate):
+    max_end = aggregate["max_end"] or aggregate["max_start"]
+    return aggregate["min_start"], max(aggregate["max_start"], max_end)
+
+
+def _get_recurrence_bounds(recurrence):
+    first_date = recurrence.get_first_date()
+    if not first_date:
+        return None
+    last_date = recurrence.get_last_date()
+    if not last_date:
+        return first_date.start, None
+    return first_date.start, last_date.end or last_date.start
+
+
+def _combine_bounds(bounds):
+    """Combines (start, end) pairs, an end of None stands for endless."""
+    if not bounds:
+        return None, None
+    start = min(start for start, end in bounds)
+    ends = [end for start, end in bounds]
+    return start, None if None in ends else max(ends)
+
+
+# Event occurrence index
+
+
+def get_event_recurrence_window():
+    today = localdate()
+    return (
+        today - datetime.timedelta(days=EVENT_RECURRENCE_PAST_DAYS),
+        today + datetime.timedelta(days=EVENT_RECURRENCE_FUTURE_DAYS),
+    )
+
+
+def build_event_occurrences(event_pages):
+    """
+    Returns unsaved EventOccurrence rows for the given event pages:
+    one per EventDate for the organising group and one per EventDate
+    and ShadowEventPage for each shadowing group. EventRecurrences are
+    expanded within get_event_recurrence_window() only.
+    """
+    from .models import EventDate, EventOccurrence, EventRecurrence, ShadowEventPage
+
+    event_pages = {event_page.pk: event_page for event_page in event_pages}
+    if not event_pages:
+        return []
+
+    shadows_by_event = {}
+    for shadow in ShadowEventPage.objects.filter(
+        original_event_id__in=event_pages.keys()
+    ).order_by("pk"):
+        shadows_by_event.setdefault(shadow.original_event_id, []).append(shadow)
+
+    # (event_date, recurrence) pairs, only one of them is set
+    dates = [
+        (event_date, None)
+        for event_date in EventDate.objects.filter(event_page_id__in=event_pages.keys())
+    ]
+    from_date, to_date = get_event_recurrence_window()
+    for recurrence in EventRecurrence.objects.filter(
+        event_page_id__in=event_pages.keys()
+    ):
+        dates += [
+            (event_date, recurrence)
+            for event_date in recurrence.iter_dates(from_date, to_date)
+        ]
+    dates.sort(key=lambda date: (date[0].start, date[0].pk or 0))
+
+    geo_locations = get_geocoded_locations(
+        event_date.location or event_pages[event_date.event_page_id].location
+        for event_date, recurrence in dates
+    )
+
+    archived_before = local_day_start(localdate())
+    occurrences = []
+    event_days = set()
+    for event_date, recurrence in dates:
+        event_page = event_pages[event_date.event_page_id]
+        start = event_date.start
+        end = max(start, event_date.end) if event_date.end else start
+        location = event_date.location or event_page.location
+        geo_location = geo_locations.get(normalize_location(location)[:255])
+        if recurrence:
+            event_date = None
+
+        # the first date of the event on any of the days it covers
+        days = {(event_page.pk, day) for day in get_local_days(start, end)}
+        first_of_day = not days <= event_days
+        event_days |= days
+
+        occurrences.append(
+            EventOccurrence(
+                event_date=event_date,
+                recurrence=recurrence,
+                event_page=event_page,
+                group_id=event_page.group_id,
+                start=start,
+                end=end,
+                location=location,
+                geo_location=geo_location,
+                live=event_page.live,
+                first_of_day=first_of_day,
+                archived=end < archived_before,
+            )
+        )
+
+        group_ids = {event_page.group_id}
+        for shadow in shadows_by_event.get(event_page.pk, []):
+            if shadow.group_id in group_ids:
+                continue
+            group_ids.add(shadow.group_id)
+            occurrences.append(
+                EventOccurrence(
+                    event_date=event_date,
+                    recurrence=recurrence,
+                    event_page=event_page,
+                    shadow_event=shadow,
+                    group_id=shadow.group_id,
+                    start=start,
+                    end=end,
+                    location=location,
+                    geo_location=geo_location,
+                    live=event_page.live and shadow.live,
+                    first_of_day=first_of_day,
+                    archived=end < archived_before,
+                )
+            )
+
+    return occurrences
+
+
+def event_occurrences_changed(group_ids, months=None):
+    """
+    Invalidates the event list cache, the feeds and upcoming events of the
+    given groups and the calendars of the given months (all months, if None),
+    as soon as the current transaction is committed.
+    """
+    group_ids = set(group_ids)
+    if months is not None:
+        months = set(months)
+
+    def invalidate():
+        invalidate_event_list_cache()
+        touch_event_feeds(group_ids)
+        invalidate_event_calendars(months)
+        invalidate_upcoming_events(group_ids)
+
+    transaction.on_commit(invalidate)
+
+
+@transaction.atomic
+def update_event_occurrences(event_page):
+    from .models import EventOccurrence
+
+    old_occurrences = EventOccurrence.objects.filter(event_page_id=event_page.pk)
+    group_ids = set()
+    months = set()
+    for group_id, start, end in old_occurrences.values_list("group_id", "start", "end"):
+        group_ids.add(group_id)
+        months.update(get_event_months(start, end))
+    old_occurrences.delete()
+
+    occurrences = build_event_occurrences([event_page])
+    EventOccurrence.objects.bulk_create(occurrences)
+
+    for occurrence in occurrences:
+        group_ids.add(occurrence.group_id)
+        months.update(get_event_months(occurrence.start, occurrence.end))
+    event_occurrences_changed(group_ids, months)
+
+
+@transaction.atomic
+def update_shadow_event_occurrences(shadow_event):
+    from .models import EventOccurrence, EventPage
+
+    # the original event may have changed, so drop the old rows first
+    old_occurrences = EventOccurrence.objects.filter(shadow_event_id=shadow_event.pk)
+    months = set()
+    for start, end in old_occurrences.values_list("start", "end"):
+        months.update(get_event_months(start, end))
+    old_occurrences.delete()
+    event_occurrences_changed([shadow_event.group_id], months)
+
+    if shadow_event.original_event_id:
+        event_page = EventPage.objects.get(pk=shadow_event.original_event_id)
+        update_event_occurrences(event_page)
+
+
+@transaction.atomic
+def rebuild_event_occurrences(chunk_size=500):
+    from xr_pages.models import LocalGroup
+    from .models import EventOccurrence, EventPage
+
+    EventOccurrence.objects.all().delete()
+
+    event_pages = EventPage.objects.order_by("pk")
+    count = 0
+    for offset in range(0, event_pages.count(), chunk_size):
+        end = offset + chunk_size
+        occurrences = build_event_occurrences(event_pages[offset:end])
+        EventOccurrence.objects.bulk_create(occurrences, batch_size=chunk_size)
+        count += len(occurrences)
+
+    event_occurrences_changed(LocalGroup.objects.values_list("pk", flat=True))
+    logger.info("Rebuilt %d event occurrences.", count)
+    return count
+
+
+def extend_event_recurrences():
+    """
+    Moves the window of indexed recurring dates on to the current day.
+    Should be run daily, otherwise recurring dates run out of the listings.
+    """
+    from .models import EventPage
+
+    event_pages = EventPage.objects.filter(recurrences__isnull=False).distinct()
+    count = 0
+    for event_page in event_pages.order_by("pk").iterator():
+        update_event_occurrences(event_page)
+        count += 1
+
+    logger.info("Extended the recurring dates of %d events.", count)
+    return count
+
+
+def check_event_occurrences():
+    """
+    Compares the occurrence index with the EventDate querysets, it replaces
+    in the event listings. Returns a list of human readable problems.
+    """
+    from xr_pages.models import LocalGroup
+    from .models import EventDate, EventOccurrence
+
+    problems = []
+
+    def compare(label, event_date_qs, occurrence_qs):
+        expected = set(event_date_qs.values_list("id", flat=True))
+        indexed = set(
+            occurrence_qs.filter(event_date__isnull=False).values_list(
+                "event_date_id", flat=True
+            )
+        )
+        for event_date_id in sorted(expected - indexed):
+            problems.append("{}: EventDate {} is missing.".format(label, event_date_id))
+        for event_date_id in sorted(indexed - expected):
+            problems.append(
+                "{}: EventDate {} should not be listed.".format(label, event_date_id)
+            )
+
+    compare("all", EventDate.objects.live(), EventOccurrence.objects.live().owned())
+    compare(
+        "upcoming",
+        EventDate.objects.live().upcoming(),
+        EventOccurrence.objects.live().owned().upcoming(),
+    )
+    for group in LocalGroup.objects.filter(eventgrouppage__isnull=False):
+        compare(
+            group.name,
+            EventDate.objects.live().for_group(group),
+            EventOccurrence.objects.live().for_group(group),
+        )
+
+    for occurrence in (
+        EventOccurrence.objects.filter(event_date__isnull=False)
+        .select_related("event_date")
+        .exclude(start=F("event_date__start"))
+    ):
+        problems.append(
+            "EventOccurrence {} has an outdated start.".format(occurrence.pk)
+        )
+
+    for occurrence_id in EventOccurrence.objects.filter(
+        archived=True, end__gte=local_day_start(localdate())
+    ).values_list("pk", flat=True):
+        problems.append(
+            "EventOccurrence {} should not be archived.".format(occurrence_id)
+        )
+
+    return problems
+
+
+def archive_event_occurrences():
+    """
+    Archives the occurrences, that ended before today. Should be run daily,
+    otherwise past occurrences stay in the index partition of upcoming events.
+    The listings don't change, so no caches need to be invalidated.
+    """
+    from .models import EventOccurrence
+
+    count = (
+        EventOccurrence.objects.current()
+        .filter(end__lt=local_day_start(localdate()))
+        .update(archived=True)
+    )
+    logger.info("Archived %d event occurrences.", count)
+    return count
+
+
+# Nearby search
+
+
+def search_events_nearby(
+    bounding_box=None, point=None, radius=None, limit=EVENT_GEO_SEARCH_LIMIT
+):
+    """
+    Returns upcoming EventOccurrences within the bounding box
+    (south, west, north, east) or within radius km around the point
+    (latitude, longitude), ordered by start. The occurrences carry the
+    distance to the point, if given.
+    """
+    from .models import EventOccurrence
+
+    if point:
+        bounding_box = get_bounding_box(point[0], point[1], radius)
+
+    occurrences = (
+        EventOccurrence.objects.live()
+        .owned()
+        .first_of_day()
+        .upcoming()
+        .in_bounding_box(*bounding_box)
+        .select_related("geo_location", "event_date", "recurrence", "event_page__group")
+    )
+
+    results = []
+    for occurrence in occurrences.iterator(chunk_size=limit):
+        if point:
+            occurrence.distance = get_distance(
+                point[0],
+                point[1],
+                occurrence.geo_location.latitude,
+                occurrence.geo_location.longitude,
+            )
+            # the corners of the bounding box are out of radius
+            if occurrence.distance > radius:
+                continue
+        results.append(occurrence)
+        if len(results) >= limit:
+            break
+    return results
+
+
+# Event listing pagination
+
+
+def encode_event_cursor(occurrence):
+    start = occurrence.start.astimezone(utc).strftime(EVENT_CURSOR_FORMAT)
+    return "{}_{}".format(start, occurrence.pk)
+
+
+def decode_event_cursor(value):
+    try:
+        start, pk = value.split("_")
+        start = make_aware(datetime.datetime.strptime(start, EVENT_CURSOR_FORMAT), utc)
+        return start, int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def paginate_event_occurrences(queryset, cursor=None, page_size=EVENT_LIST_PAGE_SIZE):
+    """
+    Returns one page of the given EventOccurrence queryset and the cursor
+    of the next page, which is None on the last page.
+    """
+    if cursor:
+        queryset = queryset.after(*cursor)
+
+    # fetch one more occurrence, to find out if there is a next page
+    limit = page_size + 1
+    occurrences = list(queryset[:limit])
+
+    next_cursor = None
+    if len(occurrences) > page_size:
+        occurrences = occurrences[:page_size]
+        next_cursor = encode_event_cursor(occurrences[-1])
+
+    return occurrences, next_cursor
+
+
+def get_event_list_cache_version():
+    return cache.get_or_set(EVENT_LIST_CACHE_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate_event_list_cache():
+    cache.set(EVENT_LIST_CACHE_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def get_event_occurrence_page(
+    queryset, filter_key, cursor=None, page_size=EVENT_LIST_PAGE_SIZE
+):
+    """
+    Like paginate_event_occurrences, but the occurrence ids of the page are
+    cached under the canonical filter_key, so that all users (and workers)
+    requesting the same filter share the result. The cache is invalidated
+    by any change to the occurrence index.
+    """
+    cache_key = "xr_events:event_list:{}:{}".format(
+        get_event_list_cache_version(),
+        hashlib.md5(
+            "{}|{}|{}".format(filter_key, cursor or "", page_size).encode()
+        ).hexdigest(),
+    )
+
+    cached = cache.get(cache_key)
+    if cached is None:
+        occurrences, next_cursor = paginate_event_occurrences(
+            queryset.with_card_data(), cursor=cursor, page_size=page_size
+        )
+        occurrence_ids = [occurrence.pk for occurrence in occurrences]
+        cache.set(cache_key, (occurrence_ids, next_cursor), EVENT_LIST_CACHE_TIMEOUT)
+        return occurrences, next_cursor
+
+    occurrence_ids, next_cursor = cached
+    occurrences = list(
+        queryset.model.objects.filter(pk__in=occurrence_ids).with_card_data()
+    )
+    return occurrences, next_cursor
+
+
+# Upcoming events
+
+
+def get_upcoming_events_cache_version(group_id):
+    return cache.get_or_set(
+        EVENT_UPCOMING_VERSION_KEY.format(group_id or "all"), uuid.uuid4().hex, None
+    )
+
+
+def invalidate_upcoming_events(group_ids):
+    """
+    Invalidates the upcoming events of the given groups and of all events
+    and purges the pages, that show them.
+    """
+    keys = [EVENT_UPCOMING_VERSION_KEY.format(group_id) for group_id in group_ids]
+    keys.append(EVENT_UPCOMING_VERSION_KEY.format("all"))
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+    purge_page_cache(
+        *[EVENT_UPCOMING_PAGE_CACHE_TAG.format(group_id) for group_id in group_ids],
+        EVENT_UPCOMING_PAGE_CACHE_TAG.format("all")
+    )
+
+
+def get_upcoming_events_page_cache_tags(group_id, occurrences):
+    """
+    The page cache tags of the upcoming events of the given group (or of
+    all events, if group_id is None) and of their images.
+    """
+    tags = {EVENT_UPCOMING_PAGE_CACHE_TAG.format(group_id or "all")}
+    for occurrence in occurrences:
+        image = occurrence.event_page.get_image()
+        if image:
+            tags.add(PAGE_CACHE_IMAGE_TAG.format(image.pk))
+    return tags
+
+
+def get_upcoming_event_occurrences(group_id=None, count=EVENT_UPCOMING_COUNT):
+    """
+    Returns the next count occurrences of the given group (or of all events,
+    if group_id is None), one per event and day, like on the event list.
+
+    The occurrence ids are cached per group and count, until an event of the
+    group changes or the earliest ending of them is no longer upcoming.
+    """
+    from .models import EventOccurrence
+
+    cache_key = EVENT_UPCOMING_CACHE_KEY.format(
+        group_id or "all", count, get_upcoming_events_cache_version(group_id)
+    )
+
+    occurrence_ids = cache.get(cache_key)
+    if occurrence_ids is not None:
+        return list(
+            EventOccurrence.objects.filter(pk__in=occurrence_ids).with_card_data()
+        )
+
+    queryset = EventOccurrence.objects.live().first_of_day().upcoming()
+    if group_id:
+        queryset = queryset.for_group(group_id)
+    else:
+        queryset = queryset.owned()
+
+    occurrences = list(queryset.with_card_data()[:count])
+    cache.set(
+        cache_key,
+        [occurrence.pk for occurrence in occurrences],
+        get_upcoming_events_cache_timeout(occurrences),
+    )
+    return occurrences
+
+
+def get_upcoming_events_cache_timeout(occurrences):
+    """
+    The seconds until the first of the given occurrences drops out of
+    upcoming(), which is at the start of the day after its end.
+    """
+    timeout = EVENT_UPCOMING_CACHE_TIMEOUT
+    if occurrences:
+        end = min(occurrence.end for occurrence in occurrences)
+        expires = local_day_start(localtime(end).date() + datetime.timedelta(1))
+        seconds = int((expires - timezone.now()).total_seconds())
+        timeout = max(min(timeout, seconds), 1)
+    return timeout
+
+
+# JSON API
+
+
+def get_event_api_etag(queryset, key):
+    """
+    A strong ETag of the given EventOccurrence queryset, built from the
+    latest publishing of the listed events and of their shadows, so that it
+    can be compared without loading the occurrences. The occurrence count
+    and ids change with every update of the index, e.g. deleted events.
+    The names of the organising groups are part of the listed data, too.
+    """
+    from xr_pages.models import LocalGroup
+
+    state = queryset.aggregate(
+        last_published=Max("event_page__last_published_at"),
+        shadow_last_published=Max("event_page__shadow_events__last_published_at"),
+        count=Count("pk", distinct=True),
+        max_id=Max("pk"),
+    )
+    state["organisers"] = list(
+        LocalGroup.objects.filter(
+            Q(pk__in=queryset.values("event_page__group_id"))
+            | Q(pk__in=queryset.values("event_page__shadow_events__group_id"))
+        )
+        .order_by("pk")
+        .values_list("pk", "name")
+    )
+    value = "{}|{}".format(key, sorted(state.items()))
+    return '"{}"'.format(hashlib.md5(value.encode()).hexdigest())
+
+
+def serialize_event_occurrence(occurrence, fields, request=None):
+    """
+    Returns a dict with the given EVENT_API_FIELDS of an EventOccurrence,
+    that was loaded with_card_data.
+    """
+    event_page = occurrence.event_page
+    data = {}
+    for field in fields:
+        if field == "date_id":
+            # recurring dates have no id
+            data[field] = occurrence.event_date_id
+        elif field == "event_id":
+            data[field] = event_page.pk
+        elif field == "title":
+            data[field] = event_page.title
+        elif field == "url":
+            url = event_page.get_url(request)
+            if occurrence.event_date_id:
+                url = "{}{}/".format(url, occurrence.event_date_id)
+            data[field] = url
+        elif field == "start":
+            data[field] = localtime(occurrence.start).isoformat()
+        elif field == "end":
+            data[field] = localtime(occurrence.end).isoformat()
+        elif field == "location":
+            data[field] = occurrence.location
+        elif field == "group":
+            data[field] = event_page.group.name
+        elif field == "organisers":
+            data[field] = [
+                organiser.name for organiser in event_page.get_all_organisers()
+            ]
+        elif field == "description":
+            data[field] = event_page.description
+    return data
+
+
+# Routing
+
+# (version, routes) of the latest event date routes used by this process
+_event_date_routes = (None, {})
+
+
+def get_event_date_routes():
+    """
+    Returns a dict of event_date_id -> event page id, for resolving
+    /<event group>/<anything>/<event_date_id>/ urls. Like the page routes,
+    it is kept in process memory and in the cache. It shares its version
+    with the event list cache, which changes with every saved event.
+    Returns None, if the cache doesn't know a version (yet).
+    """
+    from .models import EventDate
+
+    global _event_date_routes
+
+    version = cache.get(EVENT_LIST_CACHE_VERSION_KEY)
+    if version is None:
+        cache.add(EVENT_LIST_CACHE_VERSION_KEY, uuid.uuid4().hex, None)
+        return None
+
+    local_version, routes = _event_date_routes
+    if local_version == version:
+        return routes
+
+    cache_key = EVENT_DATE_ROUTES_CACHE_KEY.format(version)
+    routes = cache.get(cache_key)
+    if routes is None:
+        routes = dict(EventDate.objects.values_list("id", "event_page_id"))
+        cache.set(cache_key, routes, EVENT_DATE_ROUTES_CACHE_TIMEOUT)
+
+    _event_date_routes = (version, routes)
+    return routes
+
+
+# Calendar
+
+
+def get_event_months(start, end):
+    """The (year, month) pairs of all local days between start and end."""
+    start = localtime(start).date()
+    end = localtime(end).date()
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def invalidate_event_calendars(months=None):
+    """Invalidates the calendars of the given (year, month) pairs, or all."""
+    if months is None:
+        keys = [EVENT_CALENDAR_VERSION_KEY.format("all")]
+    else:
+        keys = [
+            EVENT_CALENDAR_VERSION_KEY.format("{}-{:02d}".format(year, month))
+            for year, month in months
+        ]
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+
+def get_event_calendar_version(months):
+    """
+    A hash of the versions of the given (year, month) pairs, that changes
+    with any invalidate_event_calendars call affecting one of them.
+    """
+    version_keys = [EVENT_CALENDAR_VERSION_KEY.format("all")] + [
+        EVENT_CALENDAR_VERSION_KEY.format("{}-{:02d}".format(year, month))
+        for year, month in months
+    ]
+    versions = cache.get_many(version_keys)
+    missing = {key: uuid.uuid4().hex for key in version_keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+
+    return hashlib.md5(
+        ":".join(versions[key] for key in version_keys).encode()
+    ).hexdigest()
+
+
+def get_event_calendar_month(group_id, year, month):
+    """
+    Returns the day buckets of a month of the calendar of the given group
+    (or of all events, if group_id is None): a dict of date -> (count,
+    occurrence_ids), with the number of events on that day and the
+    occurrences of the first EVENT_CALENDAR_TOP_EVENTS of them.
+
+    The buckets are computed once per group and month and are cached,
+    until an event of that month changes.
+    """
+    cache_key = EVENT_CALENDAR_CACHE_KEY.format(
+        group_id or "all",
+        "{}-{:02d}".format(year, month),
+        get_event_calendar_version([(year, month)]),
+    )
+    buckets = cache.get(cache_key)
+    if buckets is None:
+        buckets = build_event_calendar_month(group_id, year, month)
+        cache.set(cache_key, buckets, EVENT_CALENDAR_CACHE_TIMEOUT)
+    return buckets
+
+
+def build_event_calendar_month(group_id, year, month):
+    """
+    Computes the day buckets of get_event_calendar_month with a single
+    query. Events spanning several days are counted on each of them.
+    """
+    from .models import EventOccurrence
+
+    first_day = datetime.date(year, month, 1)
+    last_day = first_day.replace(day=calendar.monthrange(year, month)[1])
+
+    occurrences = EventOccurrence.objects.live().date_range((first_day, last_day))
+    if group_id:
+        occurrences = occurrences.for_group(group_id)
+    else:
+        occurrences = occurrences.owned()
+
+    # day -> {event_page_id: occurrence_id}, the dicts keep the start order
+    days = {}
+    for occurrence_id, event_page_id, start, end in occurrences.values_list(
+        "id", "event_page_id", "start", "end"
+    ):
+        day = max(localtime(start).date(), first_day)
+        last = min(localtime(end).date(), last_day)
+        while day <= last:
+            days.setdefault(day, {}).setdefault(event_page_id, occurrence_id)
+            day += datetime.timedelta(1)
+
+    return {
+        day: (len(events), list(events.values())[:EVENT_CALENDAR_TOP_EVENTS])
+        for day, events in days.items()
+    }
+
+
+def get_event_calendar_weeks(group_id, first_day, last_day):
+    """
+    Returns the weeks (lists of seven days, starting on monday) between
+    first_day and last_day for rendering a calendar. Each day is a dict of
+    date, count, occurrences (of the top events) and more (their rest).
+    """
+    from .models import EventOccurrence
+
+    first_day -= datetime.timedelta(first_day.weekday())
+    last_day += datetime.timedelta(6 - last_day.weekday())
+
+    buckets = {}
+    for year, month in get_event_months(
+        local_day_start(first_day), local_day_start(last_day)
+    ):
+        buckets.update(get_event_calendar_month(group_id, year, month))
+
+    occurrence_ids = set()
+    for count, ids in buckets.values():
+        occurrence_ids.update(ids)
+    occurrences = EventOccurrence.objects.filter(pk__in=occurrence_ids).select_related(
+        "event_page", "event_date", "recurrence"
+    )
+    occurrences = {occurrence.pk: occurrence for occurrence in occurrences}
+
+    weeks = []
+    day = first_day
+    while day <= last_day:
+        count, ids = buckets.get(day, (0, []))
+        day_occurrences = [occurrences[pk] for pk in ids if pk in occurrences]
+        if not weeks or len(weeks[-1]) == 7:
+            weeks.append([])
+        weeks[-1].append(
+            {
+                "date": day,
+                "count": count,
+                "occurrences": day_occurrences,
+                "more": count - len(day_occurrences),
+            }
+        )
+        day += datetime.timedelta(1)
+    return weeks
+
+
+# Archive
+
+
+def get_event_archive_months(year):
+    """
+    The (year, month) pairs of the given year, that lie completely in the
+    past. Their events don't change anymore, apart from editorial changes.
+    """
+    today = localdate()
+    return [
+        (year, month)
+        for month in range(1, 13)
+        if (year, month) < (today.year, today.month)
+    ]
+
+
+def get_event_archive_year(group_id, year):
+    """
+    Returns the number of listed events (one per event and day) in each
+    archived month of the year, as a dict of (year, month) -> count, for the
+    given group (or of all events, if group_id is None). It's computed with
+    a single aggregate query and cached, until an event of the year changes.
+    """
+    months = get_event_archive_months(year)
+    if not months:
+        return {}
+
+    cache_key = EVENT_ARCHIVE_CACHE_KEY.format(
+        group_id or "all", year, get_event_calendar_version(months)
+    )
+    counts = cache.get(cache_key)
+    if counts is None:
+        last_year, last_month = months[-1]
+        occurrences = _get_event_archive_occurrences(
+            group_id, datetime.date(year, 1, 1), _get_next_month(last_year, last_month)
+        )
+        counts = dict.fromkeys(months, 0)
+        for row in (
+            occurrences.annotate(
+                month=TruncMonth("start", tzinfo=timezone.get_current_timezone())
+            )
+            .values("month")
+            .annotate(count=Count("pk"))
+            .order_by()
+        ):
+            counts[(row["month"].year, row["month"].month)] = row["count"]
+        cache.set(cache_key, counts, EVENT_ARCHIVE_CACHE_TIMEOUT)
+    return counts
+
+
+def get_event_archive_month(group_id, year, month):
+    """
+    Returns the ids of the occurrences (one per event and day) starting in
+    an archived month, for the given group (or of all events, if group_id is
+    None). They are cached, until an event of that month changes.
+    """
+    cache_key = EVENT_ARCHIVE_CACHE_KEY.format(
+        group_id or "all",
+        "{}-{:02d}".format(year, month),
+        get_event_calendar_version([(year, month)]),
+    )
+    occurrence_ids = cache.get(cache_key)
+    if occurrence_ids is None:
+        occurrences = _get_event_archive_occurrences(
+            group_id, datetime.date(year, month, 1), _get_next_month(year, month)
+        )
+        occurrence_ids = list(occurrences.values_list("pk", flat=True))
+        cache.set(cache_key, occurrence_ids, EVENT_ARCHIVE_CACHE_TIMEOUT)
+    return occurrence_ids
+
+
+def _get_event_archive_occurrences(group_id, from_date, to_date):
+    """The listed occurrences starting between from_date and (before) to_date."""
+    from .models import EventOccurrence
+
+    occurrences = (
+        EventOccurrence.objects.live()
+        .first_of_day()
+        .all_partitions()
+        .filter(
+            start__gte=local_day_start(from_date), start__lt=local_day_start(to_date)
+        )
+    )
+    if group_id:
+        return occurrences.for_group(group_id)
+    return occurrences.owned()
+
+
+def _get_next_month(year, month):
+    if month == 12:
+        return datetime.date(year + 1, 1, 1)
+    return datetime.date(year, month + 1, 1)
+
+
+# iCalendar feeds
+
+
+def touch_event_feeds(group_ids):
+    """
+    Marks the site wide feed and the feeds of the given groups as modified,
+    their validators are computed again on the next request.
+    """
+    cache.delete_many(
+        [EVENT_FEED_VALIDATORS_KEY.format(key) for key in ["all"] + sorted(group_ids)]
+    )
+
+
+def get_event_feed_occurrences(page):
+    """
+    The occurrences of the feed of an EventListPage (all events) or
+    EventGroupPage (the events of its group, including shadow events).
+    """
+    from .models import EventGroupPage, EventOccurrence
+
+    from_date = localdate() - datetime.timedelta(days=EVENT_FEED_PAST_DAYS)
+    occurrences = EventOccurrence.objects.live().end_after(from_date)
+
+    if isinstance(page, EventGroupPage):
+        return occurrences.for_group(page.group_id)
+    return occurrences.owned()
+
+
+def get_event_feed_validators(page):
+    """
+    Returns the ETag and the Last-Modified time of the feed of the given page.
+    Both are derived from the listed events: the time is the latest publish
+    of their pages, the ETag also changes if events are added or removed.
+    They are kept in the cache, so that conditional requests by calendar
+    clients can be answered without querying any events.
+    """
+    from wagtail.core.models import Page
+    from .models import EventGroupPage
+
+    key = "all"
+    if isinstance(page, EventGroupPage):
+        key = page.group_id
+    cache_key = EVENT_FEED_VALIDATORS_KEY.format(key)
+
+    validators = cache.get(cache_key)
+    if validators is None:
+        occurrences = get_event_feed_occurrences(page)
+        last_modified = (
+            Page.objects.filter(
+                Q(id__in=occurrences.values("event_page_id"))
+                | Q(id__in=occurrences.values("shadow_event_id"))
+            ).aggregate(Max("last_published_at"))["last_published_at__max"]
+            or page.last_published_at
+            or timezone.now()
+        )
+        stats = occurrences.aggregate(count=Count("id"), max_id=Max("id"))
+        etag = '"{}"'.format(
+            hashlib.md5(
+                "{}:{}:{}:{}".format(
+                    page.pk, last_modified.isoformat(), stats["count"], stats["max_id"]
+                ).encode()
+            ).hexdigest()
+        )
+        validators = etag, last_modified
+        cache.add(cache_key, validators, None)
+
+    return validators
+
+
+def generate_event_feed(request, page):
+    """
+    Yields the iCalendar feed of the given EventListPage or EventGroupPage
+    piece by piece, without loading all events at once.
+    """
+    host = request.get_host().split(":")[0]
+
+    yield _ical_lines(
+        [
+            ("BEGIN", "VCALENDAR"),
+            ("VERSION", "2.0"),
+            ("PRODID", "-//{}//Events//DE".format(host)),
+            ("CALSCALE", "GREGORIAN"),
+            ("METHOD", "PUBLISH"),
+            ("X-WR-CALNAME", _ical_escape(page.title)),
+        ]
+    )
+
+    occurrences = get_event_feed_occurrences(page).select_related(
+        "event_date", "recurrence", "event_page", "shadow_event"
+    )
+    for occurrence in occurrences.iterator(chunk_size=200):
+        event_date = occurrence.get_event_date()
+        event_page = occurrence.event_page
+        # shadow events are shown on the page of the shadowing group
+        page_url = (occurrence.shadow_event or event_page).get_url(request)
+
+        summary = event_page.title
+        if event_date.label:
+            summary = "{} | {}".format(summary, event_date.label)
+
+        if event_date.pk:
+            uid = "event-date-{}@{}".format(event_date.pk, host)
+        else:
+            uid = "event-recurrence-{}-{}@{}".format(
+                occurrence.recurrence_id, _ical_datetime(occurrence.start), host
+            )
+
+        lines = [
+            ("BEGIN", "VEVENT"),
+            ("UID", uid),
+            (
+                "DTSTAMP",
+                _ical_datetime(event_page.last_published_at or event_date.start),
+            ),
+            ("DTSTART", _ical_datetime(occurrence.start)),
+        ]
+        if occurrence.end > occurrence.start:
+            lines.append(("DTEND", _ical_datetime(occurrence.end)))
+        lines.append(("SUMMARY", _ical_escape(summary)))
+        if occurrence.location:
+            lines.append(("LOCATION", _ical_escape(occurrence.location)))
+        description = event_date.description or event_page.description
+        if description:
+            lines.append(("DESCRIPTION", _ical_escape(description)))
+        if page_url:
+            if event_date.pk:
+                page_url = "{}{}/".format(page_url, event_date.pk)
+            lines.append(("URL", request.build_absolute_uri(page_url)))
+        lines.append(("END", "VEVENT"))
+
+        yield _ical_lines(lines)
+
+    yield _ical_lines([("END", "VCALENDAR")])
+
+
+def _ical_datetime(value):
+    return value.astimezone(utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _ical_escape(value):
+    for char, escaped in [("\\", "\\\\"), (";", "\\;"), (",", "\\,")]:
+        value = value.replace(char, escaped)
+    return "\\n".join(value.splitlines())
+
+
+def _ical_lines(properties):
+    return "".join(
+        _ical_fold("{}:{}".format(name, value)) for name, value in properties
+    )
+
+
+def _ical_fold(line):
+    """Folds content lines longer than 75 octets, see RFC 5545, 3.1."""
+    parts = []
+    part = ""
+    for char in line:
+        limit = 75 if not parts else 74
+        if len((part + char).encode()) > limit:
+            parts.append(part)
+            part = ""
+        part += char
+    parts.append(part)
+    return "\r\n ".join(parts) + "\r\n"
+
+
+# Event detail
+
+
+def group_event_dates_by_day(dates):
+    """Returns (local day, dates) pairs of the given dates ordered by start."""
+    date_groups = []
+    for date in dates:
+        day = localtime(date.start).date()
+        if not date_groups or date_groups[-1][0] != day:
+            date_groups.append((day, []))
+        date_groups[-1][1].append(date)
+    return date_groups
+
+
+# Shadow events
+
+
+def get_shadowed_event(shadow_event):
+    """
+    Returns the ShadowedEvent of the given ShadowEventPage. It is cached by
+    the revisions of the original event and all of its shadows, so that
+    publishing any of them rebuilds it.
+    """
+    key = EVENT_SHADOW_CACHE_KEY.format(
+        shadow_event.pk, _get_shadow_revisions_hash(shadow_event)
+    )
+    shadowed_event = cache.get(key)
+    if shadowed_event is None:
+        shadowed_event = build_shadowed_event(shadow_event)
+        cache.set(key, shadowed_event, EVENT_SHADOW_CACHE_TIMEOUT)
+    return shadowed_event
+
+
+def build_shadowed_event(shadow_event):
+    from .models import EventOrganiser, EventPage, ShadowedEvent, ShadowEventPage
+
+    event = EventPage.objects.select_related("group", "image").get(
+        pk=shadow_event.original_event_id
+    )
+    # a fresh instance, without cached parents, that are expensive to pickle
+    shadow = ShadowEventPage.objects.select_related("group").get(pk=shadow_event.pk)
+    load_event_card_data([event])
+
+    other_shadows = (
+        ShadowEventPage.objects.live()
+        .filter(original_event_id=event.pk)
+        .exclude(pk=shadow_event.pk)
+        .select_related("group")
+        .order_by("path")
+    )
+    organisers = (
+        [shadow.group, event.group]
+        + [shadow.group for shadow in other_shadows]
+        + list(EventOrganiser.objects.filter(event_page_id=event.pk))
+    )
+
+    return ShadowedEvent(
+        event=event,
+        shadow_event=shadow,
+        organisers=tuple(organisers),
+        image=event.get_image(),
+        display_dates=tuple(event.get_display_dates()),
+    )
+
+
+def _get_shadow_revisions_hash(shadow_event):
+    from wagtail.core.models import Page
+
+    revisions = (
+        Page.objects.filter(
+            Q(pk=shadow_event.original_event_id)
+            | Q(shadoweventpage__original_event_id=shadow_event.original_event_id)
+        )
+        .order_by("pk")
+        .values_list("pk", "live", "live_revision_id", "latest_revision_created_at")
+    )
+    # the recurring dates on display depend on the current day
+    value = "{}:{}".format(localdate().isoformat(), list(revisions))
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+# Event import
+
+
+def parse_event_import(data, file_format):
+    """
+    Parses a csv or ical file into a list of event dicts, see
+    import_events. CSV files have a header with the columns uid, title,
+    start, end, location and description. Rows or VEVENTs with the same uid
+    are dates of the same event. Raises a ValidationError with the problems
+    of the whole file.
+    """
+    if file_format == "csv":
+        rows = _parse_event_csv(data)
+    elif file_format == "ics":
+        rows = _parse_event_ical(data)
+    else:
+        raise ValidationError("Unknown file format {}.".format(file_format))
+
+    errors = []
+    events = {}
+    for line, row in rows:
+        problems = []
+        for name in ["uid", "title", "start"]:
+            if not row.get(name):
+                problems.append("{} is missing".format(name))
+        try:
+            start = _parse_import_datetime(row.get("start"), row.get("start_tzid"))
+            end = _parse_import_datetime(row.get("end"), row.get("end_tzid"))
+        except ValueError as e:
+            problems.append(str(e))
+        else:
+            if start and end and end < start:
+                problems.append("end is before start")
+        if problems:
+            errors.append("Line {}: {}.".format(line, ", ".join(problems)))
+            continue
+
+        uid = row["uid"][:255]
+        if uid not in events:
+            events[uid] = {
+                "uid": uid,
+                "title": row["title"][:255],
+                "location": row.get("location", "")[:255],
+                "description": row.get("description", ""),
+                "dates": [],
+            }
+        events[uid]["dates"].append((start, end))
+
+    if errors:
+        raise ValidationError(errors)
+    if not events:
+        raise ValidationError("The file contains no events.")
+    return list(events.values())
+
+
+@transaction.atomic
+def import_events(event_group_page, events, owner=None):
+    """
+    Creates or updates the given events (see parse_event_import) below the
+    given EventGroupPage, identified by their uid within the group.
+
+    Instead of saving page by page, the pages are inserted into the tree,
+    their dates created and revisions saved in batches, without signals.
+    Unchanged events aren't touched. Returns the numbers of created,
+    updated and unchanged events.
+    """
+    from wagtail.core.models import Page
+    from .models import EventDate, EventOccurrence, EventPage
+
+    event_group_page = Page.objects.select_for_update().get(pk=event_group_page.pk)
+    group = event_group_page.specific.group
+
+    existing = {
+        event_page.import_uid: event_page
+        for event_page in EventPage.objects.filter(
+            group=group, import_uid__in=[event["uid"] for event in events]
+        )
+    }
+    created, updated, unchanged = [], [], 0
+    for event in events:
+        import_hash = _get_import_hash(event)
+        event_page = existing.get(event["uid"])
+        if not event_page:
+            event_page = EventPage(
+                import_uid=event["uid"], group=group, owner=owner, live=True
+            )
+            created.append(event_page)
+        elif event_page.import_hash != import_hash:
+            updated.append(event_page)
+        else:
+            unchanged += 1
+            continue
+
+        dates = sorted(event["dates"], key=lambda date: date[0])
+        event_page.title = event_page.draft_title = event["title"]
+        event_page.location = event["location"]
+        event_page.description = event["description"][:254]
+        event_page.content = _get_import_content(event["description"])
+        event_page.start_date = dates[0][0]
+        event_page.end_date = max(end or start for start, end in dates)
+        event_page.import_hash = import_hash
+        event_page._import_dates = dates
+
+    _insert_event_pages(event_group_page, created)
+
+    now = timezone.now()
+    for event_page in updated:
+        event_page.last_published_at = now
+    Page.objects.bulk_update(updated, ["title", "draft_title", "last_published_at"])
+    EventPage.objects.bulk_update(
+        updated,
+        [
+            "location",
+            "description",
+            "content",
+            "start_date",
+            "end_date",
+            "import_hash",
+        ],
+    )
+    EventDate.objects.filter(event_page__in=updated).delete()
+
+    EventDate.objects.bulk_create(
+        [
+            EventDate(event_page=event_page, start=start, end=end, sort_order=index)
+            for event_page in created + updated
+            for index, (start, end) in enumerate(event_page._import_dates)
+        ]
+    )
+
+    _save_import_revisions(created + updated, owner)
+
+    old_occurrences = EventOccurrence.objects.filter(event_page__in=updated)
+    months = set()
+    for start, end in old_occurrences.values_list("start", "end"):
+        months.update(get_event_months(start, end))
+    old_occurrences.delete()
+    occurrences = build_event_occurrences(created + updated)
+    EventOccurrence.objects.bulk_create(occurrences)
+    for occurrence in occurrences:
+        months.update(get_event_months(occurrence.start, occurrence.end))
+
+    group_ids = {occurrence.group_id for occurrence in occurrences} | {group.pk}
+    event_occurrences_changed(group_ids, months)
+    if created:
+        transaction.on_commit(invalidate_page_routes)
+    if created or updated:
+        # bulk_update and the tree inserts send no signals
+        purge_page_cache(
+            PAGE_CACHE_PAGE_TAG.format(event_group_page.pk),
+            *[PAGE_CACHE_PAGE_TAG.format(page.pk) for page in created + updated]
+        )
+
+    logger.info(
+        "Imported %d new and %d changed events, %d events are unchanged.",
+        len(created),
+        len(updated),
+        unchanged,
+    )
+    return len(created), len(updated), unchanged
+
+
+def _insert_event_pages(parent, event_pages):
+    """
+    Inserts the given EventPages as the last children of parent. The tree
+    paths are assigned here, since treebeard can only add one page at once.
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from wagtail.core.models import Page
+    from .models import EventPage
+
+    if not event_pages:
+        return
+
+    siblings = Page.objects.filter(
+        path__startswith=parent.path, depth=parent.depth + 1
+    ).order_by("path")
+    last_sibling = siblings.last()
+    steplen = EventPage.steplen
+    step = EventPage._str2int(last_sibling.path[-steplen:]) if last_sibling else 0
+    slugs = set(siblings.values_list("slug", flat=True))
+
+    content_type = ContentType.objects.get_for_model(EventPage)
+    now = timezone.now()
+    for event_page in event_pages:
+        step += 1
+        event_page.depth = parent.depth + 1
+        event_page.path = EventPage._get_path(parent.path, event_page.depth, step)
+        event_page.numchild = 0
+        event_page.slug = _get_unique_slug(event_page.title, slugs)
+        event_page.url_path = "{}{}/".format(parent.url_path, event_page.slug)
+        event_page.content_type = content_type
+        event_page.has_unpublished_changes = False
+        event_page.first_published_at = event_page.last_published_at = now
+
+    # bulk_create refuses multi-table inheritance, so the rows of both
+    # tables are inserted separately, see _insert_child_rows
+    Page.objects.bulk_create(
+        [
+            Page(
+                **{
+                    field.attname: getattr(event_page, field.attname)
+                    for field in Page._meta.concrete_fields
+                    if not field.primary_key
+                }
+            )
+            for event_page in event_pages
+        ]
+    )
+    page_ids = dict(
+        Page.objects.filter(
+            path__in=[event_page.path for event_page in event_pages]
+        ).values_list("path", "pk")
+    )
+    for event_page in event_pages:
+        event_page.pk = event_page.page_ptr_id = page_ids[event_page.path]
+    _insert_child_rows(EventPage, event_pages)
+
+    Page.objects.filter(pk=parent.pk).update(numchild=F("numchild") + len(event_pages))
+
+
+def _insert_child_rows(model, instances):
+    """
+    Inserts the rows of the given instances into the own table of model,
+    whose parent rows exist already, with a single executemany.
+    """
+    fields = model._meta.local_concrete_fields
+    quote_name = connection.ops.quote_name
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        quote_name(model._meta.db_table),
+        ", ".join(quote_name(field.column) for field in fields),
+        ", ".join(["%s"] * len(fields)),
+    )
+    params = [
+        [
+            field.get_db_prep_save(field.pre_save(instance, True), connection)
+            for field in fields
+        ]
+        for instance in instances
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def _save_import_revisions(event_pages, user):
+    """
+    Saves the imported state of the given EventPages as their live
+    revision, the admin edits the latest revision and would bring back
+    the data from before the import otherwise.
+    """
+    from modelcluster.models import get_all_child_relations
+    from wagtail.core.models import Page, PageRevision
+    from .models import EventPage
+
+    if not event_pages:
+        return
+
+    page_ids = [event_page.pk for event_page in event_pages]
+    now = timezone.now()
+    # to_json reads the child objects from the prefetched relations
+    child_relations = [
+        relation.get_accessor_name() for relation in get_all_child_relations(EventPage)
+    ]
+    PageRevision.objects.bulk_create(
+        [
+            PageRevision(
+                page_id=event_page.pk,
+                user=user,
+                created_at=now,
+                content_json=event_page.to_json(),
+            )
+            for event_page in EventPage.objects.filter(pk__in=page_ids)
+            .prefetch_related(*child_relations)
+            .order_by("pk")
+        ]
+    )
+    Page.objects.filter(pk__in=page_ids).update(
+        latest_revision_created_at=now,
+        live_revision=Subquery(
+            PageRevision.objects.filter(page_id=OuterRef("pk"))
+            .order_by("-created_at", "-pk")
+            .values("pk")[:1]
+        ),
+    )
+
+
+def _get_unique_slug(title, slugs):
+    base_slug = slugify(title)[:200] or "event"
+    slug = base_slug
+    index = 1
+    while slug in slugs:
+        index += 1
+        slug = "{}-{}".format(base_slug, index)
+    slugs.add(slug)
+    return slug
+
+
+def _get_import_hash(event):
+    value = json.dumps(
+        [
+            event["title"],
+            event["location"],
+            event["description"],
+            sorted(
+                [start.isoformat(), end.isoformat() if end else None]
+                for start, end in event["dates"]
+            ),
+        ]
+    )
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+def _get_import_content(description):
+    if not description:
+        return ""
+    text = "".join(
+        "<p>{}</p>".format(escape(paragraph))
+        for paragraph in description.split("\n")
+        if paragraph.strip()
+    )
+    return json.dumps([{"type": "text", "value": {"text": text}}])
+
+
+def _parse_import_datetime(value, tzid=None):
+    """
+    Parses ical and ISO dates and date times. Date times without an offset
+    are local times of the time zone tzid, or of the site if it's not given.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        if len(value) == 8 and value.isdigit():
+            # ical dates
+            value = datetime.datetime.strptime(value, "%Y%m%d")
+        elif "T" in value and "-" not in value:
+            # ical date times
+            is_utc = value.endswith("Z")
+            value = datetime.datetime.strptime(value.rstrip("Z"), "%Y%m%dT%H%M%S")
+            if is_utc:
+                value = value.replace(tzinfo=utc)
+        else:
+            value = parse_datetime(value) or datetime.datetime.combine(
+                parse_date(value), datetime.time()
+            )
+    except (ValueError, TypeError):
+        raise ValueError("invalid date {}".format(value))
+    if timezone.is_naive(value):
+        try:
+            value = make_aware(value, pytz.timezone(tzid) if tzid else None)
+        except pytz.UnknownTimeZoneError:
+            raise ValueError("unknown time zone {}".format(tzid))
+    return value
+
+
+def _parse_event_csv(data):
+    reader = csv.DictReader(io.StringIO(data))
+    if not reader.fieldnames or "uid" not in reader.fieldnames:
+        raise ValidationError("The csv file needs a header with a uid column.")
+    rows = []
+    errors = []
+    # the header is the first line
+    for index, row in enumerate(reader):
+        # DictReader puts the values without a column under None
+        if None in row:
+            errors.append("Line {}: more fields than columns.".format(index + 2))
+            continue
+        rows.append(
+            (index + 2, {name: (value or "").strip() for name, value in row.items()})
+        )
+    if errors:
+        raise ValidationError(errors)
+    return rows
+
+
+def _parse_event_ical(data):
+    properties = {
+        "UID": "uid",
+        "SUMMARY": "title",
+        "DTSTART": "start",
+        "DTEND": "end",
+        "LOCATION": "location",
+        "DESCRIPTION": "description",
+    }
+
+    rows = []
+    row = None
+    for line, content in _unfold_ical_lines(data):
+        name, _, value = content.partition(":")
+        name, *parameters = name.split(";")
+        name = name.upper()
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            row = (line, {})
+        elif name == "END" and value.upper() == "VEVENT" and row:
+            rows.append(row)
+            row = None
+        elif row and name in properties:
+            row[1][properties[name]] = _ical_unescape(value).strip()
+            for parameter in parameters:
+                key, _, parameter_value = parameter.partition("=")
+                if key.upper() == "TZID":
+                    # e.g. DTSTART;TZID=Europe/Berlin:20300101T100000
+                    tzid = parameter_value.strip('"')
+                    row[1]["{}_tzid".format(properties[name])] = tzid
+    return rows
+
+
+def _unfold_ical_lines(data):
+    lines = []
+    for index, line in enumerate(data.splitlines()):
+        if line[:1] in (" ", "\t") and lines:
+            lines[-1][1] += line[1:]
+        elif line:
+            lines.append([index + 1, line])
+    return lines
+
+
+def _ical_unescape(value):
+    return re.sub(
+        r"\\([\;,nN])",
+        lambda match: "\n" if match.group(1) in "nN" else match.group(1),
+        value,
+    )
+
+
+# Event cards
+
+
+def load_event_card_data(event_pages):
+    """
+    Resolves everything an event card needs in a fixed number of queries and
+    stores it on the given EventPage instances, where get_image and
+    get_all_organisers pick it up. The same event may be passed several times.
+    """
+    from .models import EventGroupPage, EventListPage, EventOrganiser, ShadowEventPage
+
+    event_pages = [event_page for event_page in event_pages if event_page]
+    if not event_pages:
+        return event_pages
+
+    event_page_ids = {event_page.pk for event_page in event_pages}
+
+    ancestor_paths = set()
+    for event_page in event_pages:
+        ancestor_paths.update(_get_ancestor_paths(event_page))
+
+    # only the deepest ancestors matter, see EventPage.get_image
+    default_images = {}
+    for page_class in [EventListPage, EventGroupPage]:
+        for page in page_class.objects.filter(path__in=ancestor_paths).select_related(
+            "default_event_image"
+        ):
+            default_images[page.path] = page.default_event_image
+
+    shadow_groups = {}
+    for shadow in (
+        ShadowEventPage.objects.live()
+        .filter(original_event_id__in=event_page_ids)
+        .select_related("group")
+        .order_by("path")
+    ):
+        shadow_groups.setdefault(shadow.original_event_id, []).append(shadow.group)
+
+    further_organisers = {}
+    for organiser in EventOrganiser.objects.filter(event_page_id__in=event_page_ids):
+        further_organisers.setdefault(organiser.event_page_id, []).append(organiser)
+
+    for event_page in event_pages:
+        event_page._card_default_image = None
+        for path in reversed(_get_ancestor_paths(event_page)):
+            if path in default_images and default_images[path]:
+                event_page._card_default_image = default_images[path]
+                break
+
+        event_page._card_organisers = (
+            [event_page.group]
+            + shadow_groups.get(event_page.pk, [])
+            + further_organisers.get(event_page.pk, [])
+        )
+
+    return event_pages
+
+
+def _get_ancestor_paths(page):
+    steplen = page.steplen
+    return [page.path[:end] for end in range(steplen, len(page.path), steplen)]
@@ -1,11 +1,14 @@
 from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
 
-from xr_events.models import EventGroupPage
+from xr_events.models import EventGroupPage, EventPage, ShadowEventPage
 from xr_events.services import (
     EVENT_AUTH_GROUP_TYPES,
     MODERATORS_EVENT_PERMISSIONS,
     EDITORS_EVENT_PERMISSIONS,
+    event_occurrences_changed,
+    get_event_months,
+    invalidate_event_list_cache,
 )
 from xr_pages.models import LocalGroup
 from xr_pages.services import (
@@ -36,6 +39,14 @@ def update_events_auth_group_names(sender, instance=None, **kwargs):
     )
 
 
+@receiver(
+    post_save, sender=LocalGroup, dispatch_uid="invalidate_group_event_list_cache_once"
+)
+def invalidate_group_event_list_cache(sender, instance, **kwargs):
+    # the state filter of event listings depends on LocalGroup.state
+    invalidate_event_list_cache()
+
+
 # EventGroupPage
 
 
@@ -73,3 +84,27 @@ def delete_event_group_page_auth_groups(sender, instance, **kwargs):
     delete_auth_groups(
         local_group=instance.group, auth_group_types=EVENT_AUTH_GROUP_TYPES
     )
+
+
+# EventPage and ShadowEventPage
+
+
+@receiver(
+    pre_delete, sender=EventPage, dispatch_uid="event_page_occurrences_changed_once"
+)
+@receiver(
+    pre_delete,
+    sender=ShadowEventPage,
+    dispatch_uid="shadow_event_page_occurrences_changed_once",
+)
+def deleted_event_occurrences_changed(sender, instance, **kwargs):
+    # the occurrences will be gone by cascade, but cached listings,
+    # feeds and calendars may still refer to them
+    group_ids = set()
+    months = set()
+    for group_id, start, end in instance.occurrences.values_list(
+        "group_id", "start", "end"
+    ):
+        group_ids.add(group_id)
+        months.update(get_event_months(start, end))
+    event_occurrences_changed(group_ids, months)
@@ -1,8 +1,17 @@
 import datetime
+import io
+import tempfile
 
 from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.http import QueryDict
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
-from django.utils.timezone import localtime
+from django.utils.timezone import localtime, make_aware
 from wagtail.core.models import Page, Collection
 from wagtailmenus.models import MainMenuItem
 
@@ -13,6 +22,7 @@ from xr_pages.models import (
     LocalGroupPage,
     HomePage,
     LocalGroupSubPage,
+    LocalGroup,
 )
 from xr_pages.services import (
     MODERATORS_PAGE_PERMISSIONS,
@@ -22,7 +32,30 @@ from xr_pages.services import (
     EDITORS_COLLECTION_PERMISSIONS,
 )
 from xr_pages.tests.test_pages import PagesBaseTest, PAGES_PAGE_CLASSES
-from xr_events.models import EventListPage, EventGroupPage, EventPage, EventDate
+from xr_events.models import (
+    EventListPage,
+    EventGroupPage,
+    EventPage,
+    EventDate,
+    EventOccurrence,
+    EventOrganiser,
+    EventPageListFilter,
+    EventRecurrence,
+    ShadowEventPage,
+)
+from xr_events.services import (
+    check_event_occurrences,
+    decode_event_cursor,
+    get_event_bounds,
+    get_event_recurrence_window,
+    import_events,
+    _ical_escape,
+    _ical_fold,
+    paginate_event_occurrences,
+    parse_event_import,
+    rebuild_event_occurrences,
+    recompute_event_bounds,
+)
 
 EVENT_PAGE_CLASSES = {EventListPage, EventGroupPage, EventPage}
 
@@ -305,9 +338,696 @@ class EventsEventPageTest(EventsBaseTest):
         self.assertEqual(self.event_page.start_date, date)
         self.assertEqual(self.event_page.end_date, date2)
 
+    def test_event_bounds_are_aggregated(self):
+        start = self.event_page.dates.get().start
+        EventDate.objects.create(
+            event_page=self.event_page,
+            start=start - datetime.timedelta(1),
+            end=start + datetime.timedelta(3),
+        )
+        event_page = EventPage.objects.get(pk=self.event_page.pk)
+
+        # one query for the dates and one for the recurrences
+        with self.assertNumQueries(2):
+            bounds = get_event_bounds(event_page)
+        self.assertEqual(
+            bounds, (start - datetime.timedelta(1), start + datetime.timedelta(3))
+        )
+
+        event_page.dates.set([])
+        self.assertEqual(get_event_bounds(event_page), (None, None))
+
+    def test_recompute_event_bounds(self):
+        start = self.event_page.dates.get().start
+        EventPage.objects.filter(pk=self.event_page.pk).update(
+            start_date=None, end_date=None
+        )
+        event_page = EventPage(title="Event without dates")
+        self.event_group_page.add_child(instance=event_page)
+        EventPage.objects.filter(pk=event_page.pk).update(
+            start_date=start, end_date=start
+        )
+
+        self.assertEqual(recompute_event_bounds(chunk_size=1), 2)
+        self.event_page.refresh_from_db()
+        event_page.refresh_from_db()
+
+        self.assertEqual(self.event_page.start_date, start)
+        self.assertEqual(self.event_page.end_date, start)
+        self.assertIsNone(event_page.start_date)
+        self.assertEqual(recompute_event_bounds(), 0)
+
     def test_event_page_group_get_set(self):
         event_page = LocalGroupSubPage(title="Special EventPage")
         self.event_group_page.add_child(instance=event_page)
 
         self.assertEqual(event_page.group.pk, self.event_group_page.group.pk)
         self.assertEqual(event_page.group.pk, self.local_group.pk)
+
+
+class EventOccurrenceTest(EventsBaseTest):
+    def setUp(self):
+        super().setUp()
+        self._setup_event_pages()
+
+    def _create_shadow_event_page(self):
+        other_local_group = self._create_local_group("Other Test Group")
+        self.other_event_group_page = EventGroupPage(
+            title="Other Event Group", group=other_local_group
+        )
+        self.event_list_page.add_child(instance=self.other_event_group_page)
+
+        shadow_event_page = ShadowEventPage(
+            title="ShadowEvent Page", original_event=self.event_page
+        )
+        self.other_event_group_page.add_child(instance=shadow_event_page)
+        return shadow_event_page
+
+    def test_occurrences_get_created(self):
+        event_date = self.event_page.dates.get()
+        occurrence = EventOccurrence.objects.get(event_date=event_date)
+
+        self.assertEqual(occurrence.group, self.local_group)
+        self.assertEqual(occurrence.start, event_date.start)
+        self.assertEqual(occurrence.end, event_date.start)
+        self.assertTrue(occurrence.live)
+
+    def test_occurrences_follow_dates(self):
+        self.event_page.dates.create(start=localtime() + datetime.timedelta(2))
+        self.event_page.save()
+
+        self.assertEqual(
+            set(self.event_page.dates.values_list("id", flat=True)),
+            set(
+                EventOccurrence.objects.filter(event_page=self.event_page).values_list(
+                    "event_date_id", flat=True
+                )
+            ),
+        )
+
+    def test_occurrences_follow_publish_and_unpublish(self):
+        self.event_page.unpublish()
+        self.assertFalse(
+            EventOccurrence.objects.filter(event_page=self.event_page).live().exists()
+        )
+
+        self.event_page.save_revision().publish()
+        self.assertTrue(
+            EventOccurrence.objects.filter(event_page=self.event_page).live().exists()
+        )
+
+    def test_occurrences_get_deleted(self):
+        self.event_page.delete()
+        self.assertFalse(
+            EventOccurrence.objects.filter(event_page_id=self.event_page.pk).exists()
+        )
+
+    def test_shadow_event_occurrences(self):
+        shadow_event_page = self._create_shadow_event_page()
+
+        occurrence_qs = EventOccurrence.objects.filter(shadow_event=shadow_event_page)
+        self.assertEqual(occurrence_qs.live().count(), 1)
+        self.assertEqual(occurrence_qs.get().group, self.other_event_group_page.group)
+
+        shadow_event_page.unpublish()
+        self.assertFalse(occurrence_qs.live().exists())
+
+        shadow_event_page.delete()
+        self.assertFalse(occurrence_qs.exists())
+        self.assertTrue(EventOccurrence.objects.filter(event_page=self.event_page))
+
+    def test_occurrences_match_event_date_querysets(self):
+        self._create_shadow_event_page()
+        self.event_page.dates.create(start=localtime() - datetime.timedelta(2))
+        self.event_page.save()
+
+        self.assertEqual(check_event_occurrences(), [])
+
+    def test_rebuild_event_occurrences(self):
+        self._create_shadow_event_page()
+        count = EventOccurrence.objects.count()
+
+        EventOccurrence.objects.all().delete()
+        self.assertNotEqual(check_event_occurrences(), [])
+
+        self.assertEqual(rebuild_event_occurrences(chunk_size=1), count)
+        self.assertEqual(check_event_occurrences(), [])
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class ShadowedEventTest(EventsBaseTest):
+    _create_shadow_event_page = EventOccurrenceTest._create_shadow_event_page
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self._setup_event_pages()
+        self.shadow_event_page = self._create_shadow_event_page()
+
+    def test_shadowed_event(self):
+        self.event_page.further_organisers.add(EventOrganiser(name="Friends"))
+        self.event_page.save_revision().publish()
+
+        event = self.shadow_event_page.get_shadowed_event()
+        self.assertEqual(event.title, self.event_page.title)
+        self.assertEqual(event.group, self.other_event_group_page.group)
+        self.assertEqual(
+            [organiser.name for organiser in event.get_all_organisers()],
+            ["Other Test Group", self.local_group.name, "Friends"],
+        )
+        self.assertEqual(len(event.get_display_dates()), 1)
+        with self.assertRaises(AttributeError):
+            event.group = self.local_group
+
+    def test_shadowed_event_is_cached(self):
+        self.shadow_event_page.get_shadowed_event()
+
+        with CaptureQueriesContext(connection) as queries:
+            event = self.shadow_event_page.get_shadowed_event()
+            event.get_all_organisers()
+            event.get_image()
+        # the revisions of the original event and the shadows only
+        self.assertEqual(len(queries), 1)
+
+        # rendered from the cache
+        response = self.client.get(self.shadow_event_page.url)
+        self.assertContains(response, self.event_page.title)
+        self.assertContains(response, "Other Test Group")
+
+    def test_publishing_invalidates_shadowed_event(self):
+        self.shadow_event_page.get_shadowed_event()
+
+        self.event_page.title = "Changed Event Page"
+        self.event_page.save_revision().publish()
+        event = self.shadow_event_page.get_shadowed_event()
+        self.assertEqual(event.title, "Changed Event Page")
+
+        third_event_group_page = EventGroupPage(
+            title="Third Event Group", group=self._create_local_group("Third Group")
+        )
+        self.event_list_page.add_child(instance=third_event_group_page)
+        third_event_group_page.add_child(
+            instance=ShadowEventPage(
+                title="Third Shadow", original_event=self.event_page
+            )
+        )
+        event = self.shadow_event_page.get_shadowed_event()
+        self.assertIn(
+            "Third Group", [organiser.name for organiser in event.get_all_organisers()]
+        )
+
+
+class EventImportTest(EventsBaseTest):
+    csv = (
+        "uid,title,start,end,location,description\n"
+        "event-1,Imported Event,2030-05-01 18:00,2030-05-01 20:00,Berlin,"
+        "First line\n"
+        "event-1,Imported Event,2030-05-08 18:00,,Berlin,\n"
+        "event-2,Other Imported Event,2030-06-01,,Hamburg,\n"
+    )
+    ical = "\r\n".join(
+        [
+            "BEGIN:VCALENDAR",
+            "BEGIN:VEVENT",
+            "UID:event-3",
+            "SUMMARY:Imported\\, from ical",
+            "DTSTART:20300701T160000Z",
+            "DTEND:20300701T180000Z",
+            "LOCATION:Leipzig",
+            "DESCRIPTION:A long description that is folded over",
+            "  two lines",
+            "END:VEVENT",
+            "END:VCALENDAR",
+        ]
+    )
+
+    def setUp(self):
+        super().setUp()
+        self._setup_event_pages()
+
+    def test_parse_csv(self):
+        events = parse_event_import(self.csv, "csv")
+
+        self.assertEqual([event["uid"] for event in events], ["event-1", "event-2"])
+        self.assertEqual(len(events[0]["dates"]), 2)
+        self.assertEqual(
+            localtime(events[0]["dates"][0][1]).time(), datetime.time(20, 0)
+        )
+
+    def test_parse_ical(self):
+        event = parse_event_import(self.ical, "ics")[0]
+
+        self.assertEqual(event["title"], "Imported, from ical")
+        self.assertEqual(
+            event["description"], "A long description that is folded over two lines"
+        )
+        self.assertEqual(
+            event["dates"],
+            [
+                (
+                    datetime.datetime(2030, 7, 1, 16, tzinfo=timezone.utc),
+                    datetime.datetime(2030, 7, 1, 18, tzinfo=timezone.utc),
+                )
+            ],
+        )
+
+    def test_parse_ical_time_zones(self):
+        ical = self.ical.replace(
+            "DTSTART:20300701T160000Z", "DTSTART;TZID=America/New_York:20300701T160000"
+        ).replace("DTEND:20300701T180000Z", 'DTEND;TZID="Asia/Tokyo":20300702T180000')
+        event = parse_event_import(ical, "ics")[0]
+
+        self.assertEqual(
+            event["dates"],
+            [
+                (
+                    datetime.datetime(2030, 7, 1, 20, tzinfo=timezone.utc),
+                    datetime.datetime(2030, 7, 2, 9, tzinfo=timezone.utc),
+                )
+            ],
+        )
+
+        with self.assertRaises(ValidationError) as context:
+            parse_event_import(ical.replace("Asia/Tokyo", "Mars/Olympus"), "ics")
+        self.assertIn("unknown time zone Mars/Olympus", context.exception.messages[0])
+
+    def test_invalid_files_are_rejected(self):
+        with self.assertRaises(ValidationError) as context:
+            parse_event_import(
+                "uid,title,start,end\n,No uid,2030-01-01,\n"
+                "event-1,Ends early,2030-01-02,2030-01-01\n"
+                "event-2,Bad date,tomorrow,\n",
+                "csv",
+            )
+        self.assertEqual(len(context.exception.messages), 3)
+        self.assertFalse(EventPage.objects.filter(import_uid__gt="").exists())
+
+        with self.assertRaises(ValidationError) as context:
+            parse_event_import(
+                "uid,title,start\nevent-1,Too many,2030-01-01,fields\n", "csv"
+            )
+        self.assertEqual(
+            context.exception.messages, ["Line 2: more fields than columns."]
+        )
+
+    def test_import_events(self):
+        tree_problems = Page.find_problems()
+        created, updated, unchanged = import_events(
+            self.event_group_page, parse_event_import(self.csv, "csv")
+        )
+        self.assertEqual((created, updated, unchanged), (2, 0, 0))
+
+        event_page = EventPage.objects.get(import_uid="event-1")
+        self.assertEqual(event_page.get_parent().pk, self.event_group_page.pk)
+        self.assertEqual(event_page.group, self.local_group)
+        self.assertTrue(event_page.live)
+        self.assertEqual(event_page.dates.count(), 2)
+        self.assertEqual(event_page.start_date, event_page.dates.first().start)
+        self.assertEqual(
+            EventOccurrence.objects.filter(event_page=event_page).count(), 2
+        )
+        self.assertIn("First line", str(event_page.content))
+
+        # the tree is still consistent, pages can be added the regular way
+        self.assertEqual(Page.find_problems(), tree_problems)
+        self.event_group_page.add_child(instance=EventPage(title="Imported Event"))
+        self.assertEqual(
+            EventPage.objects.filter(slug__startswith="imported-event").count(), 2
+        )
+        self.assertEqual(check_event_occurrences(), [])
+
+    def test_reimport_only_updates_changed_events(self):
+        import_events(self.event_group_page, parse_event_import(self.csv, "csv"))
+        event_page = EventPage.objects.get(import_uid="event-2")
+
+        changed_csv = self.csv.replace("Hamburg", "Bremen")
+        created, updated, unchanged = import_events(
+            self.event_group_page, parse_event_import(changed_csv, "csv")
+        )
+        self.assertEqual((created, updated, unchanged), (0, 1, 1))
+
+        event_page.refresh_from_db()
+        self.assertEqual(event_page.location, "Bremen")
+        self.assertEqual(event_page.dates.count(), 1)
+        self.assertEqual(
+            EventOccurrence.objects.get(event_page=event_page).location, "Bremen"
+        )
+        self.assertEqual(check_event_occurrences(), [])
+
+    def test_reimport_saves_revisions(self):
+        import_events(self.event_group_page, parse_event_import(self.csv, "csv"))
+        event_page = EventPage.objects.get(import_uid="event-2")
+        self.assertEqual(event_page.live_revision, event_page.get_latest_revision())
+
+        # an edit in the admin, before the next import
+        event_page.title = "Edited Event"
+        event_page.save_revision().publish()
+
+        changed_csv = self.csv.replace("Hamburg", "Bremen")
+        import_events(self.event_group_page, parse_event_import(changed_csv, "csv"))
+
+        event_page.refresh_from_db()
+        self.assertEqual(event_page.revisions.count(), 3)
+        self.assertEqual(event_page.live_revision, event_page.get_latest_revision())
+        # the admin edits the imported data
+        revision_page = event_page.get_latest_revision_as_page()
+        self.assertEqual(revision_page.title, "Other Imported Event")
+        self.assertEqual(revision_page.location, "Bremen")
+        self.assertEqual(
+            [date.start for date in revision_page.dates.all()],
+            [date.start for date in event_page.dates.all()],
+        )
+
+    def test_import_events_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".ics") as f:
+            f.write(self.ical)
+            f.flush()
+
+            out = io.StringIO()
+            call_command(
+                "import_events", f.name, page=self.event_group_page.pk, stdout=out
+            )
+        self.assertIn("Created 1", out.getvalue())
+        self.assertTrue(EventPage.objects.filter(import_uid="event-3").exists())
+
+
+class EventRecurrenceTest(EventsBaseTest):
+    def setUp(self):
+        super().setUp()
+        self._setup_event_pages()
+
+    def _create_recurrence(self, **kwargs):
+        recurrence = EventRecurrence(event_page=self.event_page, **kwargs)
+        self.event_page.recurrences.add(recurrence)
+        self.event_page.save()
+        return recurrence
+
+    def _starts(self, dates):
+        return [localtime(date.start).date() for date in dates]
+
+    def test_weekly_dates(self):
+        recurrence = EventRecurrence(
+            start=timezone.make_aware(datetime.datetime(2019, 12, 2, 19)),
+            frequency=EventRecurrence.WEEKLY,
+            interval=2,
+            until=datetime.date(2020, 1, 31),
+            exceptions="2019-12-30",
+        )
+
+        self.assertEqual(
+            self._starts(recurrence.iter_dates()),
+            [
+                datetime.date(2019, 12, 2),
+                datetime.date(2019, 12, 16),
+                datetime.date(2020, 1, 13),
+                datetime.date(2020, 1, 27),
+            ],
+        )
+        self.assertEqual(
+            self._starts(
+                recurrence.iter_dates(
+                    datetime.date(2019, 12, 17), datetime.date(2020, 1, 13)
+                )
+            ),
+            [datetime.date(2020, 1, 13)],
+        )
+        self.assertEqual(
+            localtime(recurrence.get_last_date().start).date(),
+            datetime.date(2020, 1, 27),
+        )
+
+    def test_monthly_dates(self):
+        start = timezone.make_aware(datetime.datetime(2020, 1, 31, 19))
+        recurrence = EventRecurrence(
+            start=start, frequency=EventRecurrence.MONTHLY, count=4
+        )
+        # months without a 31st are skipped
+        self.assertEqual(
+            self._starts(recurrence.iter_dates()),
+            [datetime.date(2020, 1, 31), datetime.date(2020, 3, 31)],
+        )
+
+        recurrence.frequency = EventRecurrence.MONTHLY_WEEKDAY
+        # the fifth friday of a month means the last one
+        self.assertEqual(
+            self._starts(recurrence.iter_dates()),
+            [
+                datetime.date(2020, 1, 31),
+                datetime.date(2020, 2, 28),
+                datetime.date(2020, 3, 27),
+                datetime.date(2020, 4, 24),
+            ],
+        )
+
+    def test_start_and_end_date(self):
+        start = localtime() + datetime.timedelta(7)
+        self.event_page.dates.set([])
+        self._create_recurrence(
+            start=start, end=start + datetime.timedelta(hours=2), count=3
+        )
+
+        self.assertEqual(self.event_page.start_date, start)
+        self.assertEqual(
+            self.event_page.end_date, start + datetime.timedelta(weeks=2, hours=2)
+        )
+
+    def test_endless_recurrence_stays_upcoming(self):
+        self.event_page.dates.set([])
+        self._create_recurrence(start=localtime() - datetime.timedelta(days=1000))
+
+        self.assertIsNone(self.event_page.end_date)
+        self.assertIn(self.event_page, EventPage.objects.upcoming())
+        self.assertIn(self.local_group, LocalGroup.objects.has_upcoming_events())
+
+    def test_occurrences_are_limited_to_window(self):
+        recurrence = self._create_recurrence(
+            start=localtime() - datetime.timedelta(days=1000),
+            frequency=EventRecurrence.DAILY,
+        )
+
+        from_date, to_date = get_event_recurrence_window()
+        occurrences = EventOccurrence.objects.filter(recurrence=recurrence)
+        self.assertEqual(occurrences.count(), (to_date - from_date).days + 1)
+        self.assertFalse(occurrences.filter(event_date__isnull=False).exists())
+        self.assertEqual(check_event_occurrences(), [])
+
+        occurrence = occurrences.upcoming().first()
+        self.assertEqual(occurrence.get_event_date().start, occurrence.start)
+        self.assertIsNone(occurrence.get_event_date().pk)
+
+
+class EventCardDataTest(EventsBaseTest):
+    def setUp(self):
+        super().setUp()
+        self._setup_event_pages()
+
+    def _add_event_pages(self, count):
+        for i in range(count):
+            event_page = EventPage(title="Card Event Page {}".format(i))
+            event_page.dates.add(EventDate(start=localtime() + datetime.timedelta(1)))
+            event_page.further_organisers.add(
+                EventOrganiser(name="Card Organiser {}".format(i))
+            )
+            self.event_group_page.add_child(instance=event_page)
+
+    def _count_card_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            for event_date in EventDate.objects.live().with_card_data():
+                event_date.event_page.get_image()
+                event_date.event_page.all_organiser_names
+        return len(context)
+
+    def test_card_data_query_count_is_constant(self):
+        self._add_event_pages(1)
+        query_count = self._count_card_queries()
+
+        self._add_event_pages(5)
+        self.assertEqual(self._count_card_queries(), query_count)
+
+    def test_card_data_matches_event_page(self):
+        self._add_event_pages(2)
+        other_local_group = self._create_local_group("Other Test Group")
+        other_event_group_page = EventGroupPage(
+            title="Other Event Group", group=other_local_group
+        )
+        self.event_list_page.add_child(instance=other_event_group_page)
+        other_event_group_page.add_child(
+            instance=ShadowEventPage(
+                title="ShadowEvent Page", original_event=self.event_page
+            )
+        )
+
+        for event_date in EventDate.objects.live().with_card_data():
+            event_page = EventPage.objects.get(pk=event_date.event_page_id)
+            self.assertEqual(
+                event_date.event_page.get_all_organisers(),
+                event_page.get_all_organisers(),
+            )
+            self.assertEqual(event_date.event_page.get_image(), event_page.get_image())
+
+
+class EventOccurrencePaginationTest(EventsBaseTest):
+    def setUp(self):
+        super().setUp()
+        self._setup_event_pages()
+
+        for i in range(4):
+            event_page = EventPage(title="Paginated Event Page {}".format(i))
+            event_page.dates.add(EventDate(start=localtime() + datetime.timedelta(2)))
+            self.event_group_page.add_child(instance=event_page)
+
+    def test_paginate_event_occurrences(self):
+        queryset = EventOccurrence.objects.live().owned()
+
+        occurrences, cursor = paginate_event_occurrences(queryset, page_size=2)
+        self.assertEqual(len(occurrences), 2)
+
+        while cursor:
+            next_occurrences, cursor = paginate_event_occurrences(
+                queryset, cursor=decode_event_cursor(cursor), page_size=2
+            )
+            occurrences += next_occurrences
+
+        self.assertEqual(occurrences, list(queryset))
+
+    def test_decode_invalid_event_cursor(self):
+        for value in ["", "abc", "2019_x", "20191110_1_2"]:
+            self.assertIsNone(decode_event_cursor(value))
+
+    def test_first_of_day(self):
+        start = self.event_page.dates.get().start
+        later_date = self.event_page.dates.create(
+            start=start + datetime.timedelta(0, 1)
+        )
+        next_day_date = self.event_page.dates.create(
+            start=start + datetime.timedelta(1)
+        )
+        self.event_page.save()
+
+        event_date_ids = (
+            EventOccurrence.objects.filter(event_page=self.event_page)
+            .first_of_day()
+            .values_list("event_date_id", flat=True)
+        )
+
+        self.assertNotIn(later_date.id, event_date_ids)
+        self.assertIn(next_day_date.id, event_date_ids)
+
+    def test_first_of_day_spanning_midnight(self):
+        self.event_page.dates.all().delete()
+        night_date = self.event_page.dates.create(
+            start=make_aware(datetime.datetime(2030, 5, 6, 22)),
+            end=make_aware(datetime.datetime(2030, 5, 7, 2)),
+        )
+        morning_date = self.event_page.dates.create(
+            start=make_aware(datetime.datetime(2030, 5, 7, 10))
+        )
+        next_day_date = self.event_page.dates.create(
+            start=make_aware(datetime.datetime(2030, 5, 8, 10))
+        )
+        self.event_page.save()
+
+        occurrences = EventOccurrence.objects.filter(
+            event_page=self.event_page
+        ).first_of_day()
+
+        # the night date is the first of the event on both days
+        self.assertEqual(
+            set(occurrences.values_list("event_date_id", flat=True)),
+            {night_date.id, next_day_date.id},
+        )
+        self.assertEqual(
+            list(
+                occurrences.date_range(
+                    (datetime.date(2030, 5, 7), datetime.date(2030, 5, 7))
+                ).values_list("event_date_id", flat=True)
+            ),
+            [night_date.id],
+        )
+        self.assertNotIn(
+            morning_date.id, occurrences.values_list("event_date_id", flat=True)
+        )
+
+
+class EventPageListFilterTest(EventsBaseTest):
+    def setUp(self):
+        super().setUp()
+        self._setup_event_pages()
+
+    def _filter(self, query_string):
+        return EventPageListFilter.from_query_dict(QueryDict(query_string))
+
+    def _filter_event_pages(self, query_string):
+        queryset = self._filter(query_string).filter(EventOccurrence.objects.live())
+        return {occurrence.event_page for occurrence in queryset}
+
+    def test_preset_days(self):
+        event_filter = self._filter("d=-30")
+        self.assertEqual(event_filter.selected, "-30")
+        self.assertEqual(event_filter.to_date, timezone.localdate())
+
+        self.assertEqual(self._filter("d=invalid").selected, "30")
+
+    def test_explicit_date_range(self):
+        event_filter = self._filter("d=365&from=2019-12-24&to=2019-12-01")
+        self.assertEqual(event_filter.selected, "")
+        self.assertEqual(event_filter.from_date, datetime.date(2019, 12, 1))
+        self.assertEqual(event_filter.to_date, datetime.date(2019, 12, 24))
+
+        self.assertFalse(self._filter_event_pages("from=2019-12-01&to=2019-12-24"))
+
+    def test_canonical_key(self):
+        self.assertEqual(
+            self._filter("group=3&group=1&location=  Berlin  Mitte&state=BE").key,
+            self._filter("state=BE&state=XX&location=berlin mitte&group=1&group=3").key,
+        )
+        self.assertNotEqual(self._filter("group=1").key, self._filter("group=3").key)
+
+    def test_group_filter(self):
+        self.assertEqual(
+            self._filter_event_pages("group={}".format(self.local_group.pk)),
+            {self.event_page},
+        )
+
+        shadow_event_page = ShadowEventPage(
+            title="Shadow Event", original_event=self.event_page
+        )
+        self.regional_event_group_page.add_child(instance=shadow_event_page)
+
+        # the shared event is listed only once for both groups
+        queryset = self._filter(
+            "group={}&group={}".format(self.local_group.pk, self.regional_group.pk)
+        ).filter(EventOccurrence.objects.live())
+        self.assertEqual(
+            sorted(occurrence.event_page.pk for occurrence in queryset),
+            sorted([self.event_page.pk, self.regional_event_page.pk]),
+        )
+
+    def test_state_filter(self):
+        self.local_group.state = "BE"
+        self.local_group.save()
+
+        self.assertEqual(self._filter_event_pages("state=BE"), {self.event_page})
+
+    def test_location_filter(self):
+        self.event_page.location = "Alexanderplatz, Berlin"
+        self.event_page.save()
+
+        self.assertEqual(self._filter_event_pages("location=berlin"), {self.event_page})
+        self.assertFalse(self._filter_event_pages("location=Hamburg"))
+
+
+class EventFeedTest(EventsBaseTest):
+    def test_ical_escape(self):
+        self.assertEqual(_ical_escape("a,b;c\\d\ne"), "a\\,b\\;c\\\\d\\ne")
+
+    def test_ical_fold(self):
+        line = "SUMMARY:" + "ä" * 100
+        folded = _ical_fold(line)
+
+        self.assertTrue(folded.endswith("\r\n"))
+        for part in folded[:-2].split("\r\n"):
+            self.assertLessEqual(len(part.encode()), 75)
+        self.assertEqual(folded[:-2].replace("\r\n ", ""), line)
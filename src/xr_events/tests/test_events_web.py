@@ -1,10 +1,57 @@
 import datetime
+import json
+import re
+from unittest import mock
 
-from django.utils.timezone import localtime
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+from django.utils.timezone import localdate, localtime
+from django_dynamic_fixture import G
 from django_webtest import WebTest
+from webtest import Upload
+from wagtail.contrib.modeladmin.helpers import AdminURLHelper
 
-from xr_events.models import EventPage, EventDate, EventGroupPage, ShadowEventPage
+from xr_events.models import (
+    EventPage,
+    EventDate,
+    EventGroupPage,
+    EventOccurrence,
+    EventOrganiser,
+    EventRecurrence,
+    ShadowEventPage,
+)
+from xr_events.services import (
+    EVENT_API_FIELDS,
+    EVENT_ARCHIVE_MAX_AGE,
+    archive_event_occurrences,
+    build_event_calendar_month,
+    check_event_occurrences,
+    get_upcoming_event_occurrences,
+    get_upcoming_events_cache_timeout,
+    import_events,
+    invalidate_event_calendars,
+    invalidate_event_list_cache,
+    invalidate_upcoming_events,
+    local_day_start,
+    paginate_event_occurrences,
+    parse_event_import,
+    touch_event_feeds,
+)
 from xr_events.tests.test_events_pages import EventsBaseTest
+from xr_pages.geocoders import GeocoderError
+from xr_pages.models import GeocodedLocation
+from xr_pages.services import (
+    geocode_pending_locations,
+    get_cached_page,
+    get_grid_cell,
+    get_grid_cell_ranges,
+)
 
 
 class EventPagesWebTest(EventsBaseTest, WebTest):
@@ -19,6 +66,23 @@ class EventPagesWebTest(EventsBaseTest, WebTest):
         self.assertContains(response, self.event_page.title)
         self.assertContains(response, self.regional_event_page.title)
 
+    def test_event_list_page_query_count_is_constant(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as context:
+                self.app.get(self.event_list_page.url)
+            return len(context)
+
+        # the first request warms up site related caches
+        self.app.get(self.event_list_page.url)
+        query_count = count_queries()
+
+        for i in range(5):
+            event_page = EventPage(title="Another Event Page {}".format(i))
+            event_page.dates.add(EventDate(start=localtime() + datetime.timedelta(2)))
+            self.event_group_page.add_child(instance=event_page)
+
+        self.assertEqual(count_queries(), query_count)
+
     def test_regional_event_group_page(self):
         response = self.app.get(self.regional_event_group_page.url)
         self.assertEqual(response.status_code, 200)
@@ -40,6 +104,52 @@ class EventPagesWebTest(EventsBaseTest, WebTest):
         self.assertContains(response, self.event_page.title)
         self.assertNotContains(response, self.regional_event_page.title)
 
+    def test_event_page_query_count_is_bounded(self):
+        def count_queries(url):
+            with CaptureQueriesContext(connection) as context:
+                response = self.app.get(url)
+            return response, len(context)
+
+        event_date = self.event_page.dates.get()
+        date_url = "{}{}/".format(self.event_page.url, event_date.pk)
+        # the first request warms up site related caches
+        self.app.get(date_url)
+        response, query_count = count_queries(date_url)
+
+        for i in range(5):
+            self.event_page.dates.add(
+                EventDate(
+                    start=localtime() + datetime.timedelta(i + 2),
+                    label="Day {}".format(i),
+                )
+            )
+            self.event_page.further_organisers.add(
+                EventOrganiser(name="Organiser {}".format(i))
+            )
+        self.event_page.save_revision().publish()
+
+        response, more_query_count = count_queries(date_url)
+        self.assertEqual(more_query_count, query_count)
+        self.assertContains(response, "Day 4")
+        self.assertContains(response, "Organiser 4")
+        self.assertEqual(
+            len(response.html.find_all(class_="date-list__group--highlighted")), 1
+        )
+
+        response, next_date_query_count = count_queries(self.event_page.url)
+        self.assertLessEqual(next_date_query_count, query_count)
+
+        other_date_url = "{}{}/".format(
+            self.event_page.url, self.regional_event_page.dates.get().pk
+        )
+        response = self.app.get(other_date_url)
+        self.assertRedirects(
+            response,
+            "{}{}/".format(
+                self.regional_event_page.url, self.regional_event_page.dates.get().pk
+            ),
+        )
+
     def test_regional_event_page(self):
         response = self.app.get(self.regional_event_page.url)
         self.assertEqual(response.status_code, 200)
@@ -125,6 +235,115 @@ class EventFilterWebTest(EventsBaseTest, WebTest):
             response, "event_date-id-{}".format(self.event_page.dates.all()[0].id)
         )
 
+    def test_event_date_redirect(self):
+        event_date = self.event_page.dates.get()
+        response = self.app.get(
+            "{}unknown/{}/".format(self.event_group_page.url, event_date.pk)
+        )
+        self.assertRedirects(
+            response, "{}{}/".format(self.event_page.url, event_date.pk)
+        )
+
+        self.app.get("{}unknown/0/".format(self.event_group_page.url), status=404)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_event_group_page_routes_its_children(self):
+        cache.clear()
+        self.app.get(self.event_page.url)
+
+        # routed directly, the second response would come from the page cache
+        request = RequestFactory().get(self.event_page.url)
+        with mock.patch.object(
+            EventGroupPage, "route", autospec=True, side_effect=EventGroupPage.route
+        ) as route:
+            route_result = self.home_page.route(
+                request, self.event_page.url.strip("/").split("/")
+            )
+
+        self.assertEqual(route.call_count, 1)
+        self.assertEqual(route.call_args[0][0], self.event_group_page)
+        self.assertEqual(route_result.page, self.event_page)
+
+    def test_location_filter(self):
+        self.event_page.location = "Berlin"
+        self.event_page.save()
+
+        response = self.app.get("{}?location=berlin".format(self.event_list_page.url))
+        self.assertContains(response, self.event_page.title)
+        self.assertNotContains(response, self.regional_event_page.title)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_equal_filters_share_cached_results(self):
+        cache.clear()
+        url = "{}?d=182&group={}".format(self.event_list_page.url, self.local_group.pk)
+
+        with mock.patch(
+            "xr_events.services.paginate_event_occurrences",
+            wraps=paginate_event_occurrences,
+        ) as paginate:
+            response = self.app.get(url)
+            cached_response = self.app.get(
+                "{}&group={}".format(url, self.local_group.pk)
+            )
+            self.assertEqual(paginate.call_count, 1)
+
+            invalidate_event_list_cache()
+            self.app.get(url)
+            self.assertEqual(paginate.call_count, 2)
+
+        self.assertContains(cached_response, self.event_page.title)
+        self.assertEqual(
+            response.html.find(id="event-cards"),
+            cached_response.html.find(id="event-cards"),
+        )
+
+
+class EventPaginationWebTest(EventsBaseTest, WebTest):
+    def setUp(self):
+        super().setUp()
+        self._setup_event_pages()
+
+        self.event_pages = [self.event_page]
+        for i in range(2):
+            event_page = EventPage(title="Paginated Event Page {}".format(i))
+            event_page.dates.add(EventDate(start=localtime() + datetime.timedelta(2)))
+            self.event_group_page.add_child(instance=event_page)
+            self.event_pages.append(event_page)
+
+    @mock.patch.object(EventGroupPage, "paginate_by", 2)
+    def test_load_more(self):
+        response = self.app.get(self.event_group_page.url)
+
+        self.assertContains(response, self.event_pages[0].title)
+        self.assertContains(response, self.event_pages[1].title)
+        self.assertNotContains(response, self.event_pages[2].title)
+
+        next_page_url = response.html.find(id="event-list-load-more")["href"]
+        response = self.app.get(
+            "{}{}&format=json".format(self.event_group_page.url, next_page_url)
+        )
+
+        self.assertEqual(response.content_type, "application/json")
+        self.assertIn(self.event_pages[2].title, response.json["html"])
+        self.assertNotIn(self.event_pages[0].title, response.json["html"])
+        self.assertIsNone(response.json["next_page_url"])
+
+    def test_same_day_dates_are_listed_once(self):
+        start = self.event_page.dates.get().start
+        later_date = self.event_page.dates.create(
+            start=start + datetime.timedelta(0, 1)
+        )
+        self.event_page.save()
+
+        response = self.app.get(self.event_group_page.url)
+
+        self.assertNotContains(response, "event_date-id-{}".format(later_date.id))
+        self.assertNotContains(response, "event-list-load-more")
+
 
 class ShadowEventsWebTest(EventsBaseTest, WebTest):
     """
@@ -177,3 +396,703 @@ class ShadowEventsWebTest(EventsBaseTest, WebTest):
         self.assertNotContains(
             response, "event_date-id-{}".format(self.event_page.dates.all()[0].id)
         )
+
+
+class EventRecurrenceWebTest(EventsBaseTest, WebTest):
+    def setUp(self):
+        super().setUp()
+        self._setup_event_pages()
+
+        self.recurring_event_page = EventPage(title="Weekly Plenary")
+        self.recurring_event_page.recurrences.add(
+            EventRecurrence(
+                start=localtime() - datetime.timedelta(days=100), label="Plenary",
+            )
+        )
+        self.event_group_page.add_child(instance=self.recurring_event_page)
+
+    def test_recurring_dates_are_listed(self):
+        response = self.app.get(self.event_group_page.url)
+
+        # the first date was 2 days ago, the next ones within the next month
+        cards = response.html.find_all(id=re.compile(r"^event_date-\d+$"))
+        self.assertEqual(len(cards), 4)
+
+    def test_recurring_dates_in_feed(self):
+        response = self.app.get(
+            reverse("event-ical-feed", args=[self.event_group_page.pk])
+        )
+
+        self.assertIn("SUMMARY:Weekly Plenary | Plenary", response.text)
+        self.assertIn("UID:event-recurrence-", response.text)
+
+    def test_recurring_dates_on_detail_page(self):
+        response = self.app.get(self.recurring_event_page.url)
+
+        labels = response.html.find_all(class_="date-list__label")
+        self.assertEqual(len(labels), 13)
+
+
+class EventCalendarWebTest(EventsBaseTest, WebTest):
+    def setUp(self):
+        super().setUp()
+        self._setup_event_pages()
+        self.start = localtime(self.event_page.dates.get().start)
+        self.month = "{:%Y-%m}".format(self.start)
+
+    def test_month_calendar(self):
+        response = self.app.get(
+            "{}?month={}".format(self.event_list_page.url, self.month)
+        )
+
+        calendar = response.html.find(id="event-calendar")
+        self.assertIn(self.event_page.title, calendar.text)
+        self.assertIn(self.regional_event_page.title, calendar.text)
+
+        response = self.app.get(
+            "{}?month={}".format(self.event_group_page.url, self.month)
+        )
+
+        calendar = response.html.find(id="event-calendar")
+        self.assertIn(self.event_page.title, calendar.text)
+        self.assertNotIn(self.regional_event_page.title, calendar.text)
+
+    def test_week_calendar(self):
+        response = self.app.get(
+            "{}?week={:%Y-%m-%d}".format(self.event_group_page.url, self.start)
+        )
+
+        calendar = response.html.find(id="event-calendar")
+        self.assertEqual(len(calendar.find_all("td")), 7)
+        self.assertIn(self.event_page.title, calendar.text)
+
+        response = self.app.get(
+            "{}?week={:%Y-%m-%d}".format(
+                self.event_group_page.url, self.start + datetime.timedelta(7)
+            )
+        )
+        self.assertNotIn(
+            self.event_page.title, response.html.find(id="event-calendar").text
+        )
+
+    def test_calendar_rejects_years_out_of_range(self):
+        for query in [
+            "month=0001-01",
+            "month=9999-12",
+            "week=0001-01-01",
+            "week=9999-12-31",
+        ]:
+            self.app.get("{}?{}".format(self.event_list_page.url, query), status=404)
+
+    def test_day_buckets(self):
+        for i in range(4):
+            event_page = EventPage(title="Bucket Event Page {}".format(i))
+            event_page.dates.add(
+                EventDate(
+                    start=self.start + datetime.timedelta(hours=1),
+                    end=self.start + datetime.timedelta(days=1),
+                )
+            )
+            self.event_group_page.add_child(instance=event_page)
+
+        buckets = build_event_calendar_month(
+            self.local_group.pk, self.start.year, self.start.month
+        )
+
+        count, occurrence_ids = buckets[self.start.date()]
+        self.assertEqual(count, 5)
+        self.assertEqual(len(occurrence_ids), 3)
+        next_day = self.start.date() + datetime.timedelta(1)
+        if next_day.month == self.start.month:
+            self.assertEqual(buckets[next_day][0], 4)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_calendar_is_cached_per_month(self):
+        cache.clear()
+        url = "{}?month={}".format(self.event_group_page.url, self.month)
+
+        with mock.patch(
+            "xr_events.services.build_event_calendar_month",
+            wraps=build_event_calendar_month,
+        ) as build:
+            self.app.get(url)
+            calls = build.call_count
+            self.app.get(url)
+            self.assertEqual(build.call_count, calls)
+
+            # the displayed weeks may reach into the neighbouring months
+            other_month = self.start - datetime.timedelta(100)
+            invalidate_event_calendars([(other_month.year, other_month.month)])
+            self.app.get(url)
+            self.assertEqual(build.call_count, calls)
+
+            invalidate_event_calendars([(self.start.year, self.start.month)])
+            self.app.get(url)
+            self.assertEqual(build.call_count, calls + 1)
+
+
+class EventArchiveWebTest(EventsBaseTest, WebTest):
+    def setUp(self):
+        super().setUp()
+        self._setup_event_pages()
+
+        # a day in the middle of a month, that is completely in the past
+        self.past_day = localdate().replace(day=1) - datetime.timedelta(20)
+        self.past_event_page = EventPage(title="Past Event Page")
+        self.past_event_page.dates.add(
+            EventDate(
+                start=local_day_start(self.past_day) + datetime.timedelta(hours=12)
+            )
+        )
+        self.event_group_page.add_child(instance=self.past_event_page)
+        self.archive_month = "{:%Y-%m}".format(self.past_day)
+
+    def test_past_occurrences_are_archived(self):
+        self.assertTrue(all(o.archived for o in self.past_event_page.occurrences.all()))
+        self.assertFalse(any(o.archived for o in self.event_page.occurrences.all()))
+
+        self.past_event_page.occurrences.update(archived=False)
+        self.assertEqual(archive_event_occurrences(), 1)
+        self.assertTrue(all(o.archived for o in self.past_event_page.occurrences.all()))
+        self.assertEqual(archive_event_occurrences(), 0)
+
+        self.event_page.occurrences.update(archived=True)
+        self.assertIn(
+            "EventOccurrence {} should not be archived.".format(
+                self.event_page.occurrences.get().pk
+            ),
+            check_event_occurrences(),
+        )
+
+    def test_archive_year(self):
+        response = self.app.get(
+            "{}?archive={}".format(self.event_group_page.url, self.past_day.year)
+        )
+
+        months = response.html.find(id="event-archive-months")
+        link = months.find("a", href="?archive={}".format(self.archive_month))
+        self.assertIsNotNone(link)
+        self.assertIn("(1)", link.parent.text)
+
+    def test_archive_month(self):
+        response = self.app.get(
+            "{}?archive={}".format(self.event_list_page.url, self.archive_month)
+        )
+
+        self.assertContains(response, self.past_event_page.title)
+        self.assertNotContains(response, self.event_page.title)
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn(
+            "max-age={}".format(EVENT_ARCHIVE_MAX_AGE), response["Cache-Control"]
+        )
+
+    def test_archive_rejects_years_out_of_range(self):
+        for value in ["0001", "0001-01", "9999", "9999-12"]:
+            self.app.get(self.event_list_page.url, {"archive": value}, status=404)
+
+    def test_current_month_is_not_archived(self):
+        today = localdate()
+        for value in [
+            "{:%Y-%m}".format(today),
+            "{}".format(today.year + 1),
+            "invalid",
+        ]:
+            self.app.get(
+                "{}?archive={}".format(self.event_list_page.url, value), status=404
+            )
+
+    def test_last_month_filter_lists_archived_events(self):
+        response = self.app.get("{}?d=-30".format(self.event_group_page.url))
+        if self.past_day >= localdate() - datetime.timedelta(30):
+            self.assertContains(response, self.past_event_page.title)
+
+        response = self.app.get(
+            "{}?from={}&to={}".format(
+                self.event_group_page.url,
+                self.past_day,
+                localdate() + datetime.timedelta(2),
+            )
+        )
+        self.assertContains(response, self.past_event_page.title)
+        self.assertContains(response, self.event_page.title)
+
+
+class UpcomingEventsWebTest(EventsBaseTest, WebTest):
+    def setUp(self):
+        super().setUp()
+        self._setup_event_pages()
+
+    def _add_upcoming_events_block(self, page, group=None, count=3):
+        value = {"heading": "Upcoming", "group": group and group.pk, "count": count}
+        page.content = json.dumps([{"type": "upcoming_events", "value": value}])
+        page.save()
+
+    def test_group_block(self):
+        self._add_upcoming_events_block(self.local_group_page, group=self.local_group)
+
+        response = self.app.get(self.local_group_page.url)
+        self.assertContains(response, self.event_page.title)
+        self.assertNotContains(response, self.regional_event_page.title)
+
+    def test_site_block(self):
+        self._add_upcoming_events_block(self.home_page, count=1)
+
+        # the regional event starts first
+        response = self.app.get(self.home_page.url)
+        self.assertContains(response, self.regional_event_page.title)
+        self.assertNotContains(response, self.event_page.title)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_upcoming_events_are_cached_per_group(self):
+        cache.clear()
+        get_upcoming_event_occurrences(self.local_group.pk)
+
+        event_page = EventPage(title="Another Event Page")
+        event_page.dates.add(EventDate(start=localtime() + datetime.timedelta(hours=1)))
+        self.event_group_page.add_child(instance=event_page)
+
+        # on_commit callbacks are not run within TestCase
+        occurrences = get_upcoming_event_occurrences(self.local_group.pk)
+        self.assertEqual([o.event_page for o in occurrences], [self.event_page])
+
+        invalidate_upcoming_events([self.regional_group.pk])
+        occurrences = get_upcoming_event_occurrences(self.local_group.pk)
+        self.assertEqual([o.event_page for o in occurrences], [self.event_page])
+
+        invalidate_upcoming_events([self.local_group.pk])
+        occurrences = get_upcoming_event_occurrences(self.local_group.pk)
+        self.assertEqual(
+            [o.event_page for o in occurrences], [event_page, self.event_page]
+        )
+
+    def test_cache_expires_after_the_earliest_end(self):
+        occurrence = EventOccurrence.objects.owned().get(event_page=self.event_page)
+        # the event ends tomorrow, so it's upcoming for more than a day
+        self.assertEqual(get_upcoming_events_cache_timeout([occurrence]), 60 * 60 * 24)
+
+        occurrence.end = localtime()
+        tomorrow = local_day_start(localdate() + datetime.timedelta(1))
+        timeout = get_upcoming_events_cache_timeout([occurrence])
+        self.assertAlmostEqual(
+            timeout, (tomorrow - localtime()).total_seconds(), delta=5
+        )
+
+        self.assertEqual(get_upcoming_events_cache_timeout([]), 60 * 60 * 24)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class EventPageCacheWebTest(EventsBaseTest, WebTest):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self._setup_event_pages()
+        # transactions are not committed within tests, so on_commit is skipped
+        patcher = mock.patch(
+            "xr_pages.services.transaction.on_commit", side_effect=lambda func: func()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get_cached_page(self, page):
+        request = RequestFactory().get(page.url)
+        request.site = self.site
+        return get_cached_page(request)
+
+    def test_shadow_event_purges_the_original_event(self):
+        self.app.get(self.event_page.url)
+        self.assertIsNotNone(self._get_cached_page(self.event_page))
+
+        other_local_group = self._create_local_group("Other Test Group")
+        other_event_group_page = EventGroupPage(
+            title="Other Event Group", group=other_local_group
+        )
+        self.event_list_page.add_child(instance=other_event_group_page)
+        other_event_group_page.add_child(
+            instance=ShadowEventPage(
+                title="ShadowEvent Page", original_event=self.event_page
+            )
+        )
+
+        self.assertIsNone(self._get_cached_page(self.event_page))
+        response = self.app.get(self.event_page.url)
+        self.assertContains(response, "Other Test Group")
+
+    def test_import_purges_the_event_pages(self):
+        csv = "uid,title,start,location\nevent-1,Imported Event,2030-05-01,Berlin\n"
+        self.app.get(self.event_group_page.url)
+
+        import_events(self.event_group_page, parse_event_import(csv, "csv"))
+
+        self.assertIsNone(self._get_cached_page(self.event_group_page))
+        event_page = EventPage.objects.get(import_uid="event-1")
+        self.app.get(event_page.url)
+        self.app.get(self.event_group_page.url)
+
+        changed_csv = csv.replace("Berlin", "Bremen")
+        import_events(self.event_group_page, parse_event_import(changed_csv, "csv"))
+
+        self.assertIsNone(self._get_cached_page(self.event_group_page))
+        self.assertIsNone(self._get_cached_page(event_page))
+        response = self.app.get(event_page.url)
+        self.assertContains(response, "Bremen")
+
+    def test_upcoming_events_change_purges_their_pages(self):
+        value = {"heading": "Upcoming", "group": None, "count": 3}
+        self.home_page.content = json.dumps(
+            [{"type": "upcoming_events", "value": value}]
+        )
+        self.home_page.save()
+        self.app.get(self.home_page.url)
+        self.app.get(self.event_page.url)
+
+        invalidate_upcoming_events([self.local_group.pk])
+
+        self.assertIsNone(self._get_cached_page(self.home_page))
+        self.assertIsNotNone(self._get_cached_page(self.event_page))
+
+
+class EventFeedWebTest(EventsBaseTest, WebTest):
+    def setUp(self):
+        super().setUp()
+        self._setup_event_pages()
+
+    def _get_feed(self, page, **kwargs):
+        return self.app.get(reverse("event-ical-feed", args=[page.pk]), **kwargs)
+
+    def test_event_list_page_feed(self):
+        response = self._get_feed(self.event_list_page)
+
+        self.assertEqual(response.content_type, "text/calendar")
+        self.assertIn("BEGIN:VCALENDAR", response.text)
+        self.assertIn("SUMMARY:{}".format(self.event_page.title), response.text)
+        self.assertIn(
+            "SUMMARY:{}".format(self.regional_event_page.title), response.text
+        )
+
+    def test_event_group_page_feed(self):
+        shadow_event_page = ShadowEventPage(
+            title="Shadow Event", original_event=self.regional_event_page
+        )
+        self.event_group_page.add_child(instance=shadow_event_page)
+
+        response = self._get_feed(self.event_group_page)
+
+        self.assertEqual(response.text.count("BEGIN:VEVENT"), 2)
+        self.assertIn(
+            "URL:http://testserver{}".format(shadow_event_page.url), response.text
+        )
+
+    def test_feed_of_other_pages(self):
+        self._get_feed(self.event_page, status=404)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_conditional_get(self):
+        cache.clear()
+        response = self._get_feed(self.event_group_page)
+        etag = response.headers["ETag"]
+
+        with CaptureQueriesContext(connection) as context:
+            response = self._get_feed(
+                self.event_group_page, headers={"If-None-Match": etag}, status=304
+            )
+        for query in context.captured_queries:
+            self.assertNotIn("xr_events_eventdate", query["sql"])
+            self.assertNotIn("xr_events_eventoccurrence", query["sql"])
+
+        self.event_page.location = "Berlin"
+        self.event_page.save_revision().publish()
+        # transactions are not committed within tests, so on_commit is skipped
+        touch_event_feeds([self.local_group.pk])
+
+        response = self._get_feed(
+            self.event_group_page, headers={"If-None-Match": etag}
+        )
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertIn("LOCATION:Berlin", response.text)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_validators_are_derived_from_the_events(self):
+        cache.clear()
+        self.regional_event_page.save_revision().publish()
+        self.regional_event_page.refresh_from_db()
+
+        response = self._get_feed(self.event_list_page)
+        self.assertEqual(
+            response.headers["Last-Modified"],
+            http_date(self.regional_event_page.last_published_at.timestamp()),
+        )
+        etag = response.headers["ETag"]
+
+        # removing an event doesn't change the latest publish of the others
+        self.event_page.unpublish()
+        touch_event_feeds([self.local_group.pk])
+
+        response = self._get_feed(self.event_list_page)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(
+            response.headers["Last-Modified"],
+            http_date(self.regional_event_page.last_published_at.timestamp()),
+        )
+
+
+class EventApiWebTest(EventsBaseTest, WebTest):
+    def setUp(self):
+        super().setUp()
+        self._setup_event_pages()
+        self.url = reverse("event-api")
+
+    def test_events(self):
+        response = self.app.get(self.url)
+
+        results = response.json["results"]
+        self.assertEqual(
+            {result["title"] for result in results},
+            {self.event_page.title, self.regional_event_page.title},
+        )
+        self.assertEqual(set(results[0].keys()), set(EVENT_API_FIELDS))
+        self.assertIsNone(response.json["next"])
+
+        response = self.app.get(self.url, {"group": self.local_group.pk})
+        self.assertEqual(
+            [result["title"] for result in response.json["results"]],
+            [self.event_page.title],
+        )
+
+    def test_field_selection(self):
+        response = self.app.get(self.url, {"fields": "title,start"})
+        self.assertEqual(set(response.json["results"][0].keys()), {"title", "start"})
+
+        self.app.get(self.url, {"fields": "title,secret"}, status=400)
+
+    def test_cursor_pagination(self):
+        response = self.app.get(self.url, {"limit": 1})
+        self.assertEqual(len(response.json["results"]), 1)
+        first_title = response.json["results"][0]["title"]
+
+        response = self.app.get(response.json["next"])
+        self.assertEqual(len(response.json["results"]), 1)
+        self.assertNotEqual(response.json["results"][0]["title"], first_title)
+        self.assertIsNone(response.json["next"])
+
+    def test_etag(self):
+        response = self.app.get(self.url)
+        etag = response.headers["ETag"]
+
+        with mock.patch("xr_events.views.serialize_event_occurrence") as serialize:
+            response = self.app.get(
+                self.url, headers={"If-None-Match": etag}, status=304
+            )
+        serialize.assert_not_called()
+
+        self.event_page.save_revision().publish()
+        response = self.app.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+        # another page of the same data
+        response = self.app.get(self.url, {"limit": 1})
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_etag_changes_with_the_organisers(self):
+        etag = self.app.get(self.url).headers["ETag"]
+
+        self.local_group.name = "Renamed Group"
+        self.local_group.save()
+        response = self.app.get(self.url, headers={"If-None-Match": etag})
+        self.assertIn(
+            ["Renamed Group"],
+            [result["organisers"] for result in response.json["results"]],
+        )
+        self.assertNotEqual(response.headers["ETag"], etag)
+        etag = response.headers["ETag"]
+
+        shadow_event_page = ShadowEventPage(
+            title="Shadow Event", original_event=self.event_page
+        )
+        self.regional_event_group_page.add_child(instance=shadow_event_page)
+        response = self.app.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+
+class EventGeoSearchWebTest(EventsBaseTest, WebTest):
+    coordinates = {
+        "berlin": (52.52, 13.405),
+        "potsdam": (52.391, 13.065),
+        "hamburg": (53.551, 9.994),
+    }
+
+    def setUp(self):
+        super().setUp()
+        self._setup_event_pages()
+
+        self.event_page.location = "Berlin"
+        self.event_page.save()
+        self.regional_event_page.location = "  Hamburg "
+        self.regional_event_page.save()
+        self.potsdam_event_page = EventPage(title="Potsdam Event Page")
+        self.potsdam_event_page.location = "Potsdam"
+        self.potsdam_event_page.dates.add(
+            EventDate(start=localtime() + datetime.timedelta(2))
+        )
+        self.event_group_page.add_child(instance=self.potsdam_event_page)
+
+        with mock.patch(
+            "xr_pages.services.geocode", side_effect=self.coordinates.get
+        ) as geocode:
+            self.assertEqual(geocode_pending_locations(delay=0), 3)
+        self.assertEqual(geocode.call_count, 3)
+
+    def search(self, **params):
+        response = self.app.get(reverse("event-geo-search"), params)
+        return [event["title"] for event in response.json["events"]]
+
+    def test_locations_are_geocoded_once(self):
+        self.assertEqual(
+            GeocodedLocation.objects.filter(status=GeocodedLocation.FOUND).count(), 3
+        )
+        self.assertFalse(
+            EventOccurrence.objects.exclude(location="")
+            .filter(geo_location__isnull=True)
+            .exists()
+        )
+
+        self.event_page.save()
+        self.assertEqual(GeocodedLocation.objects.count(), 3)
+        self.assertEqual(geocode_pending_locations(delay=0), 0)
+
+    def test_locations_are_shared_with_local_groups(self):
+        self.local_group.location = "Berlin"
+        self.local_group.save()
+
+        self.assertEqual(GeocodedLocation.objects.count(), 3)
+        self.assertEqual(self.local_group.latitude, 52.52)
+
+    def test_failed_requests_are_retried(self):
+        self.event_page.location = "Munich"
+        self.event_page.save()
+
+        with mock.patch("xr_pages.services.geocode", side_effect=GeocoderError):
+            self.assertEqual(geocode_pending_locations(delay=0), 0)
+        self.assertEqual(GeocodedLocation.objects.get(query="munich").status, "pending")
+
+        with mock.patch("xr_pages.services.geocode", return_value=(48.137, 11.575)):
+            self.assertEqual(geocode_pending_locations(delay=0), 1)
+        self.assertEqual(GeocodedLocation.objects.get(query="munich").status, "found")
+
+    def test_radius_search(self):
+        self.assertEqual(
+            self.search(lat=52.52, lng=13.4, radius=10), [self.event_page.title]
+        )
+        self.assertEqual(
+            self.search(lat=52.52, lng=13.4, radius=50),
+            [self.event_page.title, self.potsdam_event_page.title],
+        )
+
+        response = self.app.get(
+            reverse("event-geo-search"), {"lat": 52.52, "lng": 13.4, "radius": 50}
+        )
+        self.assertLess(response.json["events"][1]["distance"], 50)
+        self.assertGreater(response.json["events"][1]["distance"], 20)
+
+    def test_bbox_search(self):
+        self.assertEqual(
+            self.search(bbox="53,9,54,11"), [self.regional_event_page.title]
+        )
+        self.assertEqual(self.search(bbox="40,0,41,1"), [])
+
+    def test_invalid_search(self):
+        url = reverse("event-geo-search")
+        self.app.get(url, {"lat": 52.52}, status=400)
+        self.app.get(url, {"lat": 52.52, "lng": 13.4, "radius": 10000}, status=400)
+        self.app.get(url, {"bbox": "0,0,89,89"}, status=400)
+
+    def test_grid_cell_ranges(self):
+        ranges = get_grid_cell_ranges(52.3, 13.0, 52.6, 13.5)
+        self.assertEqual(len(ranges), 4)
+        for first, last in ranges:
+            self.assertEqual(last - first, 5)
+        cell = get_grid_cell(*self.coordinates["berlin"])
+        self.assertTrue(any(first <= cell <= last for first, last in ranges))
+        self.assertFalse(
+            any(
+                first <= get_grid_cell(*self.coordinates["hamburg"]) <= last
+                for first, last in ranges
+            )
+        )
+
+
+class EventAdminWebTest(EventsBaseTest, WebTest):
+    def setUp(self):
+        super().setUp()
+        self._setup_event_pages()
+        moderators_group = Group.objects.get(name="Overall Site Moderators")
+        self.user = G(get_user_model(), is_staff=True)
+        self.user.groups.set([moderators_group])
+        self.index_url = AdminURLHelper(EventPage).get_action_url("index")
+
+    def _add_event_pages(self, count):
+        offset = EventOrganiser.objects.count()
+        for i in range(offset, offset + count):
+            event_page = EventPage(title="Admin Event Page {}".format(i))
+            event_page.dates.add(EventDate(start=localtime() + datetime.timedelta(3)))
+            event_page.further_organisers.add(
+                EventOrganiser(name="Organiser {}".format(i))
+            )
+            self.event_group_page.add_child(instance=event_page)
+
+    def _count_queries(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.app.get(self.index_url, params, user=self.user)
+        return response, len(queries)
+
+    def test_index_query_count_is_constant(self):
+        self._add_event_pages(2)
+        # the first admin request of a user sets up its profile
+        self._count_queries()
+        response, query_count = self._count_queries()
+        self.assertContains(response, "Organiser 1")
+
+        self._add_event_pages(5)
+        response, more_query_count = self._count_queries()
+        self.assertContains(response, "Organiser 6")
+        self.assertEqual(more_query_count, query_count)
+
+    def test_search(self):
+        self._add_event_pages(2)
+
+        response = self.app.get(self.index_url, {"q": "organiser 1"}, user=self.user)
+        self.assertContains(response, "Admin Event Page 1")
+        self.assertNotContains(response, "Admin Event Page 0")
+
+        day = localtime() + datetime.timedelta(3)
+        response = self.app.get(
+            self.index_url, {"q": "{:%d.%m.%Y}".format(day)}, user=self.user
+        )
+        self.assertContains(response, "Admin Event Page 0")
+        self.assertNotContains(response, self.event_page.title)
+
+    def test_import_events(self):
+        url = reverse("import_events", args=[self.event_group_page.pk])
+        csv = "uid,title,start\nevent-1,Imported Event,2030-05-01 18:00\n"
+
+        form = self.app.get(url, user=self.user).forms["import-events-form"]
+        form["file"] = Upload("events.csv", csv.encode(), "text/csv")
+        response = form.submit().follow()
+        self.assertContains(response, "Imported Event")
+
+        form = self.app.get(url, user=self.user).forms["import-events-form"]
+        form["file"] = Upload("events.csv", b"uid,title,start\nevent-2,,\n", "text/csv")
+        response = form.submit()
+        self.assertContains(response, "title is missing")
+        self.assertFalse(EventPage.objects.filter(import_uid="event-2").exists())
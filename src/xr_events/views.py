@@ -1,3 +1,208 @@
-from django.shortcuts import render
+from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.http import (
+    Http404,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from wagtail.core.models import Page
 
-# Create your views here.
+from django.utils.translation import ugettext as _
+
+from .forms import EventImportForm
+from .models import (
+    EventGroupPage,
+    EventListPageBase,
+    EventOccurrence,
+    EventPageListFilter,
+)
+from .services import (
+    EVENT_API_FIELDS,
+    EVENT_API_MAX_PAGE_SIZE,
+    EVENT_API_PAGE_SIZE,
+    EVENT_GEO_SEARCH_LIMIT,
+    EVENT_GEO_SEARCH_MAX_RADIUS,
+    decode_event_cursor,
+    generate_event_feed,
+    get_event_api_etag,
+    get_event_feed_validators,
+    import_events,
+    paginate_event_occurrences,
+    parse_event_import,
+    search_events_nearby,
+    serialize_event_occurrence,
+)
+
+
+def event_feed_view(request, page_id):
+    """iCalendar feed of an EventListPage or EventGroupPage"""
+
+    page = get_object_or_404(Page.objects.live(), id=page_id).specific
+    if not isinstance(page, EventListPageBase):
+        raise Http404()
+
+    etag, last_modified = get_event_feed_validators(page)
+
+    # calendar clients poll a lot, most of them already know the current feed
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp())
+    )
+    if response is None:
+        response = StreamingHttpResponse(
+            generate_event_feed(request, page), content_type="text/calendar"
+        )
+        response["Content-Disposition"] = 'inline; filename="events{}.ics"'.format(
+            page.pk
+        )
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+def event_api_view(request):
+    """
+    Event dates as JSON, ordered by start. Takes the filter parameters of
+    the event list pages (see EventPageListFilter) and
+
+        fields     comma separated EVENT_API_FIELDS, defaults to all
+        limit      the page size
+        cursor     the next page, as given by the previous response
+    """
+    fields = EVENT_API_FIELDS
+    if request.GET.get("fields"):
+        fields = request.GET["fields"].split(",")
+        unknown_fields = set(fields) - set(EVENT_API_FIELDS)
+        if unknown_fields:
+            return HttpResponseBadRequest(
+                "Unknown fields: {}".format(", ".join(sorted(unknown_fields)))
+            )
+
+    try:
+        page_size = int(request.GET.get("limit", EVENT_API_PAGE_SIZE))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid limit.")
+    page_size = min(max(page_size, 1), EVENT_API_MAX_PAGE_SIZE)
+
+    cursor = request.GET.get("cursor", "")
+    event_filter = EventPageListFilter.from_query_dict(request.GET)
+    queryset = event_filter.filter(EventOccurrence.objects.live())
+
+    etag = get_event_api_etag(
+        queryset,
+        "{}|{}|{}|{}".format(event_filter.key, cursor, page_size, ",".join(fields)),
+    )
+    # clients with unchanged data don't need to wait for the serialization
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        occurrences, next_cursor = paginate_event_occurrences(
+            queryset.with_card_data(),
+            cursor=decode_event_cursor(cursor),
+            page_size=page_size,
+        )
+
+        next_page_url = None
+        if next_cursor:
+            params = request.GET.copy()
+            params["cursor"] = next_cursor
+            next_page_url = request.build_absolute_uri("?{}".format(params.urlencode()))
+
+        response = JsonResponse(
+            {
+                "results": [
+                    serialize_event_occurrence(occurrence, fields, request)
+                    for occurrence in occurrences
+                ],
+                "next": next_page_url,
+            }
+        )
+
+    response["ETag"] = etag
+    return response
+
+
+def event_geo_search_view(request):
+    """
+    Upcoming events near ?lat=&lng=&radius= (km) or
+    within ?bbox=south,west,north,east as JSON.
+    """
+    try:
+        limit = min(
+            int(request.GET.get("limit", EVENT_GEO_SEARCH_LIMIT)),
+            EVENT_GEO_SEARCH_LIMIT,
+        )
+        if "bbox" in request.GET:
+            south, west, north, east = map(float, request.GET["bbox"].split(","))
+            if south > north:
+                raise ValueError("Invalid bounding box.")
+            occurrences = search_events_nearby(
+                bounding_box=(south, west, north, east), limit=limit
+            )
+        else:
+            point = float(request.GET["lat"]), float(request.GET["lng"])
+            radius = float(request.GET.get("radius", 25))
+            if not 0 < radius <= EVENT_GEO_SEARCH_MAX_RADIUS:
+                raise ValueError("Invalid radius.")
+            occurrences = search_events_nearby(point=point, radius=radius, limit=limit)
+    except (KeyError, ValueError) as e:
+        return HttpResponseBadRequest(str(e))
+
+    events = []
+    for occurrence in occurrences:
+        event_page = occurrence.event_page
+        url = event_page.get_url(request)
+        if occurrence.event_date_id:
+            url = "{}{}/".format(url, occurrence.event_date_id)
+        event = {
+            "title": event_page.title,
+            "url": url,
+            "start": occurrence.start.isoformat(),
+            "end": occurrence.end.isoformat(),
+            "location": occurrence.location,
+            "latitude": occurrence.geo_location.latitude,
+            "longitude": occurrence.geo_location.longitude,
+            "group": event_page.group.name if event_page.group else None,
+        }
+        if hasattr(occurrence, "distance"):
+            event["distance"] = round(occurrence.distance, 1)
+        events.append(event)
+
+    return JsonResponse({"events": events})
+
+
+def import_events_view(request, page_id):
+    page = get_object_or_404(EventGroupPage, id=page_id)
+
+    perms = page.permissions_for_user(request.user)
+    if not perms.can_publish_subpage():
+        return HttpResponseForbidden()
+
+    form = EventImportForm(request.POST or None, request.FILES or None)
+    if form.is_valid():
+        file = form.cleaned_data["file"]
+        try:
+            events = parse_event_import(file.data, file.format)
+        except ValidationError as e:
+            for message in e.messages:
+                form.add_error("file", message)
+        else:
+            created, updated, unchanged = import_events(
+                page, events, owner=request.user
+            )
+            messages.success(
+                request,
+                _("Created {} and updated {} events, {} events are unchanged.").format(
+                    created, updated, unchanged
+                ),
+            )
+            return redirect(reverse("wagtailadmin_explore", args=[page.id]))
+
+    return render(
+        request, "xr_events/admin/import_events.html", {"page": page, "form": form}
+    )
@@ -1,12 +1,107 @@
-from django.db.models import Min, F
+import datetime
+import operator
+from functools import reduce
+
+from django.db.models import Exists, F, OuterRef, Prefetch, Q
 from django.utils import formats
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext as _
+from django.urls import reverse
 from wagtail.admin.utils import permission_denied
+from wagtail.admin.widgets import Button
+from wagtail.contrib.modeladmin.helpers import PagePermissionHelper
 from wagtail.contrib.modeladmin.options import ModelAdmin, modeladmin_register
+from wagtail.contrib.modeladmin.views import IndexView
 from wagtail.core import hooks
+from wagtail.core.models import Page, UserPagePermissionsProxy
+
+from .models import EventPage, EventGroupPage, EventOrganiser, ShadowEventPage
+from .services import (
+    local_day_start,
+    update_event_occurrences,
+    update_shadow_event_occurrences,
+)
+
+# search terms in one of these formats are searched as dates
+EVENT_ADMIN_DATE_FORMATS = ["%d.%m.%Y", "%d.%m.%y", "%Y-%m-%d"]
+
+
+class EventPermissionHelper(PagePermissionHelper):
+    """
+    Shares the page permissions of the user and the parent pages between
+    all rows of the index, instead of loading them for every row.
+    """
+
+    def get_page_permissions(self, user):
+        # the user object lives as long as the request
+        if not hasattr(user, "_event_page_permissions"):
+            user._event_page_permissions = UserPagePermissionsProxy(user)
+            user._event_parent_pages = {}
+        return user._event_page_permissions
+
+    def get_parent_page(self, user, obj):
+        self.get_page_permissions(user)
+        parent_path = obj.path[: -obj.steplen]
+        if parent_path not in user._event_parent_pages:
+            user._event_parent_pages[parent_path] = Page.objects.get(path=parent_path)
+        return user._event_parent_pages[parent_path]
+
+    def user_can_edit_obj(self, user, obj):
+        return self.get_page_permissions(user).for_page(obj).can_edit()
+
+    def user_can_delete_obj(self, user, obj):
+        return self.get_page_permissions(user).for_page(obj).can_delete()
+
+    def user_can_publish_obj(self, user, obj):
+        perms = self.get_page_permissions(user).for_page(obj)
+        return obj.live and perms.can_unpublish()
+
+    def user_can_copy_obj(self, user, obj):
+        parent_page = self.get_parent_page(user, obj)
+        perms = self.get_page_permissions(user).for_page(parent_page)
+        return perms.can_publish_subpage()
 
-from .models import EventPage, EventGroupPage
+
+class EventIndexView(IndexView):
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Date terms are searched as date ranges, other terms in the text
+        fields. Organisers are matched with a subquery, so that no
+        distinct is needed.
+        """
+        for bit in search_term.split():
+            day = parse_search_date(bit)
+            if day:
+                day_start = local_day_start(day)
+                next_day_start = local_day_start(day + datetime.timedelta(1))
+                # events running on that day
+                queryset = queryset.filter(
+                    Q(start_date__gte=day_start) | Q(end_date__gte=day_start),
+                    start_date__lt=next_day_start,
+                )
+                continue
+
+            or_queries = [
+                Q(**{"{}__icontains".format(search_field): bit})
+                for search_field in self.search_fields
+            ]
+            organisers = EventOrganiser.objects.filter(
+                event_page=OuterRef("pk"), name__icontains=bit
+            )
+            queryset = queryset.annotate(organiser_matches=Exists(organisers)).filter(
+                reduce(operator.or_, or_queries) | Q(organiser_matches=True)
+            )
+
+        return queryset, False
+
+
+def parse_search_date(value):
+    for date_format in EVENT_ADMIN_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    return None
 
 
 class EventAdmin(ModelAdmin):
@@ -18,19 +113,23 @@ class EventAdmin(ModelAdmin):
     exclude_from_explorer = False
     list_display = ("title", "get_dates_display", "location", "get_organisers_display")
     list_filter = ("group", "start_date")
-    search_fields = (
-        "title",
-        "start_date",
-        "end_date",
-        "location",
-        "group__name",
-        "further_organisers__name",
-    )
+    # dates and further organisers are searched by EventIndexView
+    search_fields = ("title", "location", "group__name")
+    index_view_class = EventIndexView
+    permission_helper_class = EventPermissionHelper
 
     def get_queryset(self, request):
         # we overwrite this method to annotate fields before ordering is applied
         # note that self.ordering or self.get_ordering() will have no effect
         qs = self.model._default_manager.get_queryset()
+        qs = qs.select_related("group").prefetch_related(
+            Prefetch(
+                "further_organisers",
+                queryset=EventOrganiser.objects.order_by("sort_order"),
+                # modelcluster shares one prefetch queryset between all pages
+                to_attr="prefetched_organisers",
+            )
+        )
         return qs.order_by(F("start_date").desc(nulls_last=True), "title")
 
     def get_dates_display(self, obj):
@@ -46,10 +145,8 @@ class EventAdmin(ModelAdmin):
     get_dates_display.short_description = _("Dates")
 
     def get_organisers_display(self, obj):
-        organisers = [obj.group.name]
-        if obj.further_organisers.exists():
-            for organiser in obj.further_organisers.all().order_by("sort_order"):
-                organisers.append(str(organiser))
+        organisers = [obj.group.name] if obj.group else []
+        organisers += [str(organiser) for organiser in obj.prefetched_organisers]
         return mark_safe("<br>".join(organisers))
 
     get_organisers_display.short_description = _("Organisers")
@@ -67,3 +164,26 @@ def protect_event_group_pages(request, page):
     if isinstance(page.specific, EventGroupPage):
         if page.group.is_regional_group:
             return permission_denied(request)
+
+
+@hooks.register("after_move_page")
+def update_moved_event_occurrences(request, page):
+    page = page.specific
+
+    if isinstance(page, EventPage):
+        update_event_occurrences(page)
+    elif isinstance(page, ShadowEventPage):
+        update_shadow_event_occurrences(page)
+
+
+@hooks.register("register_page_listing_more_buttons")
+def page_listing_import_events_button(page, page_perms, is_parent=False):
+    if issubclass(page.specific_class, EventGroupPage) and (
+        page_perms.can_publish_subpage()
+    ):
+        yield Button(
+            _("Import events"),
+            reverse("import_events", args=[page.id]),
+            attrs={"title": _("Import events from a csv or ical file")},
+            priority=60,
+        )
@@ -4,6 +4,7 @@ from wagtail.core import blocks
 from wagtail.documents.blocks import DocumentChooserBlock
 from wagtail.embeds.blocks import EmbedBlock
 from wagtail.images.blocks import ImageChooserBlock
+from wagtail.snippets.blocks import SnippetChooserBlock
 
 from xr_embeds.blocks import GdprEmbedBlock
 from xr_wagtail.block_utils import (
@@ -24,6 +25,7 @@ from xr_wagtail.block_utils import (
     BG_COLOR_CHOICES,
 )
 from xr_newsletter.blocks import EmailFormBlock
+from xr_pages.services import add_page_cache_tags
 
 
 # Blocks
@@ -263,6 +265,47 @@ class UmapBlock(CollapsibleFieldsMixin, blocks.StructBlock):
         value_class = XrStructValue
 
 
+class UpcomingEventsBlock(CollapsibleFieldsMixin, blocks.StructBlock):
+    heading = blocks.CharBlock(**heading_block_kwargs)
+    group = SnippetChooserBlock(
+        "xr_pages.LocalGroup",
+        required=False,
+        help_text=_("Only show events of this group. Leave empty for all events."),
+    )
+    count = blocks.IntegerBlock(
+        default=3,
+        min_value=1,
+        max_value=12,
+        help_text=_("The number of events to show."),
+    )
+
+    fields = ["heading", {"label": _("Settings"), "fields": ["group", "count"]}]
+
+    class Meta:
+        icon = "date"
+        template = "xr_pages/blocks/upcoming_events.html"
+
+    def get_context(self, value, parent_context=None):
+        # xr_events.models imports the ContentBlock of this module
+        from xr_events.services import (
+            get_upcoming_event_occurrences,
+            get_upcoming_events_page_cache_tags,
+        )
+
+        context = super().get_context(value, parent_context=parent_context)
+        group = value.get("group")
+        group_id = group.pk if group else None
+        event_occurrences = get_upcoming_event_occurrences(
+            group_id=group_id, count=value.get("count")
+        )
+        add_page_cache_tags(
+            context.get("request", None),
+            *get_upcoming_events_page_cache_tags(group_id, event_occurrences)
+        )
+        context["event_occurrences"] = event_occurrences
+        return context
+
+
 class GridBlock(CollapsibleFieldsMixin, blocks.StructBlock):
     heading = blocks.CharBlock(**heading_block_kwargs)
     items = blocks.StreamBlock(
@@ -339,6 +382,7 @@ class ContentBlock(blocks.StreamBlock):
     grid = GridBlock()
     umap = AlignedUmapBlock()
     embed = AlignedGdprEmbedBlock()
+    upcoming_events = UpcomingEventsBlock()
     # carousel = AlignedCarouselBlock()
 
     class Meta:
@@ -0,0 +1,47 @@
+"""
+Geocoding backends, the one in use is configured by settings.XR_GEOCODER.
+
+A backend has a geocode(location) method, that returns the (latitude,
+longitude) of the given location text or None, if it's not found.
+Failed requests raise GeocoderError, so that they can be retried later.
+"""
+import geocoder
+from django.conf import settings
+
+from xr_pages.services import normalize_location
+
+
+class GeocoderError(Exception):
+    pass
+
+
+class OsmGeocoder:
+    """Nominatim of OpenStreetMap, allows one request per second."""
+
+    def geocode(self, location):
+        try:
+            result = geocoder.osm(location)
+        except Exception as e:
+            raise GeocoderError(str(e)) from e
+        if result and result.json and "lat" in result.json and "lng" in result.json:
+            return float(result.json["lat"]), float(result.json["lng"])
+        return None
+
+
+class StubGeocoder:
+    """
+    An offline geocoder for tests and development, which only knows the
+    locations of settings.XR_GEOCODER_STUB_LOCATIONS, a dict of location
+    text -> (latitude, longitude).
+    """
+
+    def __init__(self, locations=None):
+        if locations is None:
+            locations = getattr(settings, "XR_GEOCODER_STUB_LOCATIONS", {})
+        self.locations = {
+            normalize_location(location): tuple(coordinates)
+            for location, coordinates in locations.items()
+        }
+
+    def geocode(self, location):
+        return self.locations.get(normalize_location(location))
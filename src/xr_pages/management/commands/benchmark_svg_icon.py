@@ -0,0 +1,33 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.template import Context, Template
+
+
+class Command(BaseCommand):
+    help = "Measures the time per call of the svg_icon template tag."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--number", type=int, default=10000, help="The number of calls."
+        )
+
+    def handle(self, *args, **options):
+        number = options["number"]
+        template = Template(
+            '{% load xr_pages_tags %}{% svg_icon "email" 28 aria_label="Email" %}'
+        )
+
+        def embed():
+            template.render(Context({"_embedded_svg_icons": set()}))
+
+        context = Context({"_embedded_svg_icons": {"email"}})
+
+        def use():
+            template.render(context)
+
+        for name, func in [("embedded", embed), ("use", use)]:
+            seconds = min(timeit.repeat(func, number=number, repeat=3))
+            self.stdout.write(
+                "{}: {:.1f} µs per call".format(name, seconds / number * 1000000)
+            )
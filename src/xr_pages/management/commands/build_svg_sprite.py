@@ -0,0 +1,27 @@
+import os
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from xr_pages.svg_icons import build_svg_sprite
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes a sprite sheet of all svg icons. Set XR_SVG_ICON_SPRITE to its "
+        "static path to reference the icons from it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=os.path.join(
+                apps.get_app_config("xr_pages").path, "static", "img", "svg-icons.svg"
+            ),
+            help="The file to write the sprite sheet to.",
+        )
+
+    def handle(self, *args, **options):
+        with open(options["output"], "w") as sprite_file:
+            sprite_file.write(build_svg_sprite())
+        self.stdout.write("Wrote {}.".format(options["output"]))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from xr_pages.services import GEOCODE_DELAY, geocode_pending_locations
+
+
+class Command(BaseCommand):
+    help = "Geocodes pending local group and event locations. Should be run regularly."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit", type=int, default=None, help="Geocode at most n locations."
+        )
+        parser.add_argument(
+            "--delay",
+            type=float,
+            default=GEOCODE_DELAY,
+            help="Seconds between two geocoding requests.",
+        )
+
+    def handle(self, *args, **options):
+        count = geocode_pending_locations(
+            limit=options["limit"], delay=options["delay"]
+        )
+        self.stdout.write("Geocoded {} locations.".format(count))
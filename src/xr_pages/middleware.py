@@ -0,0 +1,52 @@
+import gzip
+import re
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .services import get_cached_page, is_page_cache_request, set_cached_page
+
+# see django.middleware.gzip
+re_accepts_gzip = re.compile(r"\bgzip\b")
+
+
+class PageCacheMiddleware:
+    """
+    Serves anonymous requests of pages with page_cache from the page cache
+    and stores their responses, see xr_pages.services.
+
+    It relies on request.user, request.site and the messages, so it has to
+    come after the AuthenticationMiddleware, MessageMiddleware and the
+    SiteMiddleware of Wagtail.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_page_cache_request(request):
+            return self.get_response(request)
+
+        cached_page = get_cached_page(request)
+        if cached_page is not None:
+            return self.get_cached_response(request, cached_page)
+
+        response = self.get_response(request)
+        # the view may log in the user or add messages
+        if is_page_cache_request(request) and set_cached_page(request, response):
+            patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+
+    def get_cached_response(self, request, cached_page):
+        content = cached_page["content"]
+        accepts_gzip = re_accepts_gzip.search(
+            request.META.get("HTTP_ACCEPT_ENCODING", "")
+        )
+        if not accepts_gzip:
+            content = gzip.decompress(content)
+
+        response = HttpResponse(content, content_type=cached_page["content_type"])
+        if accepts_gzip:
+            response["Content-Encoding"] = "gzip"
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
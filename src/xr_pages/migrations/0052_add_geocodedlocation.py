@@ -0,0 +1,49 @@
+# Generated by Django 2.2.2 on 2026-10-18 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("xr_pages", "0051_data_add_lnglat_for_existing_ogs")]
+
+    operations = [
+        migrations.CreateModel(
+            name="GeocodedLocation",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("query", models.CharField(max_length=255, unique=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("found", "Found"),
+                            ("not_found", "Not found"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                ("latitude", models.FloatField(blank=True, null=True)),
+                ("longitude", models.FloatField(blank=True, null=True)),
+                (
+                    "grid_cell",
+                    models.IntegerField(blank=True, db_index=True, null=True),
+                ),
+                ("geocoded_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="geocodedlocation",
+            index=models.Index(fields=["status"], name="xr_pages_geoloc_status_idx"),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.2 on 2026-10-18 22:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("xr_pages", "0052_add_geocodedlocation")]
+
+    operations = [
+        migrations.AddField(
+            model_name="localgroup",
+            name="geocoded_location",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="local_groups",
+                to="xr_pages.GeocodedLocation",
+            ),
+        )
+    ]
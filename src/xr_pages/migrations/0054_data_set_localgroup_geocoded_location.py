@@ -0,0 +1,40 @@
+# Generated by Django 2.2.2 on 2026-10-18 22:42
+
+from django.db import migrations
+
+from xr_pages.services import get_grid_cell
+
+
+def set_geocoded_location(apps, schema_editor):
+    GeocodedLocation = apps.get_model("xr_pages", "GeocodedLocation")
+    LocalGroup = apps.get_model("xr_pages", "LocalGroup")
+
+    for group in LocalGroup.objects.exclude(location="").order_by("pk"):
+        # see xr_pages.services.normalize_location
+        query = " ".join(group.location.split()).lower()[:255]
+        if not query:
+            continue
+
+        geocoded_location, created = GeocodedLocation.objects.get_or_create(query=query)
+        if geocoded_location.status == "pending" and "," in group.lnglat:
+            # keep the coordinates found by the former synchronous geocoding
+            longitude, latitude = group.lnglat.split(",")[:2]
+            geocoded_location.longitude = float(longitude)
+            geocoded_location.latitude = float(latitude)
+            geocoded_location.grid_cell = get_grid_cell(
+                geocoded_location.latitude, geocoded_location.longitude
+            )
+            geocoded_location.status = "found"
+            geocoded_location.save()
+
+        group.geocoded_location = geocoded_location
+        group.save(update_fields=["geocoded_location"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("xr_pages", "0053_localgroup_geocoded_location")]
+
+    operations = [
+        migrations.RunPython(set_geocoded_location, migrations.RunPython.noop)
+    ]
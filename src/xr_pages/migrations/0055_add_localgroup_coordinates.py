@@ -0,0 +1,28 @@
+# Generated by Django 2.2.2 on 2026-10-18 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("xr_pages", "0054_data_set_localgroup_geocoded_location")]
+
+    operations = [
+        migrations.AddField(
+            model_name="localgroup",
+            name="latitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="localgroup",
+            name="longitude",
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="localgroup",
+            name="grid_cell",
+            field=models.IntegerField(
+                blank=True, db_index=True, editable=False, null=True
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.2 on 2026-10-18 23:07
+
+from django.db import migrations
+
+from xr_pages.services import get_grid_cell
+
+
+def set_coordinates(apps, schema_editor):
+    LocalGroup = apps.get_model("xr_pages", "LocalGroup")
+
+    for group in LocalGroup.objects.exclude(lnglat="").order_by("pk"):
+        try:
+            longitude, latitude = map(float, group.lnglat.split(",")[:2])
+        except ValueError:
+            continue
+
+        group.latitude = latitude
+        group.longitude = longitude
+        group.grid_cell = get_grid_cell(latitude, longitude)
+        group.save(update_fields=["latitude", "longitude", "grid_cell"])
+
+
+def set_lnglat(apps, schema_editor):
+    LocalGroup = apps.get_model("xr_pages", "LocalGroup")
+
+    for group in LocalGroup.objects.filter(latitude__isnull=False).order_by("pk"):
+        group.lnglat = "{},{}".format(group.longitude, group.latitude)
+        group.save(update_fields=["lnglat"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("xr_pages", "0055_add_localgroup_coordinates")]
+
+    operations = [migrations.RunPython(set_coordinates, set_lnglat)]
@@ -0,0 +1,10 @@
+# Generated by Django 2.2.2 on 2026-10-18 23:08
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("xr_pages", "0056_data_set_localgroup_coordinates")]
+
+    operations = [migrations.RemoveField(model_name="localgroup", name="lnglat")]
@@ -1,8 +1,8 @@
 import datetime
 from urllib.parse import unquote
 
-import geocoder
 from django.db import models, transaction
+from django.db.models import Q
 from django.utils.translation import ugettext as _
 from wagtail.admin.edit_handlers import StreamFieldPanel, FieldPanel, MultiFieldPanel
 from wagtail.core.fields import StreamField
@@ -11,7 +11,22 @@ from wagtail.images.edit_handlers import ImageChooserPanel
 from wagtail.snippets.edit_handlers import SnippetChooserPanel
 from wagtail.snippets.models import register_snippet
 
-from xr_pages.services import get_site
+from xr_pages.services import (
+    GEO_NEAREST_START_RADIUS,
+    GEO_SEARCH_MAX_RADIUS,
+    get_bounding_box,
+    get_coordinate_fields,
+    get_distance,
+    get_geocoded_location,
+    get_grid_cell_ranges,
+    get_page_cache_purge_tags,
+    get_site,
+    get_stream_references,
+    resolve_page_route,
+    PAGE_CACHE_IMAGE_TAG,
+    PAGE_CACHE_LOCAL_GROUP_TAG,
+    PAGE_CACHE_PAGE_TAG,
+)
 from xr_web.settings import LOCAL_GROUP_STATE_CHOICES
 from .blocks import ContentBlock
 
@@ -55,12 +70,43 @@ class XrPage(Page):
         FieldPanel("description", classname="full"),
     ]
 
+    # serve anonymous requests from the page cache, see PageCacheMiddleware
+    page_cache = False
+
     class Meta:
         abstract = True
 
     def get_absolute_url(self):
         return self.full_url
 
+    def get_page_cache_tags(self):
+        """
+        The tags of the page cache entries of this page. Everything, that
+        is rendered besides the page, adds its own tags while rendering.
+        """
+        tags = {PAGE_CACHE_PAGE_TAG.format(self.pk)}
+        # teasers and links show the title, url and image of the chosen pages
+        page_ids, image_ids = get_stream_references(self)
+        tags.update(PAGE_CACHE_PAGE_TAG.format(page_id) for page_id in page_ids)
+        if self.image_id:
+            image_ids.add(self.image_id)
+        tags.update(PAGE_CACHE_IMAGE_TAG.format(image_id) for image_id in image_ids)
+        group_id = getattr(self, "group_id", None)
+        if group_id:
+            tags.add(PAGE_CACHE_LOCAL_GROUP_TAG.format(group_id))
+        return tags
+
+    def get_page_cache_purge_tags(self):
+        return get_page_cache_purge_tags(self)
+
+    def route(self, request, path_components):
+        # skip the query per path component of Page.route, if possible
+        resolved = resolve_page_route(self, path_components)
+        if resolved:
+            subpage, remaining_components = resolved
+            return subpage.route(request, remaining_components)
+        return super().route(request, path_components)
+
 
 class HomePage(XrPage):
     template = "xr_pages/pages/home.html"
@@ -72,6 +118,8 @@ class HomePage(XrPage):
     parent_page_types = []
     is_creatable = False
 
+    page_cache = True
+
     class Meta:
         verbose_name = _("Home Page")
         verbose_name_plural = _("Home Pages")
@@ -86,6 +134,8 @@ class HomeSubPage(XrPage):
 
     parent_page_types = ["HomePage", "HomeSubPage"]
 
+    page_cache = True
+
     def save(self, *args, **kwargs):
         if not hasattr(self, "group") or self.group is None:
             self.group = self.get_parent().specific.group
@@ -97,6 +147,43 @@ class HomeSubPage(XrPage):
         verbose_name_plural = _("Content Pages")
 
 
+class GeocodedLocation(models.Model):
+    """
+    A cached geocoding result, shared by all local groups and event
+    occurrences with the same (normalized) location text. Locations are
+    created pending and are geocoded out-of-band by geocode_pending_locations.
+    """
+
+    PENDING = "pending"
+    FOUND = "found"
+    NOT_FOUND = "not_found"
+    STATUS_CHOICES = [
+        (PENDING, _("Pending")),
+        (FOUND, _("Found")),
+        (NOT_FOUND, _("Not found")),
+    ]
+
+    query = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # see xr_pages.services.get_grid_cell
+    grid_cell = models.IntegerField(null=True, blank=True, db_index=True)
+    geocoded_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status"], name="xr_pages_geoloc_status_idx")]
+
+    def __str__(self):
+        return self.query
+
+    @property
+    def coordinates(self):
+        if self.status != self.FOUND:
+            return None
+        return self.latitude, self.longitude
+
+
 class LocalGroupQuerySet(models.QuerySet):
     def active(self):
         return self.filter(
@@ -125,17 +212,65 @@ class LocalGroupQuerySet(models.QuerySet):
         )
 
     def has_upcoming_events(self):
+        # events without an end_date, but with a start_date recur endlessly
         return (
             self.filter(events__isnull=False)
             .filter(events__live=True)
-            .filter(events__end_date__gte=datetime.date.today)
+            .filter(
+                Q(events__end_date__gte=datetime.date.today())
+                | Q(events__start_date__isnull=False, events__end_date__isnull=True)
+            )
         )
 
+    def has_coordinates(self):
+        return self.filter(latitude__isnull=False, longitude__isnull=False)
+
+    def in_bounding_box(self, south, west, north, east):
+        """
+        One indexed range lookup on the grid cells per row of the bounding
+        box, the coordinates only sort out the margins of the border cells.
+        """
+        cells = Q()
+        for first, last in get_grid_cell_ranges(south, west, north, east):
+            cells |= Q(grid_cell__range=(first, last))
+        return self.filter(cells).filter(
+            latitude__range=(south, north), longitude__range=(west, east)
+        )
+
+    def within_radius(self, latitude, longitude, radius):
+        """
+        Returns a list of the groups within radius km around the point,
+        ordered by distance. The groups carry their distance in km.
+        """
+        groups = []
+        bounding_box = get_bounding_box(latitude, longitude, radius)
+        for group in self.in_bounding_box(*bounding_box):
+            group.distance = get_distance(
+                latitude, longitude, group.latitude, group.longitude
+            )
+            # the corners of the bounding box are out of radius
+            if group.distance <= radius:
+                groups.append(group)
+        return sorted(groups, key=lambda group: group.distance)
+
+    def nearest(self, latitude, longitude, count=1, max_radius=GEO_SEARCH_MAX_RADIUS):
+        """
+        Returns a list of the count nearest groups within max_radius km
+        around the point, like within_radius. The search radius is doubled,
+        until enough groups are found.
+        """
+        radius = min(GEO_NEAREST_START_RADIUS, max_radius)
+        while True:
+            groups = self.within_radius(latitude, longitude, radius)
+            if len(groups) >= count or radius >= max_radius:
+                return groups[:count]
+            radius = min(radius * 2, max_radius)
+
     def has_previous_events(self):
         return (
             self.filter(events__isnull=False)
             .filter(events__live=True)
-            .filter(events__start_date__lte=datetime.date.today)
+            .filter(events__start_date__lte=datetime.date.today())
         )
 
 
@@ -201,12 +336,20 @@ class LocalGroup(models.Model):
             'e.g. "Berlin", "Somestreet 84, 12345 Samplecity".'
         ),
     )
-    lnglat = models.CharField(
-        max_length=255,
+    # auto discovered from the location, see geocode_pending_locations
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    # see xr_pages.services.get_grid_cell
+    grid_cell = models.IntegerField(
+        null=True, blank=True, editable=False, db_index=True
+    )
+    geocoded_location = models.ForeignKey(
+        "GeocodedLocation",
+        null=True,
         blank=True,
-        default="",
         editable=False,
-        help_text=_("Auto discovered latitude and longitude. Comma separated."),
+        on_delete=models.SET_NULL,
+        related_name="local_groups",
     )
     facebook = models.URLField(null=True, blank=True, help_text=_("Facebook page URL"))
     instagram = models.URLField(
@@ -306,6 +449,9 @@ class LocalGroup(models.Model):
 
     @property
     def url(self):
+        if hasattr(self, "_preloaded_url"):
+            # preloaded by load_local_group_urls()
+            return self._preloaded_url
         if self.external_url:
             return self.external_url
         if self.is_regional_group:
@@ -369,18 +515,12 @@ class LocalGroup(models.Model):
         if not hasattr(self, "site") or not self.site:
             self.site = get_site()
 
-        if self.location:
-            try:
-                result = geocoder.osm(self.location)
-            except:  # noqa
-                result = None
-            if result and result.json and "lat" in result.json and "lng" in result.json:
-                lnglat = "{lng},{lat}".format(
-                    lng=result.json["lng"], lat=result.json["lat"]
-                )
-                self.lnglat = lnglat
-        else:
-            self.lnglat = ""
+        # geocoding is deferred to geocode_pending_locations, unless
+        # the location is already known
+        self.geocoded_location = get_geocoded_location(self.location)
+        coordinates = self.geocoded_location and self.geocoded_location.coordinates
+        for name, value in get_coordinate_fields(coordinates).items():
+            setattr(self, name, value)
 
         super().save(*args, **kwargs)
 
@@ -424,10 +564,18 @@ class LocalGroupPage(XrPage):
 
     parent_page_types = ["LocalGroupListPage"]
 
+    page_cache = True
+
     class Meta:
         verbose_name = _("Local Group Page")
         verbose_name_plural = _("Local Group Pages")
 
+    def get_page_cache_purge_tags(self):
+        # the local group menu links to this page
+        tags = super().get_page_cache_purge_tags()
+        tags.add(PAGE_CACHE_LOCAL_GROUP_TAG.format(self.group_id))
+        return tags
+
     @property
     def name(self):
         return self.group.name
@@ -1,6 +1,22 @@
+import hashlib
+import logging
+import math
+import time
+import uuid
+from collections import namedtuple
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.contrib import messages
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django.utils.text import compress_string
 from wagtail.core.models import (
     PAGE_PERMISSION_TYPE_CHOICES,
     GroupPagePermission,
@@ -10,6 +26,8 @@ from wagtail.core.models import (
     Site,
 )
 
+logger = logging.getLogger(__name__)
+
 
 # Pages
 
@@ -22,6 +40,38 @@ AVAILABLE_PAGE_PERMISSION_TYPES = [key for key, _ in PAGE_PERMISSION_TYPE_CHOICE
 MODERATORS_PAGE_PERMISSIONS = ["add", "edit", "publish"]
 EDITORS_PAGE_PERMISSIONS = ["add", "edit"]
 
+PAGE_ROUTES_VERSION_KEY = "xr_pages:page_routes_version"
+PAGE_ROUTES_CACHE_KEY = "xr_pages:page_routes:{}"
+PAGE_ROUTES_CACHE_TIMEOUT = 60 * 60 * 24
+
+NAVIGATION_VERSION_KEY = "xr_pages:navigation_version"
+NAVIGATION_CACHE_KEY = "xr_pages:navigation:{}:{}:{}"
+NAVIGATION_CACHE_TIMEOUT = 60 * 60 * 24
+# cached navigation values may be None
+NAVIGATION_MISSING = object()
+
+PAGE_CACHE_KEY = "xr_pages:page_cache:{}"
+PAGE_CACHE_TAG_KEY = "xr_pages:page_cache_tag:{}"
+# bounds the age of content, that depends on the current day, e.g. event dates
+PAGE_CACHE_TIMEOUT = 60 * 15
+PAGE_CACHE_PAGE_TAG = "page:{}"
+PAGE_CACHE_LOCAL_GROUP_TAG = "local_group:{}"
+PAGE_CACHE_IMAGE_TAG = "image:{}"
+PAGE_CACHE_MAIN_MENU_TAG = "main_menu"
+PAGE_CACHE_FLAT_MENUS_TAG = "flat_menus"
+
+# the grid index divides the world in cells of GEO_GRID_CELL_SIZE degrees,
+# numbered row by row from the south west
+GEO_GRID_CELL_SIZE = 0.1
+GEO_GRID_COLUMNS = 3600
+GEO_GRID_MAX_ROWS = 100
+EARTH_RADIUS_KM = 6371.0
+# a radius search spans at most GEO_GRID_MAX_ROWS rows of GEO_GRID_CELL_SIZE
+GEO_SEARCH_MAX_RADIUS = 500
+GEO_NEAREST_START_RADIUS = 25
+# nominatim allows one request per second
+GEOCODE_DELAY = 1.0
+
 
 # Collections
 
@@ -255,26 +305,32 @@ def add_group_collection_permission(group, collection, permission):
 
 
 def get_site(request=None):
-    try:
-        site = request.site
-    except AttributeError:
-        site = Site.objects.all().get(is_default_site=True)
-    return site
+    return get_navigation(request).site
 
 
 def get_home_page(request=None):
-    site = get_site(request=request)
-    return site.root_page.specific
+    return get_navigation(request).home_page
+
+
+def _load_home_page(navigation):
+    root_page = navigation.site.root_page
+    return defer_stream_fields(root_page.specific_class.objects).get(pk=root_page.pk)
 
 
 def get_local_group_list_page(request=None):
+    return get_navigation(request).get(
+        "local_group_list_page", _load_local_group_list_page
+    )
+
+
+def _load_local_group_list_page(navigation):
     from .models import LocalGroupListPage
 
-    home_page = get_home_page(request)
+    home_page = navigation.home_page
     try:
-        local_group_list_page = (
-            LocalGroupListPage.objects.child_of(home_page).live().get()
-        )
+        local_group_list_page = defer_stream_fields(
+            LocalGroupListPage.objects.child_of(home_page).live()
+        ).get()
     except (KeyError, AttributeError, LocalGroupListPage.DoesNotExist):
         return None
     return local_group_list_page
@@ -289,3 +345,820 @@ def get_local_groups(request=None):
         .filter(site=site, is_regional_group=False)
         .order_by("name")
     )
+
+
+def get_local_group_directory(request=None):
+    """
+    Returns the local groups of the site bucketed by their first letter,
+    as a list of (letter, local groups). The urls of the groups are
+    resolved in advance, so rendering the directory needs no further
+    queries per group.
+    """
+    local_groups = list(get_local_groups(request).select_related("localgrouppage"))
+    load_local_group_urls(local_groups, request=request)
+
+    directory = {}
+    for local_group in local_groups:
+        directory.setdefault(local_group.first_letter, []).append(local_group)
+    return list(directory.items())
+
+
+def load_local_group_urls(local_groups, request=None):
+    """
+    Resolves the urls of the given LocalGroup instances, that were loaded
+    with their localgrouppage, and stores them where LocalGroup.url picks
+    them up. The site root paths are looked up once per request.
+    """
+    for local_group in local_groups:
+        if local_group.external_url:
+            url = local_group.external_url
+        elif local_group.is_regional_group:
+            # resolved through the site root page on demand
+            continue
+        elif local_group.active_localgrouppage:
+            url = local_group.localgrouppage.get_url(request)
+        else:
+            url = None
+        local_group._preloaded_url = url
+    return local_groups
+
+
+# Navigation
+
+
+class NavigationContext:
+    """
+    Resolves the site and the pages, that the navigation refers to, at most
+    once per request. The results are shared between requests through the
+    cache, until invalidate_navigation is called, so loaders should load
+    pages with defer_stream_fields.
+    """
+
+    def __init__(self, site=None):
+        self._site = site
+        self._version = None
+        self._values = {}
+
+    @property
+    def version(self):
+        if self._version is None:
+            self._version = cache.get_or_set(
+                NAVIGATION_VERSION_KEY, uuid.uuid4().hex, None
+            )
+        return self._version
+
+    @property
+    def site(self):
+        if self._site is None:
+            cache_key = NAVIGATION_CACHE_KEY.format(self.version, "default", "site")
+            self._site = cache.get(cache_key)
+            if self._site is None:
+                self._site = Site.objects.all().get(is_default_site=True)
+                cache.set(cache_key, self._site, NAVIGATION_CACHE_TIMEOUT)
+        return self._site
+
+    @property
+    def home_page(self):
+        return self.get("home_page", _load_home_page)
+
+    def get(self, name, loader):
+        """
+        Returns the value of the given name, that is loaded by calling
+        loader with this navigation context on first use.
+        """
+        if name in self._values:
+            return self._values[name]
+
+        cache_key = NAVIGATION_CACHE_KEY.format(self.version, self.site.pk, name)
+        value = cache.get(cache_key, NAVIGATION_MISSING)
+        if value is NAVIGATION_MISSING:
+            value = loader(self)
+            cache.set(cache_key, value, NAVIGATION_CACHE_TIMEOUT)
+
+        self._values[name] = value
+        return value
+
+
+def defer_stream_fields(queryset):
+    """
+    Defers the StreamFields of the queryset's pages, which can't be pickled
+    into the cache. They are loaded on first access.
+    """
+    from wagtail.core.fields import StreamField
+
+    stream_fields = [
+        field.name
+        for field in queryset.model._meta.concrete_fields
+        if isinstance(field, StreamField)
+    ]
+    return queryset.defer(*stream_fields)
+
+
+def get_navigation(request=None):
+    """
+    Returns the NavigationContext of the request, which is created on first
+    use. Without a request, a new one for the default site is returned.
+    """
+    if request is None:
+        return NavigationContext()
+
+    try:
+        return request._xr_navigation
+    except AttributeError:
+        pass
+
+    navigation = NavigationContext(getattr(request, "site", None))
+    request._xr_navigation = navigation
+    return navigation
+
+
+def invalidate_navigation():
+    cache.set(NAVIGATION_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+# Menus
+
+
+MenuNode = namedtuple(
+    "MenuNode", ["pk", "path", "text", "href", "link_url", "children", "active_class"]
+)
+
+
+class MenuTree(
+    namedtuple("MenuTree", ["local_group_page", "event_group_page", "items", "tags"])
+):
+    """
+    The main menu of a site or of a local group as MenuNodes. A menu tree
+    holds no active classes, until it is activated for a page. Its tags
+    are the page cache tags of everything it shows.
+    """
+
+    __slots__ = ()
+
+    @property
+    def has_secondary_nav(self):
+        return any(item.children and item.active_class for item in self.items)
+
+
+def get_menu_tree(request=None, local_group=None):
+    """
+    Returns the MenuTree of the given local group, or the main menu of the
+    site for regional groups. It is built once and shared through the
+    navigation context until the pages or menus change.
+    """
+    if local_group is None or local_group.is_regional_group:
+        return get_navigation(request).get("main_menu", build_main_menu_tree)
+
+    local_group_id = local_group.pk
+    return get_navigation(request).get(
+        "local_group_menu:{}".format(local_group_id),
+        lambda navigation: build_local_group_menu_tree(navigation, local_group_id),
+    )
+
+
+def get_page_menu(request=None, page=None):
+    """
+    Returns the MenuTree of the given page with the active classes set.
+    """
+    local_group = getattr(page, "group", None) if page else None
+    menu_tree = get_menu_tree(request, local_group=local_group)
+    add_page_cache_tags(request, *menu_tree.tags)
+    return menu_tree._replace(
+        items=_activate_menu_nodes(menu_tree.items, page, request)
+    )
+
+
+def build_main_menu_tree(navigation):
+    from wagtailmenus.conf import settings as menu_settings
+    from wagtailmenus.models import MainMenu
+
+    site = navigation.site
+    main_menu = MainMenu.get_for_site(site)
+    menu_items = list(
+        main_menu.get_menu_items_manager()
+        .for_display()
+        .select_related("link_page")
+        .order_by("sort_order")
+    )
+
+    # the pages of the menu items have to be shown in menus, too
+    pages = {
+        page.pk: page
+        for page in _get_menu_pages(
+            Page.objects.filter(
+                pk__in=[item.link_page_id for item in menu_items if item.link_page_id]
+            )
+        )
+    }
+    sub_menu_pages = [
+        pages[item.link_page_id]
+        for item in menu_items
+        if item.link_page_id in pages
+        and item.allow_subnav
+        and pages[item.link_page_id].depth >= menu_settings.SECTION_ROOT_DEPTH
+    ]
+    children = _get_menu_children(sub_menu_pages, main_menu.max_levels - 1, site)
+
+    items = []
+    for item in menu_items:
+        if item.link_page_id and item.link_page_id not in pages:
+            continue
+        page = pages.get(item.link_page_id)
+        items.append(
+            MenuNode(
+                pk=page.pk if page else None,
+                path=page.path if page else None,
+                text=item.menu_text,
+                href=item.relative_url(site),
+                link_url=item.link_url if not page else None,
+                children=children.get(page.path, ()) if page else (),
+                active_class="",
+            )
+        )
+    items = tuple(items)
+    return MenuTree(
+        local_group_page=None,
+        event_group_page=None,
+        items=items,
+        tags=frozenset([PAGE_CACHE_MAIN_MENU_TAG] + _get_menu_node_tags(items)),
+    )
+
+
+def build_local_group_menu_tree(navigation, local_group_id):
+    from .models import LocalGroup
+
+    site = navigation.site
+    local_group = (
+        LocalGroup.objects.filter(pk=local_group_id)
+        .select_related("localgrouppage", "eventgrouppage")
+        .first()
+    )
+    local_group_page = local_group and local_group.active_localgrouppage
+    event_group_page = local_group and local_group.active_eventgrouppage
+
+    local_group_node = None
+    items = ()
+    if local_group_page:
+        local_group_node = _get_menu_node(local_group_page, site, text=local_group.name)
+        # the secondary nav shows the children of the active items
+        items = _get_menu_children([local_group_page], 2, site).get(
+            local_group_page.path, ()
+        )
+
+    event_group_node = None
+    if event_group_page:
+        event_group_node = _get_menu_node(event_group_page, site)
+
+    tags = [PAGE_CACHE_LOCAL_GROUP_TAG.format(local_group_id)]
+    tags += _get_menu_node_tags(
+        [node for node in [local_group_node, event_group_node] if node] + list(items)
+    )
+    return MenuTree(
+        local_group_page=local_group_node,
+        event_group_page=event_group_node,
+        items=items,
+        tags=frozenset(tags),
+    )
+
+
+def _get_menu_pages(queryset):
+    return queryset.filter(live=True, expired=False, show_in_menus=True)
+
+
+def _get_menu_node(page, site, text=None, children=()):
+    from wagtailmenus.conf import settings as menu_settings
+
+    if text is None:
+        text = getattr(page, menu_settings.PAGE_FIELD_FOR_MENU_ITEM_TEXT, page.title)
+    return MenuNode(
+        pk=page.pk,
+        path=page.path,
+        text=text,
+        href=page.relative_url(site),
+        link_url=None,
+        children=children,
+        active_class="",
+    )
+
+
+def _get_menu_children(parent_pages, levels, site):
+    """
+    Returns a dict of page path -> MenuNodes of the children, that are shown
+    in menus, of the given pages and their descendants, up to the given
+    number of levels. All levels are loaded in a single query.
+    """
+    if not parent_pages or levels < 1:
+        return {}
+
+    query = Q()
+    for page in parent_pages:
+        query |= Q(
+            path__startswith=page.path,
+            depth__gt=page.depth,
+            depth__lte=page.depth + levels,
+        )
+
+    pages_by_parent_path = {}
+    for page in _get_menu_pages(Page.objects.filter(query)).order_by("path"):
+        parent_path_end = len(page.path) - page.steplen
+        pages_by_parent_path.setdefault(page.path[:parent_path_end], []).append(page)
+
+    def get_nodes(path):
+        return tuple(
+            _get_menu_node(page, site, children=get_nodes(page.path))
+            for page in pages_by_parent_path.get(path, [])
+        )
+
+    return {page.path: get_nodes(page.path) for page in parent_pages}
+
+
+def _get_menu_node_tags(nodes):
+    tags = []
+    for node in nodes:
+        if node.pk:
+            tags.append(PAGE_CACHE_PAGE_TAG.format(node.pk))
+        tags += _get_menu_node_tags(node.children)
+    return tags
+
+
+def _activate_menu_nodes(nodes, page, request):
+    return tuple(
+        node._replace(
+            active_class=_get_menu_node_active_class(node, page, request),
+            children=_activate_menu_nodes(node.children, page, request),
+        )
+        for node in nodes
+    )
+
+
+def _get_menu_node_active_class(node, page, request):
+    """
+    The active class of a menu node like wagtailmenus would set it.
+    """
+    from wagtailmenus.conf import settings as menu_settings
+
+    if node.pk is None:
+        # a custom url
+        path = urlparse(node.link_url).path
+        if request is None or urlparse(node.link_url).netloc:
+            return ""
+        if request.path == path:
+            return menu_settings.ACTIVE_CLASS
+        if request.path.startswith(path) and path != "/":
+            return menu_settings.ACTIVE_ANCESTOR_CLASS
+        return ""
+
+    if page is None:
+        return ""
+    if node.pk == page.pk:
+        return menu_settings.ACTIVE_CLASS
+    if page.path.startswith(node.path):
+        return menu_settings.ACTIVE_ANCESTOR_CLASS
+    return ""
+
+
+# Page cache
+
+
+def get_page_cache_key(request):
+    site = getattr(request, "site", None)
+    value = "{}|{}".format(site.pk if site else None, request.get_full_path())
+    return PAGE_CACHE_KEY.format(hashlib.md5(value.encode()).hexdigest())
+
+
+def is_page_cache_request(request):
+    """
+    Whether the response to the request may come from the page cache:
+    only anonymous GET and HEAD requests without pending messages qualify.
+    """
+    user = getattr(request, "user", None)
+    return (
+        request.method in ("GET", "HEAD")
+        and not (user and user.is_authenticated)
+        and not len(messages.get_messages(request))
+    )
+
+
+def start_page_cache(request, tags):
+    """
+    Marks the response to the request for the page cache. Everything, that
+    is rendered into the response, adds its tags with add_page_cache_tags.
+    """
+    request._xr_page_cache_tags = {}
+    add_page_cache_tags(request, *tags)
+
+
+def add_page_cache_tags(request, *tags):
+    """
+    Adds the tags to the response to the request, with their versions before
+    the tagged data is rendered, so that the response isn't stored as valid,
+    if any of them is purged in the meantime.
+    """
+    tag_versions = getattr(request, "_xr_page_cache_tags", None)
+    if tag_versions is None:
+        return
+    keys = {
+        PAGE_CACHE_TAG_KEY.format(tag): tag for tag in tags if tag not in tag_versions
+    }
+    if not keys:
+        return
+    versions = cache.get_many(list(keys))
+    missing_versions = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing_versions:
+        cache.set_many(missing_versions, None)
+        versions.update(missing_versions)
+    tag_versions.update((keys[key], version) for key, version in versions.items())
+
+
+def get_cached_page(request):
+    """
+    Returns the cached page for the request as a dict of its gzipped
+    content and its content type, or None if there is none or any of its
+    tags was purged since.
+    """
+    cached_page = cache.get(get_page_cache_key(request))
+    if cached_page is None:
+        return None
+
+    tag_versions = cached_page["tags"]
+    current_versions = cache.get_many(
+        [PAGE_CACHE_TAG_KEY.format(tag) for tag in tag_versions]
+    )
+    for tag, version in tag_versions.items():
+        if current_versions.get(PAGE_CACHE_TAG_KEY.format(tag)) != version:
+            return None
+    return cached_page
+
+
+def set_cached_page(request, response):
+    """
+    Stores the response to a request, that was marked with start_page_cache,
+    unless it is user specific. Returns whether the response was stored.
+    """
+    tag_versions = getattr(request, "_xr_page_cache_tags", None)
+    if (
+        tag_versions is None
+        or response.status_code != 200
+        or response.streaming
+        or response.cookies
+        or response.has_header("Content-Encoding")
+        # e.g. a form with a csrf token
+        or request.META.get("CSRF_COOKIE_USED")
+    ):
+        return False
+
+    cached_page = {
+        "content": compress_string(response.content),
+        "content_type": response["Content-Type"],
+        "tags": tag_versions,
+    }
+    cache.set(get_page_cache_key(request), cached_page, PAGE_CACHE_TIMEOUT)
+    return True
+
+
+def purge_page_cache(*tags):
+    """
+    Purges all cached pages, that were stored with any of the given tags,
+    as soon as the current transaction is committed. Otherwise a concurrent
+    request could store the old data with the new versions of the tags.
+    """
+    keys = [PAGE_CACHE_TAG_KEY.format(tag) for tag in tags]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_page_cache_purge_tags(page):
+    """
+    The tags to purge, when the given page is published, unpublished, moved
+    or deleted: the page itself and its parent, whose children are listed
+    in menus.
+    """
+    tags = {PAGE_CACHE_PAGE_TAG.format(page.pk)}
+    parent = page.get_parent()
+    if parent:
+        tags.add(PAGE_CACHE_PAGE_TAG.format(parent.pk))
+    return tags
+
+
+def get_stream_references(page):
+    """
+    Returns the ids of all pages and images, that are chosen in the
+    StreamFields of the given page, as (page_ids, image_ids). The images
+    of the chosen pages are included, teasers show them.
+    """
+    from wagtail.core.fields import StreamField
+
+    page_ids = set()
+    image_ids = set()
+    for field in page._meta.concrete_fields:
+        if isinstance(field, StreamField):
+            stream_value = getattr(page, field.name)
+            _add_block_references(field.stream_block, stream_value, page_ids, image_ids)
+    return page_ids, image_ids
+
+
+def _add_block_references(block, value, page_ids, image_ids):
+    from wagtail.core.blocks import (
+        ListBlock,
+        PageChooserBlock,
+        StreamBlock,
+        StructBlock,
+    )
+    from wagtail.images.blocks import ImageChooserBlock
+
+    if value is None:
+        return
+    if isinstance(block, ImageChooserBlock):
+        image_ids.add(value.pk)
+    elif isinstance(block, PageChooserBlock):
+        page_ids.add(value.pk)
+        image_id = getattr(value.specific, "image_id", None)
+        if image_id:
+            image_ids.add(image_id)
+    elif isinstance(block, StructBlock):
+        for name, child_block in block.child_blocks.items():
+            _add_block_references(child_block, value.get(name), page_ids, image_ids)
+    elif isinstance(block, ListBlock):
+        for child_value in value:
+            _add_block_references(block.child_block, child_value, page_ids, image_ids)
+    elif isinstance(block, StreamBlock):
+        for child in value:
+            _add_block_references(child.block, child.value, page_ids, image_ids)
+
+
+# Routing
+
+# (version, routes) of the latest routing table used by this process
+_page_routes = (None, {})
+
+
+def get_page_routes():
+    """
+    Returns the routing table of the whole page tree, a dict of
+    url_path -> (page id, content type id). It is kept in process memory
+    and shared between processes through the cache, only its version
+    has to be looked up on each request. Returns None, if the cache
+    doesn't know a version (yet), as the table couldn't be invalidated.
+    """
+    global _page_routes
+
+    version = cache.get(PAGE_ROUTES_VERSION_KEY)
+    if version is None:
+        cache.add(PAGE_ROUTES_VERSION_KEY, uuid.uuid4().hex, None)
+        return None
+
+    local_version, routes = _page_routes
+    if local_version == version:
+        return routes
+
+    cache_key = PAGE_ROUTES_CACHE_KEY.format(version)
+    routes = cache.get(cache_key)
+    if routes is None:
+        routes = {
+            url_path: (page_id, content_type_id)
+            for url_path, page_id, content_type_id in Page.objects.values_list(
+                "url_path", "id", "content_type_id"
+            )
+        }
+        cache.set(cache_key, routes, PAGE_ROUTES_CACHE_TIMEOUT)
+
+    _page_routes = (version, routes)
+    return routes
+
+
+def invalidate_page_routes():
+    cache.set(PAGE_ROUTES_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def resolve_page_route(page, path_components):
+    """
+    Looks up the descendants of page, that match the leading path_components,
+    in the routing table. Returns the specific descendant and the remaining
+    path_components, or None if there is no such page. The lookup stops at
+    the first descendant with its own route method, which has to handle
+    the remaining path_components itself.
+    """
+    from xr_pages.models import XrPage
+
+    routes = get_page_routes()
+    if not routes:
+        return None
+
+    resolved = None
+    for depth in range(1, len(path_components) + 1):
+        url_path = "{}{}/".format(page.url_path, "/".join(path_components[:depth]))
+        if url_path not in routes:
+            break
+
+        page_id, content_type_id = routes[url_path]
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        resolved = (url_path, page_id, model, depth)
+        if model is None or model.route not in (Page.route, XrPage.route):
+            break
+
+    if resolved is None:
+        return None
+
+    url_path, page_id, model, depth = resolved
+    subpage = model.objects.filter(id=page_id).first() if model else None
+    if subpage is None or subpage.url_path != url_path:
+        # the routing table is outdated, let the page tree decide
+        invalidate_page_routes()
+        return None
+    return subpage, path_components[depth:]
+
+
+# Geo
+
+
+def normalize_location(location):
+    return " ".join(location.split()).lower()
+
+
+def get_geocoder():
+    return import_string(settings.XR_GEOCODER)()
+
+
+def geocode(location):
+    """
+    Returns (latitude, longitude) of the given location or None, if it
+    wasn't found. Raises a GeocoderError, if the request failed.
+    """
+    return get_geocoder().geocode(location)
+
+
+def get_geocoded_location(location):
+    """
+    Returns the GeocodedLocation of the given location text by its
+    normalized query. New locations are created pending, they are
+    geocoded out-of-band by geocode_pending_locations.
+    """
+    from .models import GeocodedLocation
+
+    query = normalize_location(location)[:255]
+    if not query:
+        return None
+    # concurrent saves may create the same location
+    geocoded_location, created = GeocodedLocation.objects.get_or_create(query=query)
+    return geocoded_location
+
+
+def get_geocoded_locations(locations):
+    """
+    Returns the GeocodedLocations of the given location texts by their
+    normalized query, new locations are created pending.
+    """
+    from .models import GeocodedLocation
+
+    queries = {normalize_location(location)[:255] for location in locations}
+    queries.discard("")
+    if not queries:
+        return {}
+
+    geocoded_locations = {
+        geocoded_location.query: geocoded_location
+        for geocoded_location in GeocodedLocation.objects.filter(query__in=queries)
+    }
+    missing = queries - geocoded_locations.keys()
+    if missing:
+        # concurrent saves may create the same locations
+        GeocodedLocation.objects.bulk_create(
+            [GeocodedLocation(query=query) for query in missing], ignore_conflicts=True
+        )
+        for geocoded_location in GeocodedLocation.objects.filter(query__in=missing):
+            geocoded_locations[geocoded_location.query] = geocoded_location
+    return geocoded_locations
+
+
+def geocode_pending_locations(limit=None, delay=GEOCODE_DELAY):
+    """
+    Geocodes pending GeocodedLocations of local groups and event occurrences,
+    one request per delay seconds, and updates the coordinates of the local
+    groups at these locations. Failed requests are retried by the next run.
+    Returns the number of geocoded locations.
+    """
+    from .geocoders import GeocoderError
+    from .models import GeocodedLocation, LocalGroup
+
+    pending = GeocodedLocation.objects.filter(status=GeocodedLocation.PENDING).order_by(
+        "pk"
+    )
+    if limit:
+        pending = pending[:limit]
+
+    count = 0
+    geocoded_locations = []
+    for index, geocoded_location in enumerate(pending):
+        if index and delay:
+            time.sleep(delay)
+
+        try:
+            coordinates = geocode(geocoded_location.query)
+        except GeocoderError:
+            logger.warning(
+                "Geocoding %r failed, stopping.", geocoded_location.query, exc_info=True
+            )
+            break
+
+        for name, value in get_coordinate_fields(coordinates).items():
+            setattr(geocoded_location, name, value)
+        if coordinates:
+            geocoded_location.status = GeocodedLocation.FOUND
+        else:
+            geocoded_location.status = GeocodedLocation.NOT_FOUND
+        geocoded_location.geocoded_at = timezone.now()
+        geocoded_location.save()
+        count += 1
+
+        # event occurrences join their location, local groups have a copy
+        if LocalGroup.objects.filter(geocoded_location=geocoded_location).update(
+            **get_coordinate_fields(geocoded_location.coordinates)
+        ):
+            geocoded_locations.append(geocoded_location)
+
+    if geocoded_locations:
+        from .signals import local_groups_geocoded
+
+        local_groups_geocoded.send(
+            sender=LocalGroup, geocoded_locations=geocoded_locations
+        )
+
+    logger.info("Geocoded %d locations.", count)
+    return count
+
+
+def get_grid_cell(latitude, longitude):
+    row, column = _get_grid_position(latitude, longitude)
+    return row * GEO_GRID_COLUMNS + column
+
+
+def get_coordinate_fields(coordinates):
+    """
+    The latitude, longitude and grid_cell field values of the given
+    (latitude, longitude) pair, all None if it's None.
+    """
+    if not coordinates:
+        return {"latitude": None, "longitude": None, "grid_cell": None}
+    latitude, longitude = coordinates
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "grid_cell": get_grid_cell(latitude, longitude),
+    }
+
+
+def get_grid_cell_ranges(south, west, north, east):
+    """
+    Returns the (first, last) grid cells of each row of the given bounding
+    box, so that a search needs one indexed range lookup per row.
+    Raises ValueError for boxes with more than GEO_GRID_MAX_ROWS rows.
+    """
+    first_row, first_column = _get_grid_position(south, west)
+    last_row, last_column = _get_grid_position(north, east)
+    if last_row - first_row >= GEO_GRID_MAX_ROWS:
+        raise ValueError("The bounding box is too large.")
+    if first_column > last_column:
+        # crossing the antimeridian isn't supported
+        first_column, last_column = 0, GEO_GRID_COLUMNS - 1
+
+    return [
+        (row * GEO_GRID_COLUMNS + first_column, row * GEO_GRID_COLUMNS + last_column)
+        for row in range(first_row, last_row + 1)
+    ]
+
+
+def get_bounding_box(latitude, longitude, radius):
+    """(south, west, north, east) around a point, radius in km."""
+    latitude_delta = math.degrees(radius / EARTH_RADIUS_KM)
+    longitude_delta = latitude_delta / max(math.cos(math.radians(latitude)), 0.01)
+    return (
+        latitude - latitude_delta,
+        longitude - longitude_delta,
+        latitude + latitude_delta,
+        longitude + longitude_delta,
+    )
+
+
+def get_distance(latitude1, longitude1, latitude2, longitude2):
+    """The great circle distance in km."""
+    latitude1, longitude1, latitude2, longitude2 = map(
+        math.radians, [latitude1, longitude1, latitude2, longitude2]
+    )
+    a = (
+        math.sin((latitude2 - latitude1) / 2) ** 2
+        + math.cos(latitude1)
+        * math.cos(latitude2)
+        * math.sin((longitude2 - longitude1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _get_grid_position(latitude, longitude):
+    latitude = min(max(latitude, -90.0), 90.0)
+    longitude = min(max(longitude, -180.0), 180.0)
+    rows = round(180 / GEO_GRID_CELL_SIZE)
+    # round first, 52.6 / 0.1 must not end up in the row of 52.5
+    row = min(int(round((latitude + 90) / GEO_GRID_CELL_SIZE, 6)), rows - 1)
+    column = min(
+        int(round((longitude + 180) / GEO_GRID_CELL_SIZE, 6)), GEO_GRID_COLUMNS - 1
+    )
+    return row, column
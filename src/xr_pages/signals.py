@@ -1,5 +1,14 @@
-from django.db.models.signals import pre_delete, ModelSignal, post_save
+from django.db.models.signals import (
+    pre_delete,
+    pre_save,
+    ModelSignal,
+    post_save,
+    post_delete,
+)
 from django.dispatch import receiver
+from wagtail.core.models import Page, Site
+from wagtail.images import get_image_model
+from wagtailmenus.models import FlatMenu, FlatMenuItem, MainMenu, MainMenuItem
 
 from .services import (
     delete_auth_groups,
@@ -15,6 +24,15 @@ from .services import (
     EDITORS_COLLECTION_PERMISSIONS,
     get_auth_groups,
     set_auth_groups_wagtailadmin_access,
+    get_page_cache_purge_tags,
+    invalidate_navigation,
+    invalidate_page_routes,
+    purge_page_cache,
+    PAGE_CACHE_FLAT_MENUS_TAG,
+    PAGE_CACHE_IMAGE_TAG,
+    PAGE_CACHE_LOCAL_GROUP_TAG,
+    PAGE_CACHE_MAIN_MENU_TAG,
+    PAGE_CACHE_PAGE_TAG,
 )
 from .models import LocalGroup, LocalGroupPage, HomeSubPage, HomePage
 
@@ -24,6 +42,8 @@ local_group_create = ModelSignal(providing_args=["instance"])
 local_group_name_change = ModelSignal(
     providing_args=["instance", "old_name", "new_name"]
 )
+# sent by geocode_pending_locations, which updates the coordinates in bulk
+local_groups_geocoded = ModelSignal(providing_args=["geocoded_locations"])
 
 
 # LocalGroup
@@ -97,3 +117,124 @@ def create_home_sub_page_permissions(sender, instance, created=False, **kwargs):
                 MODERATORS_PAGE_PERMISSIONS,
                 EDITORS_PAGE_PERMISSIONS,
             )
+
+
+# Page
+
+ROUTING_FIELDS = {"slug", "url_path", "live"}
+
+
+@receiver(post_save, dispatch_uid="invalidate_page_routes_on_save_once")
+def invalidate_page_routes_on_save(
+    sender, instance, created=False, update_fields=None, **kwargs
+):
+    if not isinstance(instance, Page):
+        return
+    # publishing, unpublishing and moving do a full save,
+    # save_revision only updates some bookkeeping fields
+    if created or update_fields is None or ROUTING_FIELDS & set(update_fields):
+        invalidate_page_routes()
+
+
+@receiver(post_delete, dispatch_uid="invalidate_page_routes_on_delete_once")
+def invalidate_page_routes_on_delete(sender, instance, **kwargs):
+    if isinstance(instance, Page):
+        invalidate_page_routes()
+
+
+# Navigation
+
+NAVIGATION_FIELDS = ROUTING_FIELDS | {"title", "show_in_menus"}
+# the menu trees are built from these besides the pages
+NAVIGATION_MODELS = (Site, LocalGroup, MainMenu, MainMenuItem)
+
+
+@receiver(post_save, dispatch_uid="invalidate_navigation_on_save_once")
+def invalidate_navigation_on_save(
+    sender, instance, created=False, update_fields=None, **kwargs
+):
+    if isinstance(instance, NAVIGATION_MODELS):
+        invalidate_navigation()
+    elif isinstance(instance, Page):
+        if created or update_fields is None or NAVIGATION_FIELDS & set(update_fields):
+            invalidate_navigation()
+
+
+@receiver(post_delete, dispatch_uid="invalidate_navigation_on_delete_once")
+def invalidate_navigation_on_delete(sender, instance, **kwargs):
+    if isinstance(instance, NAVIGATION_MODELS + (Page,)):
+        invalidate_navigation()
+
+
+# Page cache
+
+PAGE_CACHE_MODEL_TAGS = (
+    (LocalGroup, PAGE_CACHE_LOCAL_GROUP_TAG),
+    (get_image_model(), PAGE_CACHE_IMAGE_TAG),
+    ((MainMenu, MainMenuItem), PAGE_CACHE_MAIN_MENU_TAG),
+    ((FlatMenu, FlatMenuItem), PAGE_CACHE_FLAT_MENUS_TAG),
+)
+
+
+def _get_page_cache_purge_tags(instance):
+    if isinstance(instance, Page):
+        if hasattr(instance, "get_page_cache_purge_tags"):
+            return instance.get_page_cache_purge_tags()
+        return get_page_cache_purge_tags(instance)
+    for models, tag in PAGE_CACHE_MODEL_TAGS:
+        if isinstance(instance, models):
+            return {tag.format(instance.pk)}
+    return set()
+
+
+@receiver(pre_save, dispatch_uid="remember_page_url_path_once")
+def remember_page_url_path(sender, instance, update_fields=None, **kwargs):
+    # Page.save already sets the new url_path of a renamed or moved page
+    if isinstance(instance, Page) and instance.pk and update_fields is None:
+        instance._old_url_path = (
+            Page.objects.filter(pk=instance.pk)
+            .values_list("url_path", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, dispatch_uid="purge_page_cache_on_save_once")
+def purge_page_cache_on_save(
+    sender, instance, created=False, update_fields=None, **kwargs
+):
+    if isinstance(instance, Page):
+        # publishing, unpublishing and moving do a full save
+        if not (
+            created or update_fields is None or NAVIGATION_FIELDS & set(update_fields)
+        ):
+            return
+        tags = _get_page_cache_purge_tags(instance)
+        old_url_path = getattr(instance, "_old_url_path", None)
+        if old_url_path and old_url_path != instance.url_path:
+            # the descendants are cached at their old urls
+            tags.update(
+                PAGE_CACHE_PAGE_TAG.format(pk)
+                for pk in instance.get_descendants().values_list("pk", flat=True)
+            )
+        purge_page_cache(*tags)
+    else:
+        tags = _get_page_cache_purge_tags(instance)
+        if tags:
+            purge_page_cache(*tags)
+
+
+@receiver(pre_delete, dispatch_uid="remember_page_cache_purge_tags_once")
+def remember_page_cache_purge_tags(sender, instance, **kwargs):
+    # a subtree is deleted at once, so the parents are gone by post_delete
+    if isinstance(instance, Page):
+        instance._page_cache_purge_tags = _get_page_cache_purge_tags(instance)
+
+
+@receiver(post_delete, dispatch_uid="purge_page_cache_on_delete_once")
+def purge_page_cache_on_delete(sender, instance, **kwargs):
+    if isinstance(instance, Page):
+        tags = instance._page_cache_purge_tags
+    else:
+        tags = _get_page_cache_purge_tags(instance)
+    if tags:
+        purge_page_cache(*tags)
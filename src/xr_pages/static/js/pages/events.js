@@ -19,7 +19,23 @@ const applyFilterTimespanChange = e => {
         document.getElementById('filter-by-date').value
 }
 
+const loadMoreEvents = async e => {
+    const button = u(e.currentTarget)
+    const response = await fetch(button.attr('href') + '&format=json', {
+        credentials: 'same-origin',
+    }).then(res => res.json())
+
+    u('#event-cards').append(response['html'])
+
+    if (response['next_page_url']) {
+        button.attr('href', response['next_page_url'])
+    } else {
+        button.remove()
+    }
+}
+
 export const initEvents = () => {
     u('#filter-by-groups').on('change', applyFilterGroupChange),
         u('#filter-by-date').on('change', applyFilterTimespanChange)
+    u('#event-list-load-more').handle('click', loadMoreEvents)
 }
@@ -1,3 +1,16 @@
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
+
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+
+SVG_ICON_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "icons")
+
 svg_icon_map = {
     "email": "001-email.svg",
     "facebook": "002-facebook-logo-button.svg",
@@ -15,3 +28,108 @@ svg_icon_map = {
     "mastodon": "015-mastodon-logo.svg",
     "feed": "016-feed.svg",
 }
+
+SVG_ICON_HTML = (
+    '<i class="svg-container svg-container__{name} {css_classes}"'
+    ' style="width:{size}px; height:{size}px"{aria}>{svg}</i>'
+)
+SVG_ICON_ARIA_HTML = ' aria-label="{}" aria-hidden="true"'
+SVG_ICON_USE_HTML = '<svg viewbox="0 0 100 100"><use href="{}#svg-icon-{}"/></svg>'
+
+SVG_SPRITE_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<svg xmlns="http://www.w3.org/2000/svg" viewbox="0 0 100 100">'
+)
+SVG_SPRITE_FOOTER = "</svg>"
+
+# an icon file is a single <svg> element with the shape of id svg-icon-<name>
+SVG_RE = re.compile(r"<svg[^>]*>(?P<content>.*)</svg>", re.DOTALL)
+
+# svg: the whole svg element, content: the elements inside of it,
+# use: a reference to the already embedded svg
+SvgIcon = namedtuple("SvgIcon", ["name", "svg", "content", "use"])
+
+
+def load_svg_icons(directory=SVG_ICON_DIRECTORY):
+    """
+    Reads all icons of svg_icon_map once and returns them as an immutable
+    mapping of name -> SvgIcon, without their xml declarations.
+    Missing files are left out.
+    """
+    icons = {}
+    for name, filename in svg_icon_map.items():
+        path = os.path.join(directory, filename)
+        if not os.path.isfile(path):
+            continue
+
+        with open(path) as svg_file:
+            match = SVG_RE.search(svg_file.read())
+        if not match:
+            continue
+
+        icons[name] = SvgIcon(
+            name=name,
+            svg=match.group(0),
+            content=match.group("content"),
+            use=SVG_ICON_USE_HTML.format("", name),
+        )
+    return MappingProxyType(icons)
+
+
+svg_icons = load_svg_icons()
+
+
+def build_svg_sprite(icons=None):
+    """
+    Returns a sprite sheet with the shapes of all icons, each one keeping
+    its id svg-icon-<name>, so that it can be referenced with
+    <use href="<sprite url>#svg-icon-<name>"/>.
+    """
+    if icons is None:
+        icons = svg_icons
+    return "".join(
+        [SVG_SPRITE_HEADER]
+        + [icon.content for name, icon in sorted(icons.items())]
+        + [SVG_SPRITE_FOOTER]
+    )
+
+
+@lru_cache(maxsize=None)
+def get_svg_sprite_url():
+    """
+    The url of the sprite sheet built by the build_svg_sprite command,
+    if the XR_SVG_ICON_SPRITE setting names its static path.
+    """
+    sprite = getattr(settings, "XR_SVG_ICON_SPRITE", None)
+    if not sprite:
+        return None
+    return static(sprite)
+
+
+def render_svg_icon(icon, size=32, css_classes="", aria_label="", embed=True):
+    """
+    Returns the html of the given SvgIcon. If embed is False, the icon refers
+    to an svg, that was already embedded into the same page, or to the
+    sprite sheet, if there is one.
+    """
+    sprite_url = get_svg_sprite_url()
+    if sprite_url:
+        svg = SVG_ICON_USE_HTML.format(sprite_url, icon.name)
+    elif embed:
+        svg = icon.svg
+    else:
+        svg = icon.use
+
+    aria = ""
+    if aria_label:
+        aria = SVG_ICON_ARIA_HTML.format(conditional_escape(aria_label))
+
+    return mark_safe(
+        SVG_ICON_HTML.format(
+            name=icon.name,
+            css_classes=conditional_escape(css_classes),
+            size=conditional_escape(size),
+            aria=aria,
+            svg=svg,
+        )
+    )
@@ -1,14 +1,9 @@
-import os
-
 from django import template
-from django.conf import settings
-from django.template import Template, Context
-from django.utils.safestring import mark_safe
 from django.utils.text import normalize_newlines
 from wagtailmenus.models import FlatMenu
 
 from xr_pages import services
-from xr_pages.svg_icons import svg_icon_map
+from xr_pages.svg_icons import render_svg_icon, svg_icons
 
 register = template.Library()
 
@@ -36,6 +31,19 @@ def get_local_groups(context):
     return services.get_local_groups
 
 
+@register.simple_tag(takes_context=True)
+def get_local_group_directory(context):
+    request = context.get("request", None)
+    return services.get_local_group_directory(request)
+
+
+@register.simple_tag(takes_context=True)
+def get_page_menu(context):
+    request = context.get("request", None)
+    page = context.get("page", None)
+    return services.get_page_menu(request, page=page)
+
+
 @register.inclusion_tag("xr_pages/templatetags/inline_svg_text.html")
 def inline_svg_text(text, font_size=None):
     text = normalize_newlines(text)
@@ -52,68 +60,34 @@ def inline_svg_text(text, font_size=None):
 @register.simple_tag(takes_context=True)
 def get_footer_menus(context):
     try:
-        site = context["request"].site
-        footer_menus = FlatMenu.objects.filter(handle__startswith="footer_", site=site)
+        request = context["request"]
+        footer_menus = FlatMenu.objects.filter(
+            handle__startswith="footer_", site=request.site
+        )
     except (KeyError, AttributeError):
         return None
+    services.add_page_cache_tags(request, services.PAGE_CACHE_FLAT_MENUS_TAG)
     return list(footer_menus)
 
 
 @register.simple_tag(takes_context=True)
 def svg_icon(context, icon_name, size=32, css_classes="", aria_label=""):
-    if icon_name not in svg_icon_map:
+    icon = svg_icons.get(icon_name)
+    if icon is None:
         return ""
 
     embedded_svg_icons = context.get("_embedded_svg_icons", set())
-    svg_context = Context(
-        {
-            "name": icon_name,
-            "size": size,
-            "css_classes": css_classes,
-            "aria_label": aria_label,
-        }
-    )
-
-    if icon_name in embedded_svg_icons:
-        # The icon was already embedded. Render a <use> tag instead.
-        svg_context["svg"] = mark_safe(
-            '<svg viewbox="0 0 100 100"><use href="#svg-icon-{name}"/></svg>'.format(
-                name=icon_name
-            )
-        )
-
-    else:
-        # The icon is not yet embedded. Render the svg.
-        icon_filename = svg_icon_map[icon_name]
-        icon_directory = "xr_pages/svg_icons/icons/"
-
-        icon_path = os.path.join(settings.BASE_DIR, icon_directory, icon_filename)
-
-        if not os.path.isfile(icon_path):
-            return ""
-
-        with open(icon_path) as svg_file:
-            svg_context["svg"] = mark_safe(svg_file.read())
+    embed = icon_name not in embedded_svg_icons
 
+    if embed:
         # Remember, that we already embedded this svg icon.
         # Every time we render with the same context, the icon won't be embedded again but a <use> tag will be rendered instead.
         embedded_svg_icons.add(icon_name)
         context["_embedded_svg_icons"] = embedded_svg_icons
 
-    svg_template = Template(
-        """
-        <i class="svg-container svg-container__{{ name }} {{ css_classes }}"
-            style="width:{{ size }}px; height:{{ size }}px"
-            {% if aria_label %}
-                aria-label="{{ aria_label }}"
-                aria-hidden="true"
-            {% endif %}
-        >{{ svg }}</i>
-    """
+    return render_svg_icon(
+        icon, size=size, css_classes=css_classes, aria_label=aria_label, embed=embed,
     )
-    html = svg_template.render(svg_context)
-
-    return html
 
 
 @register.inclusion_tag(
@@ -123,6 +97,12 @@ def render_social_media_links_for_group(
     context, group, size=32, css_classes="", show_label=False
 ):
 
+    if getattr(group, "pk", None):
+        services.add_page_cache_tags(
+            context.get("request", None),
+            services.PAGE_CACHE_LOCAL_GROUP_TAG.format(group.pk),
+        )
+
     social_media_links = []
 
     for attr_name in ["facebook", "twitter", "youtube", "instagram", "mastodon"]:
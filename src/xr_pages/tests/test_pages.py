@@ -1,4 +1,9 @@
+from unittest import mock
+
 from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.http import Http404
+from django.test import RequestFactory, override_settings
 from wagtail.core.models import (
     Site,
     Page,
@@ -9,7 +14,9 @@ from wagtail.core.models import (
 from wagtail.tests.utils import WagtailPageTests
 from wagtailmenus.models import MainMenu, MainMenuItem
 
+from xr_pages.geocoders import GeocoderError, StubGeocoder
 from xr_pages.models import (
+    GeocodedLocation,
     HomePage,
     HomeSubPage,
     LocalGroupListPage,
@@ -28,6 +35,12 @@ from xr_pages.services import (
     get_collection_permission,
     PAGE_AUTH_GROUP_TYPES,
     get_auth_group_name,
+    get_page_routes,
+    geocode_pending_locations,
+    get_grid_cell,
+    get_home_page,
+    get_local_group_list_page,
+    get_site,
 )
 
 
@@ -528,3 +541,254 @@ class PagesLocalGroupTest(PagesBaseTest):
         local_group.save()
 
         self.assertTrue(local_group in LocalGroup.objects.all())
+
+
+class PagesGeocodingTest(PagesBaseTest):
+    def test_save_defers_geocoding(self):
+        with mock.patch.object(StubGeocoder, "geocode") as geocode:
+            self.local_group.location = "Berlin"
+            self.local_group.save()
+        geocode.assert_not_called()
+
+        self.assertEqual(self.local_group.geocoded_location.status, "pending")
+        self.assertIsNone(self.local_group.latitude)
+
+        self.assertEqual(geocode_pending_locations(delay=0), 1)
+        self.local_group.refresh_from_db()
+        self.assertEqual(
+            (self.local_group.latitude, self.local_group.longitude), (52.517, 13.3889)
+        )
+        self.assertEqual(self.local_group.grid_cell, get_grid_cell(52.517, 13.3889))
+
+    def test_locations_are_geocoded_once(self):
+        self.local_group.location = "  berlin "
+        self.local_group.save()
+        other_group = self._create_local_group("Other Group")
+        other_group.location = "Berlin"
+        other_group.save()
+        self.assertEqual(
+            self.local_group.geocoded_location, other_group.geocoded_location
+        )
+
+        self.assertEqual(geocode_pending_locations(delay=0), 1)
+        self.assertEqual(geocode_pending_locations(delay=0), 0)
+        other_group.refresh_from_db()
+        self.assertEqual(other_group.latitude, 52.517)
+
+        # known locations are set right away
+        third_group = self._create_local_group("Third Group")
+        third_group.location = "BERLIN"
+        third_group.save()
+        self.assertEqual(third_group.latitude, 52.517)
+
+    def test_unknown_and_removed_locations(self):
+        self.local_group.location = "Atlantis"
+        self.local_group.save()
+        geocode_pending_locations(delay=0)
+        self.assertEqual(
+            GeocodedLocation.objects.get(query="atlantis").status, "not_found"
+        )
+
+        self.local_group.location = ""
+        self.local_group.save()
+        self.assertIsNone(self.local_group.geocoded_location)
+        self.assertIsNone(self.local_group.latitude)
+
+    def test_failed_requests_are_retried(self):
+        self.local_group.location = "Hamburg"
+        self.local_group.save()
+
+        with mock.patch.object(StubGeocoder, "geocode", side_effect=GeocoderError):
+            self.assertEqual(geocode_pending_locations(delay=0), 0)
+        self.assertEqual(self.local_group.geocoded_location.status, "pending")
+
+        self.assertEqual(geocode_pending_locations(delay=0), 1)
+
+
+class PagesLocalGroupGeoTest(PagesBaseTest):
+    def setUp(self):
+        super().setUp()
+        self.groups = {}
+        for location in ["Berlin", "Potsdam", "Hamburg"]:
+            group = self._create_local_group("XR {}".format(location))
+            group.location = location
+            group.save()
+            self.groups[location] = group
+        geocode_pending_locations(delay=0)
+
+    def test_within_radius(self):
+        groups = LocalGroup.objects.within_radius(52.52, 13.4, 50)
+        self.assertEqual(groups, [self.groups["Berlin"], self.groups["Potsdam"]])
+        self.assertLess(groups[0].distance, 1)
+        self.assertLess(groups[1].distance, 30)
+
+        self.assertEqual(
+            LocalGroup.objects.within_radius(52.52, 13.4, 10), [self.groups["Berlin"]]
+        )
+
+    def test_nearest(self):
+        # Potsdam
+        groups = LocalGroup.objects.nearest(52.4, 13.06, count=2)
+        self.assertEqual(groups, [self.groups["Potsdam"], self.groups["Berlin"]])
+
+        groups = LocalGroup.objects.nearest(52.4, 13.06, count=5)
+        self.assertEqual(len(groups), 3)
+        self.assertEqual(groups[-1], self.groups["Hamburg"])
+
+        self.assertEqual(
+            LocalGroup.objects.nearest(52.4, 13.06, count=5, max_radius=100),
+            [self.groups["Potsdam"], self.groups["Berlin"]],
+        )
+
+    def test_has_coordinates(self):
+        self.assertEqual(
+            set(LocalGroup.objects.has_coordinates()), set(self.groups.values())
+        )
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class PagesRoutingTest(PagesBaseTest):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self._setup_local_group_pages()
+        self.request = RequestFactory().get("/")
+
+    def _route(self, path):
+        return self.home_page.route(self.request, path.strip("/").split("/"))
+
+    def test_route_resolves_with_a_single_query(self):
+        path = "{}/{}/".format(
+            self.local_group_page.slug, self.local_group_sub_page.slug
+        )
+        path = "{}/{}".format(self.local_group_list_page.slug, path)
+
+        # the first request builds the routing table
+        self._route(path)
+        with self.assertNumQueries(1):
+            route_result = self._route(path)
+
+        self.assertEqual(route_result.page, self.local_group_sub_page)
+        self.assertIsInstance(route_result.page, LocalGroupSubPage)
+
+    def test_route_of_intermediate_pages_is_called(self):
+        path = "{}/{}/{}/".format(
+            self.local_group_list_page.slug,
+            self.local_group_page.slug,
+            self.local_group_sub_page.slug,
+        )
+        self._route(path)
+
+        with mock.patch.object(
+            LocalGroupPage, "route", autospec=True, side_effect=LocalGroupPage.route
+        ) as route:
+            route_result = self._route(path)
+
+        route.assert_called_once_with(
+            self.local_group_page, self.request, [self.local_group_sub_page.slug]
+        )
+        self.assertEqual(route_result.page, self.local_group_sub_page)
+
+    def test_route_without_shared_cache(self):
+        path = "{}/{}/".format(
+            self.local_group_list_page.slug, self.local_group_page.slug
+        )
+
+        with override_settings(
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+            }
+        ):
+            self.assertIsNone(get_page_routes())
+            self.assertEqual(self._route(path).page, self.local_group_page)
+
+    def test_routes_follow_slug_changes(self):
+        old_path = "{}/{}/".format(
+            self.local_group_list_page.slug, self.local_group_page.slug
+        )
+        self.assertEqual(self._route(old_path).page, self.local_group_page)
+
+        self.local_group_page.slug = "new-slug"
+        self.local_group_page.save_revision().publish()
+
+        with self.assertRaises(Http404):
+            self._route(old_path)
+        self.assertEqual(
+            self._route("{}/new-slug/".format(self.local_group_list_page.slug)).page,
+            self.local_group_page,
+        )
+
+    def test_routes_follow_deletes(self):
+        path = "{}/{}/".format(
+            self.local_group_list_page.slug, self.local_group_page.slug
+        )
+        self._route(path)
+
+        self.local_group_sub_page.delete()
+        self.assertNotIn(self.local_group_sub_page.url_path, get_page_routes())
+
+    def test_outdated_routes_fall_back_to_page_tree(self):
+        path = "{}/{}/".format(
+            self.local_group_list_page.slug, self.local_group_page.slug
+        )
+        self._route(path)
+        # bypasses the signals
+        Page.objects.filter(pk=self.local_group_page.pk).update(url_path="/moved/")
+
+        # the slug is unchanged, so the page tree still finds the page
+        self.assertEqual(self._route(path).page, self.local_group_page)
+        self.assertNotIn(self.local_group_page.url_path, get_page_routes())
+
+
+class PagesNavigationTest(PagesBaseTest):
+    def setUp(self):
+        super().setUp()
+        self._setup_local_group_pages()
+
+    def _get_request(self):
+        request = RequestFactory().get("/")
+        request.site = self.site
+        return request
+
+    def test_lookups_are_memoized_per_request(self):
+        request = self._get_request()
+        self.assertEqual(get_home_page(request), self.home_page)
+        self.assertEqual(get_local_group_list_page(request), self.local_group_list_page)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_site(request), self.site)
+            self.assertEqual(get_home_page(request), self.home_page)
+            self.assertEqual(
+                get_local_group_list_page(request), self.local_group_list_page
+            )
+        self.assertIsInstance(get_home_page(request), HomePage)
+
+    def test_get_site_without_request(self):
+        self.assertEqual(get_site(), self.site)
+        self.assertEqual(get_home_page(), self.home_page)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_lookups_are_shared_between_requests(self):
+        cache.clear()
+        get_site()
+        get_local_group_list_page(self._get_request())
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_site(), self.site)
+            self.assertEqual(
+                get_local_group_list_page(self._get_request()),
+                self.local_group_list_page,
+            )
+
+        self.local_group_list_page.unpublish()
+        self.assertIsNone(get_local_group_list_page(self._get_request()))
+
+        self.local_group_list_page.title = "New Title"
+        self.local_group_list_page.save_revision().publish()
+        self.assertEqual(
+            get_local_group_list_page(self._get_request()).title, "New Title"
+        )
@@ -1,7 +1,8 @@
 from django.template import Context, Template
-from django.test import RequestFactory, TestCase
+from django.test import RequestFactory, TestCase, override_settings
 
 from xr_pages.services import get_site
+from xr_pages.svg_icons import build_svg_sprite, get_svg_sprite_url, svg_icons
 from ..models import LocalGroupSubPage, LocalGroupPage, LocalGroup
 
 
@@ -53,3 +54,45 @@ class PagesTemplatetagsTest(TestCase):
         )
         rendered_template = test_template.render(context)
         self.assertEqual(rendered_template, "{0}".format(local_group.name))
+
+    def test_svg_icon(self):
+        context = Context({"_embedded_svg_icons": set(), "label": "E-Mail & more"})
+        test_template = Template(
+            "{% load xr_pages_tags %}"
+            '{% svg_icon "email" 28 css_classes="big" aria_label=label %}'
+        )
+
+        rendered_template = test_template.render(context)
+        self.assertIn('<path id="svg-icon-email"', rendered_template)
+        self.assertNotIn("<?xml", rendered_template)
+        self.assertIn(
+            'class="svg-container svg-container__email big"', rendered_template
+        )
+        self.assertIn('style="width:28px; height:28px"', rendered_template)
+        self.assertIn('aria-label="E-Mail &amp; more"', rendered_template)
+
+        # the second icon refers to the embedded one
+        rendered_template = test_template.render(context)
+        self.assertNotIn("<path", rendered_template)
+        self.assertIn('<use href="#svg-icon-email"/>', rendered_template)
+
+        test_template = Template('{% load xr_pages_tags %}{% svg_icon "unknown" %}')
+        self.assertEqual(test_template.render(context), "")
+
+    @override_settings(XR_SVG_ICON_SPRITE="img/svg-icons.svg")
+    def test_svg_icon_sprite(self):
+        get_svg_sprite_url.cache_clear()
+        self.addCleanup(get_svg_sprite_url.cache_clear)
+        context = Context({"_embedded_svg_icons": set()})
+        test_template = Template('{% load xr_pages_tags %}{% svg_icon "email" %}')
+
+        rendered_template = test_template.render(context)
+        self.assertNotIn("<path", rendered_template)
+        self.assertIn(
+            '<use href="/static/img/svg-icons.svg#svg-icon-email"/>', rendered_template
+        )
+
+        sprite = build_svg_sprite()
+        for name in svg_icons:
+            self.assertIn('id="svg-icon-{}"'.format(name), sprite)
+        self.assertEqual(sprite.count("<?xml"), 1)
@@ -1,12 +1,44 @@
+import gzip
+import json
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django_dynamic_fixture import G
 from django_webtest import WebTest
 from wagtail.contrib.modeladmin.helpers import AdminURLHelper
-
-from xr_pages.models import LocalGroup, HomePage
-from xr_pages.services import get_auth_group_name, PAGE_MODERATORS_SUFFIX
+from wagtail.images.models import Image
+from wagtailmenus.models import MainMenuItem
+
+from xr_embeds.views import geojson_view
+from xr_pages.middleware import PageCacheMiddleware
+from xr_pages.models import (
+    LocalGroup,
+    LocalGroupPage,
+    LocalGroupSubPage,
+    HomePage,
+    HomeSubPage,
+)
+from xr_pages.services import (
+    get_auth_group_name,
+    geocode_pending_locations,
+    get_cached_page,
+    get_local_group_directory,
+    get_page_menu,
+    purge_page_cache,
+    set_cached_page,
+    start_page_cache,
+    PAGE_CACHE_IMAGE_TAG,
+    PAGE_CACHE_PAGE_TAG,
+    PAGE_MODERATORS_SUFFIX,
+)
 from xr_pages.tests.test_pages import PagesBaseTest
 
 
@@ -113,6 +145,52 @@ class PagesWebTest(PagesBaseTest, WebTest):
         self.assertLinkExists(response, self.local_group_list_page)
         self.assertLinkExists(response, self.local_group_page)
 
+    def test_local_group_list_page_query_count_is_constant(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = self.app.get(self.local_group_list_page.url)
+            return response, len(context)
+
+        # the first request warms up site related caches
+        self.app.get(self.local_group_list_page.url)
+        response, query_count = count_queries()
+
+        for name in ["Aachen", "Bonn", "Berlin", "Dresden", "Erfurt"]:
+            local_group = self._create_local_group(name)
+            local_group.facebook = "https://facebook.com/{}".format(name)
+            local_group.save()
+            self.local_group_list_page.add_child(
+                instance=LocalGroupPage(title=name, group=local_group)
+            )
+        self._create_local_group("Zwickau")
+
+        response, new_query_count = count_queries()
+        self.assertEqual(new_query_count, query_count)
+
+        local_group = LocalGroup.objects.get(name="Bonn")
+        self.assertContains(
+            response, 'href="{}"'.format(local_group.localgrouppage.url), count=2
+        )
+        self.assertContains(response, "Zwickau")
+
+    def test_local_group_directory(self):
+        self._create_local_group("Aachen")
+        self._create_local_group("Altona")
+        request = RequestFactory().get("/")
+        request.site = self.site
+
+        directory = get_local_group_directory(request)
+
+        self.assertEqual(
+            [
+                (letter, [local_group.name for local_group in local_groups])
+                for letter, local_groups in directory
+            ],
+            [("A", ["Aachen", "Altona"]), ("E", [self.local_group.name])],
+        )
+        self.assertEqual(directory[1][1][0].url, self.local_group_page.url)
+        self.assertIsNone(directory[0][1][0].url)
+
     def test_local_group_page(self):
         response = self.app.get(self.local_group_page.url)
         self.assertEqual(response.status_code, 200)
@@ -226,3 +304,328 @@ class LocalGroupAdminTest(PagesBaseTest, WebTest):
         regional_edit_page = list_page.click(href=regional_edit_url)
         self.assertContains(regional_edit_page, self.regional_group.name)
         self.assertNotContains(regional_edit_page, self.local_group.name)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class LocalGroupGeoJsonWebTest(PagesBaseTest, WebTest):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self._setup_local_group_pages()
+        self.local_group.location = "Berlin"
+        self.local_group.save()
+        geocode_pending_locations(delay=0)
+        self.url = reverse(
+            "embeds:geojson_view",
+            kwargs={"model_slug": "local_group", "query_slug": "active"},
+        )
+
+    def test_geojson(self):
+        response = self.app.get(self.url)
+
+        features = response.json["features"]
+        self.assertEqual(len(features), 1)
+        self.assertEqual(features[0]["properties"]["name"], self.local_group.name)
+        self.assertIn(
+            self.local_group_page.full_url, features[0]["properties"]["description"]
+        )
+        self.assertEqual(features[0]["geometry"]["coordinates"], [13.3889, 52.517])
+        self.assertIn("public", response["Cache-Control"])
+
+        self.app.get(self.url.replace("active", "unknown"), status=404)
+
+    def test_cached_geojson_needs_no_queries(self):
+        request = RequestFactory().get(self.url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        content = geojson_view(request, "local_group", "active").content
+
+        with self.assertNumQueries(0):
+            response = geojson_view(request, "local_group", "active")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response.content, content)
+        self.assertEqual(
+            json.loads(gzip.decompress(response.content).decode())["type"],
+            "FeatureCollection",
+        )
+
+    def test_etag(self):
+        response = self.app.get(self.url)
+        response = self.app.get(
+            self.url, headers={"If-None-Match": response["ETag"]}, status=304
+        )
+
+    def test_etag_per_encoding(self):
+        identity_response = geojson_view(
+            RequestFactory().get(self.url), "local_group", "active"
+        )
+        request = RequestFactory().get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        gzip_response = geojson_view(request, "local_group", "active")
+        self.assertNotEqual(gzip_response["ETag"], identity_response["ETag"])
+
+        request = RequestFactory().get(
+            self.url,
+            HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=identity_response["ETag"],
+        )
+        self.assertEqual(
+            geojson_view(request, "local_group", "active").status_code, 200
+        )
+        request = RequestFactory().get(
+            self.url,
+            HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=gzip_response["ETag"],
+        )
+        self.assertEqual(
+            geojson_view(request, "local_group", "active").status_code, 304
+        )
+
+    def test_geojson_is_rebuilt_on_change(self):
+        self.app.get(self.url)
+
+        with mock.patch(
+            "xr_embeds.signals.transaction.on_commit", side_effect=lambda func: func()
+        ):
+            self.local_group.name = "Renamed Group"
+            self.local_group.save()
+
+        with self.assertNumQueries(0):
+            response = geojson_view(
+                RequestFactory().get(self.url), "local_group", "active"
+            )
+        self.assertIn(b"Renamed Group", response.content)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class PagesMenuWebTest(PagesBaseTest, WebTest):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self._setup_local_group_pages()
+        self.local_group_sub_sub_page = LocalGroupSubPage(
+            title="Example SubSubPage", show_in_menus=True
+        )
+        self.local_group_sub_page.add_child(instance=self.local_group_sub_sub_page)
+
+    def test_local_group_menu(self):
+        response = self.app.get(self.local_group_sub_sub_page.url)
+
+        self.assertIn("with-secondary-nav", response.html.body["class"])
+        nav = response.html.find("ul", class_="primary-nav__menu")
+        item = nav.find(id="menu_item_{}".format(self.local_group_sub_page.pk))
+        self.assertEqual(item["href"], self.local_group_sub_page.url)
+        self.assertIn("ancestor", item.parent["class"])
+        item = nav.find(id="menu_item_{}".format(self.local_group_sub_sub_page.pk))
+        self.assertIn("active", item.parent["class"])
+
+        response = self.app.get(self.local_group_page.url)
+        self.assertNotIn("with-secondary-nav", response.html.body["class"])
+        self.assertNotContains(response, self.local_group_sub_sub_page.url)
+
+    def test_main_menu(self):
+        response = self.app.get(self.local_group_list_page.url)
+
+        item = response.html.find(
+            id="menu_item_{}".format(self.local_group_list_page.pk)
+        )
+        self.assertIn("active", item.parent["class"])
+        # the local group page is not shown in menus
+        self.assertNotIn("with-secondary-nav", response.html.body["class"])
+
+    def test_menu_needs_no_queries(self):
+        request = RequestFactory().get(self.local_group_sub_page.url)
+        request.site = self.site
+        page = LocalGroupSubPage.objects.select_related("group").get(
+            pk=self.local_group_sub_page.pk
+        )
+        get_page_menu(request, page=page)
+
+        request = RequestFactory().get(self.local_group_sub_page.url)
+        request.site = self.site
+        with self.assertNumQueries(0):
+            page_menu = get_page_menu(request, page=page)
+
+        self.assertEqual(page_menu.local_group_page.text, self.local_group.name)
+        self.assertEqual(
+            [(item.text, item.active_class) for item in page_menu.items],
+            [(self.local_group_sub_page.title, "active")],
+        )
+        self.assertTrue(page_menu.has_secondary_nav)
+
+    def _get_request(self):
+        request = RequestFactory().get(self.home_page.url)
+        request.site = self.site
+        return request
+
+    def test_menu_follows_page_changes(self):
+        get_page_menu(self._get_request(), page=self.local_group_page)
+
+        self.local_group_sub_page.title = "Renamed SubPage"
+        self.local_group_sub_page.save_revision().publish()
+        self.local_group_sub_sub_page.unpublish()
+
+        page_menu = get_page_menu(self._get_request(), page=self.local_group_page)
+        self.assertEqual(
+            [(item.text, item.children) for item in page_menu.items],
+            [("Renamed SubPage", ())],
+        )
+
+    def test_main_menu_follows_menu_item_changes(self):
+        items = get_page_menu(self._get_request(), page=self.home_page).items
+
+        MainMenuItem.objects.create(
+            menu=self.main_menu, link_url="/custom/", link_text="Custom"
+        )
+        page_menu = get_page_menu(self._get_request(), page=self.home_page)
+        self.assertEqual(page_menu.items[:-1], items)
+        self.assertEqual(page_menu.items[-1].text, "Custom")
+        self.assertEqual(page_menu.items[-1].href, "/custom/")
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class PageCacheWebTest(PagesBaseTest, WebTest):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self._setup_local_group_pages()
+        # transactions are not committed within tests, so on_commit is skipped
+        patcher = mock.patch(
+            "xr_pages.services.transaction.on_commit", side_effect=lambda func: func()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get_cached_page(self, page):
+        request = RequestFactory().get(page.url)
+        request.site = self.site
+        return get_cached_page(request)
+
+    def test_anonymous_page_is_cached(self):
+        response = self.app.get(self.local_group_page.url)
+        self.assertIsNotNone(self._get_cached_page(self.local_group_page))
+
+        # only the site lookup of the SiteMiddleware
+        with self.assertNumQueries(1):
+            cached_response = self.app.get(self.local_group_page.url)
+        self.assertEqual(cached_response.text, response.text)
+        self.assertIn("Accept-Encoding", cached_response["Vary"])
+
+    def test_cached_page_is_gzipped(self):
+        response = self.app.get(self.local_group_page.url)
+
+        request = RequestFactory().get(
+            self.local_group_page.url, HTTP_ACCEPT_ENCODING="gzip, deflate"
+        )
+        request.site = self.site
+        request.user = AnonymousUser()
+        with self.assertNumQueries(0):
+            cached_response = PageCacheMiddleware(get_response=None)(request)
+        self.assertEqual(cached_response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(cached_response.content), response.body)
+
+    def test_authenticated_user_is_not_cached(self):
+        G(get_user_model(), username="editor", is_superuser=True)
+        self.app.get(self.local_group_page.url)
+        LocalGroupPage.objects.filter(pk=self.local_group_page.pk).update(
+            title="Updated Title"
+        )
+
+        response = self.app.get(self.local_group_page.url, user="editor")
+        self.assertContains(response, "Updated Title")
+        self.app.reset()
+        response = self.app.get(self.local_group_page.url)
+        self.assertNotContains(response, "Updated Title")
+
+    def test_publishing_purges_the_page(self):
+        self.app.get(self.local_group_sub_page.url)
+
+        self.local_group_sub_page.title = "Renamed SubPage"
+        self.local_group_sub_page.save_revision().publish()
+
+        response = self.app.get(self.local_group_sub_page.url)
+        self.assertContains(response, "Renamed SubPage")
+
+    def test_publishing_purges_only_affected_pages(self):
+        self.app.get(self.home_page.url)
+        self.app.get(self.local_group_page.url)
+
+        # the local group menu links to the sub page
+        self.local_group_sub_page.save_revision().publish()
+
+        self.assertIsNotNone(self._get_cached_page(self.home_page))
+        self.assertIsNone(self._get_cached_page(self.local_group_page))
+
+    def test_local_group_change_purges_its_pages(self):
+        self.app.get(self.home_page.url)
+        self.app.get(self.local_group_sub_page.url)
+
+        self.local_group.name = "Renamed Group"
+        self.local_group.save()
+
+        self.assertIsNotNone(self._get_cached_page(self.home_page))
+        self.assertIsNone(self._get_cached_page(self.local_group_sub_page))
+
+    def test_purge_during_rendering_is_kept(self):
+        request = RequestFactory().get(self.local_group_page.url)
+        request.site = self.site
+        tag = PAGE_CACHE_PAGE_TAG.format(self.local_group_page.pk)
+        start_page_cache(request, [tag])
+
+        # the page changes, while the old version is rendered
+        purge_page_cache(tag)
+        self.assertTrue(set_cached_page(request, HttpResponse("Old Title")))
+
+        self.assertIsNone(get_cached_page(request))
+
+    def test_publishing_purges_the_teasers_of_the_page(self):
+        value = {"heading": "Teaser", "page": self.local_group_sub_page.pk}
+        teaser_page = HomeSubPage(
+            title="Teaser Page",
+            content=json.dumps([{"type": "teaser", "value": value}]),
+        )
+        self.home_page.add_child(instance=teaser_page)
+        self.app.get(teaser_page.url)
+
+        self.local_group_sub_page.description = "Changed Description"
+        self.local_group_sub_page.save_revision().publish()
+
+        self.assertIsNone(self._get_cached_page(teaser_page))
+        response = self.app.get(teaser_page.url)
+        self.assertContains(response, "Changed Description")
+
+    def test_teasers_are_tagged_with_the_image_of_the_page(self):
+        image = Image.objects.create(
+            title="Teaser Image", file="original_images/teaser.png", width=1, height=1
+        )
+        self.local_group_page.image = image
+        self.local_group_page.save()
+        value = {"heading": "Teaser", "page": self.local_group_page.pk}
+        self.home_page.content = json.dumps([{"type": "teaser", "value": value}])
+
+        tags = self.home_page.get_page_cache_tags()
+        self.assertIn(PAGE_CACHE_PAGE_TAG.format(self.local_group_page.pk), tags)
+        self.assertIn(PAGE_CACHE_IMAGE_TAG.format(image.pk), tags)
+
+    def test_deleting_a_subtree_purges_its_parent(self):
+        parent_page = HomeSubPage(title="Parent Page")
+        self.home_page.add_child(instance=parent_page)
+        parent_page.add_child(instance=HomeSubPage(title="Child Page"))
+        self.app.get(self.home_page.url)
+        self.assertIsNotNone(self._get_cached_page(self.home_page))
+
+        parent_page.delete()
+
+        self.assertIsNone(self._get_cached_page(self.home_page))
+
+    def test_moving_purges_the_descendants(self):
+        self.app.get(self.local_group_sub_page.url)
+        old_url = self.local_group_sub_page.url
+
+        self.local_group_page.slug = "renamed-group"
+        self.local_group_page.save_revision().publish()
+
+        self.app.get(old_url, status=404)
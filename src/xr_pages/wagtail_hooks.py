@@ -4,7 +4,12 @@ from wagtail.contrib.modeladmin.helpers import PermissionHelper
 from wagtail.contrib.modeladmin.options import ModelAdmin, modeladmin_register
 from wagtail.core import hooks
 
-from xr_pages.services import get_auth_groups, PAGE_MODERATORS_SUFFIX
+from xr_pages.services import (
+    get_auth_groups,
+    invalidate_page_routes,
+    start_page_cache,
+    PAGE_MODERATORS_SUFFIX,
+)
 from .models import LocalGroupPage, LocalGroup
 
 
@@ -68,3 +73,16 @@ def protect_base_and_local_group_pages(request, page):
     if isinstance(page.specific, LocalGroupPage):
         if page.group.is_regional_group:
             return permission_denied(request)
+
+
+@hooks.register("after_move_page")
+def invalidate_moved_page_routes(request, page):
+    # the url_paths of the descendants are updated after the page is saved
+    invalidate_page_routes()
+
+
+@hooks.register("before_serve_page")
+def start_page_cache_for_page(page, request, serve_args, serve_kwargs):
+    # pages with view restrictions depend on the session
+    if getattr(page, "page_cache", False) and not page.get_view_restrictions():
+        start_page_cache(request, page.get_page_cache_tags())
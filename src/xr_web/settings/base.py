@@ -82,6 +82,8 @@ MIDDLEWARE = [
     # Wagtail
     "wagtail.core.middleware.SiteMiddleware",
     "wagtail.contrib.redirects.middleware.RedirectMiddleware",
+    # XR
+    "xr_pages.middleware.PageCacheMiddleware",
 ]
 
 ROOT_URLCONF = "xr_web.urls"
@@ -125,6 +127,18 @@ DATABASES = {
     }
 }
 
+# Cache
+# Cached data is invalidated by changing version keys in the cache, so all
+# processes have to share one cache. XR_MEMCACHED_LOCATION is the address of
+# the memcached server, e.g. "127.0.0.1:11211" or "unix:/run/memcached.sock".
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.memcached.MemcachedCache",
+        "LOCATION": os.environ.get("XR_MEMCACHED_LOCATION", "127.0.0.1:11211"),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
@@ -184,7 +198,6 @@ WEBPACK_LOADER = {
 WAGTAIL_SITE_NAME = "XR de"
 
 # Wagtailmenus
-WAGTAILMENUS_DEFAULT_MAIN_MENU_TEMPLATE = "xr_pages/menus/main_menu.html"
 WAGTAILMENUS_DEFAULT_FLAT_MENU_TEMPLATE = "xr_pages/menus/flat_menu.html"
 WAGTAILMENUS_DEFAULT_CHILDREN_MENU_TEMPLATE = (
     "xr_pages/menus/local_group_level_3_menu.html"
@@ -224,6 +237,13 @@ LOCAL_GROUP_STATE_CHOICES = GERMANY_STATE_CHOICES
 
 UMAP_URLS = []
 
+# Geocoding of local group and event locations, see xr_pages.geocoders
+XR_GEOCODER = "xr_pages.geocoders.OsmGeocoder"
+
+# Static path of the svg icon sprite sheet written by the build_svg_sprite
+# command, e.g. "img/svg-icons.svg". Icons are embedded inline if unset.
+XR_SVG_ICON_SPRITE = None
+
 MAUTIC_DEFAULT_FORM_ID = None
 
 
@@ -14,6 +14,9 @@ for template_engine in TEMPLATES:  # noqa
 
 INSTALLED_APPS += ["wagtail.contrib.styleguide"]  # noqa
 
+# runserver is a single process, so it doesn't need a shared cache
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
 
 WEBPACK_LOADER = {
     "DEFAULT": {
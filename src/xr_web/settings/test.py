@@ -51,6 +51,14 @@ LOGGING = {
 
 CACHES = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
 
+# never geocode online
+XR_GEOCODER = "xr_pages.geocoders.StubGeocoder"
+XR_GEOCODER_STUB_LOCATIONS = {
+    "Berlin": (52.517, 13.3889),
+    "Hamburg": (53.5503, 10.0007),
+    "Potsdam": (52.4009, 13.0591),
+}
+
 PASSWORD_HASHERS = ("django.contrib.auth.hashers.MD5PasswordHasher",)
 
 
@@ -26,6 +26,12 @@ from xr_wagtail.views import (
 )
 from xr_embeds import urls as xr_embeds_urls
 from xr_blog.views import RssFeed, AtomFeed
+from xr_events.views import (
+    event_api_view,
+    event_feed_view,
+    event_geo_search_view,
+    import_events_view,
+)
 
 from . import webroot_redirects
 
@@ -40,9 +46,17 @@ urlpatterns = [
         remove_old_revisions_for_all_pages,
         name="remove_old_revisions_for_all_pages",
     ),
+    path(
+        "admin/pages/<int:page_id>/import_events/",
+        import_events_view,
+        name="import_events",
+    ),
     re_path(r"^embeds/", include(xr_embeds_urls)),
     path("feed/rss<int:feed_id>.xml", RssFeed(), name="blog-rss-feed"),
     path("feed/atom<int:feed_id>.xml", AtomFeed(), name="blog-atom-feed"),
+    path("feed/events<int:page_id>.ics", event_feed_view, name="event-ical-feed"),
+    path("api/events/", event_api_view, name="event-api"),
+    path("api/events/nearby/", event_geo_search_view, name="event-geo-search"),
     re_path(r"^django-admin/", admin.site.urls),
     re_path(r"^documents/", include(wagtaildocs_urls)),
     re_path(r"^admin/", include(wagtailadmin_urls)),